@@ -0,0 +1,143 @@
+"""
+Cold-start time to first response, per route
+
+Each sample is a fresh interpreter with an empty bytecode cache, standing in
+for a new isolate: the stand-in runtime and a seeded D1 are prepared first,
+then the clock covers importing main and serving one request. Also reports
+which src/ modules the request caused to be loaded, and the handler import
+times the response gave in Server-Timing. Pass --baseline-rev to compare with
+an earlier git revision.
+
+    python benchmarks/bench_coldstart.py [--runs 7] [--baseline-rev HEAD~1]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from bench_startup import STANDIN_DIR, prepare_tree  # noqa: E402
+from local_worker import LocalWorker, generate_issues, seed_issues  # noqa: E402
+
+
+REPOSITORY = 'bench/coldstart'
+
+ROUTES = [
+    ('GET', '/', None, {}),
+    ('GET', '/static/app.js', None, {'Accept-Encoding': 'gzip, br'}),
+    ('POST', '/webhook', '{"zen": "Keep it logically awesome."}',
+        {'X-GitHub-Event': 'ping', 'X-Hub-Signature-256': 'sha256=unsigned'}),
+    ('GET', '/api/session', None, {}),
+    ('GET', f'/api/issues?repository={REPOSITORY}', None, {}),
+    ('GET', f'/api/metrics?repository={REPOSITORY}', None, {}),
+    ('GET', f'/api/export?repository={REPOSITORY}', None, {}),
+    ('GET', '/api/unknown', None, {}),
+]
+
+PROBE = '''
+import asyncio, json, os, sys, time
+sys.path[:0] = [{standin!r}]
+from local_worker import LocalWorker
+sys.path.insert(0, {src!r})
+
+worker = LocalWorker({db_path!r})
+worker.session_id = {session_id!r}
+
+async def first_request():
+    start = time.perf_counter()
+    import main
+    response = await worker.fetch({method!r}, {path!r}, {body!r}, {headers!r})
+    return response, (time.perf_counter() - start) * 1000
+
+response, elapsed = asyncio.run(first_request())
+timing = [entry.strip() for entry in (response.headers.get('Server-Timing') or '').split(',')]
+imports = {{}}
+for entry in timing:
+    name, _, params = entry.partition(';')
+    if name == 'import':
+        fields = dict(param.split('=', 1) for param in params.split(';'))
+        imports[fields['desc'].strip('"')] = float(fields['dur'])
+src_modules = {{name[:-3] for name in os.listdir({src!r}) if name.endswith('.py')}}
+print(json.dumps({{
+    'first_response_ms': elapsed,
+    'status': response.status,
+    'imports': imports,
+    'modules': sorted(name for name in sys.modules if name in src_modules),
+}}))
+'''
+
+
+def seed_database(path, issue_count):
+    worker = LocalWorker(path)
+    session_id = worker.create_session()
+    seed_issues(worker.db, REPOSITORY, generate_issues(REPOSITORY, issue_count))
+    return session_id
+
+
+def run_once(src_dir, db_path, session_id, route):
+    method, path, body, headers = route
+    probe = PROBE.format(
+        standin=STANDIN_DIR, src=src_dir, db_path=db_path, session_id=session_id,
+        method=method, path=path, body=body, headers=headers
+    )
+    with tempfile.TemporaryDirectory() as pycache:
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+        result = subprocess.run(
+            [sys.executable, '-c', probe], env=env, capture_output=True, text=True, check=True
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(src_dir, db_path, session_id, runs):
+    report = {}
+    for route in ROUTES:
+        samples = [run_once(src_dir, db_path, session_id, route) for _ in range(runs)]
+        report[f'{route[0]} {route[1]}'] = {
+            'status': samples[0]['status'],
+            'first_response_ms': round(statistics.median(s['first_response_ms'] for s in samples), 1),
+            'import_ms': {
+                name: round(statistics.median(s['imports'].get(name, 0) for s in samples), 1)
+                for name in samples[0]['imports']
+            },
+            'modules_loaded': samples[0]['modules'],
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--issues', type=int, default=1000)
+    parser.add_argument('--baseline-rev', default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'd1.sqlite')
+        session_id = seed_database(db_path, args.issues)
+
+        targets = [('current', None)]
+        if args.baseline_rev:
+            targets.append(('baseline', args.baseline_rev))
+
+        reports = {label: measure(prepare_tree(rev, workdir), db_path, session_id, args.runs) for label, rev in targets}
+
+    print(f'{"route":45} {"status":>6} {"current ms":>11} {"import ms":>10} {"modules":>8}', end='')
+    print(f' {"baseline ms":>12} {"import ms":>10} {"modules":>8}' if args.baseline_rev else '')
+    for route, current in reports['current'].items():
+        line = (f'{route:45} {current["status"]:>6} {current["first_response_ms"]:>11}'
+                f' {sum(current["import_ms"].values()):>10.1f} {len(current["modules_loaded"]):>8}')
+        if args.baseline_rev:
+            baseline = reports['baseline'][route]
+            line += (f' {baseline["first_response_ms"]:>12} {sum(baseline["import_ms"].values()):>10.1f}'
+                     f' {len(baseline["modules_loaded"]):>8}')
+        print(line)
+    print(json.dumps(reports, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+D1 result conversion: per-field proxy access vs bulk to_py vs JSON.stringify
+
+Queries pages of issues (with aggregated labels and assignees) from a seeded
+D1 stand-in and converts the result the three ways a handler can:
+
+  per-field   index every row and field through the JsProxy, as handlers
+              did before src/db.py
+  to_py       db.fetch_all: one bulk to_py() of the rows
+  stringify   leave the rows in JS and serialize with JSON.stringify
+
+For each page size and issue body size it reports FFI crossings (exact: each
+proxy read, write or iteration step is one) and CPU time of convert +
+serialize under CPython (indicative only: the stand-in proxy is far cheaper
+than a real Pyodide crossing). Also reports crossings per request for the
+API routes end to end.
+
+    python benchmarks/bench_d1_conversion.py [--rows 10,50,100,500] [--body-sizes 0,400,4000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from js import JSON  # noqa: E402
+from pyodide.ffi import JsProxy  # noqa: E402
+from local_worker import LocalWorker, generate_issues, seed_issues  # noqa: E402
+from api import ISSUE_RELATION_COLUMNS  # noqa: E402
+from db import fetch_all  # noqa: E402
+
+
+REPOSITORY = 'bench/conversion'
+
+
+class CachedStatement:
+    """A statement whose .all() returns a prefetched result as a fresh JsProxy"""
+
+    def __init__(self, result):
+        self.result = result
+
+    async def all(self):
+        return JsProxy(self.result)
+
+
+async def per_field(statement):
+    result = await statement.all()
+    rows = [{key: row[key] for key in row.keys()} for row in result['results']]
+    return json.dumps(rows)
+
+
+async def bulk_to_py(statement):
+    return json.dumps(await fetch_all(statement))
+
+
+async def stringify(statement):
+    result = await statement.all()
+    return JSON.stringify(result.results)
+
+
+APPROACHES = [('per-field', per_field), ('to_py', bulk_to_py), ('stringify', stringify)]
+
+
+async def time_approach(approach, statement, iterations):
+    JsProxy.crossings = 0
+    await approach(statement)
+    crossings = JsProxy.crossings
+
+    start = time.process_time()
+    for _ in range(iterations):
+        await approach(statement)
+    return crossings, (time.process_time() - start) / iterations * 1e6
+
+
+async def conversion_table(row_counts, body_sizes, iterations):
+    table = []
+    for body_size in body_sizes:
+        worker = LocalWorker()
+        seed_issues(worker.db, REPOSITORY, generate_issues(REPOSITORY, max(row_counts), body_size=body_size))
+        for rows in row_counts:
+            result = await worker.db.prepare(
+                'SELECT i.*,' + ISSUE_RELATION_COLUMNS + ' FROM issues i ORDER BY i.id LIMIT ?'
+            ).bind(rows).all()
+            statement = CachedStatement(result)
+            entry = {'rows': rows, 'body_size': body_size}
+            for name, approach in APPROACHES:
+                crossings, cpu_us = await time_approach(approach, statement, iterations)
+                entry[name] = {'crossings': crossings, 'cpu_us': round(cpu_us)}
+            table.append(entry)
+    return table
+
+
+async def route_crossings(issue_count):
+    worker = LocalWorker(js_results=True)
+    worker.create_session()
+    seed_issues(worker.db, REPOSITORY, generate_issues(REPOSITORY, issue_count))
+    crossings = {}
+    for path in [
+        f'/api/issues?repository={REPOSITORY}&per_page=50',
+        f'/api/issues?repository={REPOSITORY}&per_page=100',
+        f'/api/issues/7?repository={REPOSITORY}',
+        f'/api/metrics?repository={REPOSITORY}',
+    ]:
+        JsProxy.crossings = 0
+        response = await worker.fetch('GET', path)
+        assert response.status == 200, (path, response.status)
+        crossings[path] = JsProxy.crossings
+    return crossings
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', default='10,50,100,500')
+    parser.add_argument('--body-sizes', default='0,400,4000')
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    row_counts = [int(value) for value in args.rows.split(',')]
+    body_sizes = [int(value) for value in args.body_sizes.split(',')]
+    table = await conversion_table(row_counts, body_sizes, args.iterations)
+
+    print(f'{"rows":>5} {"body":>5}' + ''.join(f' {name + " crossings":>20} {name + " us":>14}' for name, _ in APPROACHES))
+    for entry in table:
+        line = f'{entry["rows"]:>5} {entry["body_size"]:>5}'
+        for name, _ in APPROACHES:
+            line += f' {entry[name]["crossings"]:>20} {entry[name]["cpu_us"]:>14}'
+        print(line)
+
+    print()
+    for path, crossings in (await route_crossings(1000)).items():
+        print(f'{path:60} {crossings:>6} crossings')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""
+Route dispatch cost: precompiled route table vs the original if-chain
+
+Times resolving a mix of request paths to a handler with ROUTER.match and
+with a copy of the if/startswith/split chain on_fetch used before the route
+table, then counts the D1 statements an unknown route costs end to end
+(the if-chain looked the session up before it could return 404).
+
+    python benchmarks/bench_dispatch.py [--iterations 200000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from local_worker import LocalWorker  # noqa: E402
+from main import ROUTER  # noqa: E402
+
+
+REQUESTS = [
+    ('GET', '/'),
+    ('GET', '/static/app.3f2a9c1e.js'),
+    ('POST', '/webhook'),
+    ('GET', '/api/session'),
+    ('GET', '/api/issues'),
+    ('GET', '/api/issues/1234'),
+    ('PATCH', '/api/issues/1234'),
+    ('PATCH', '/api/issues/bulk'),
+    ('GET', '/api/metrics'),
+    ('GET', '/api/export'),
+    ('GET', '/favicon.ico'),
+    ('GET', '/wp-login.php'),
+]
+
+
+def legacy_dispatch(method, path):
+    """The routing decisions of the original on_fetch, minus the handler calls"""
+    if path == '/':
+        return 'serve_ui'
+    if path.startswith('/static/'):
+        return 'handle_static'
+    if path == '/auth':
+        return 'handle_auth'
+    if path == '/auth/callback':
+        return 'handle_auth_callback'
+    if path == '/webhook' and method == 'POST':
+        return 'handle_webhook'
+    # (verify_session ran here, before any of the routes below or the 404)
+    if path == '/api/session' and method == 'GET':
+        return 'handle_get_session'
+    if path == '/api/issues' and method == 'GET':
+        return 'handle_get_issues'
+    if path.startswith('/api/issues/') and path != '/api/issues/bulk':
+        issue_number = path.split('/')[-1]
+        if issue_number.isdigit():
+            if method == 'GET':
+                return 'handle_get_issue'
+            elif method == 'PATCH':
+                return 'handle_update_issue'
+    if path == '/api/issues/bulk' and method == 'PATCH':
+        return 'handle_bulk_update'
+    if path == '/api/sync' and method == 'POST':
+        return 'handle_sync_repository'
+    if path == '/api/metrics' and method == 'GET':
+        return 'handle_get_metrics'
+    if path == '/api/export' and method == 'GET':
+        return 'handle_export'
+    if path == '/api/import' and method == 'POST':
+        return 'handle_import'
+    return None
+
+
+def time_per_request(iterations, dispatch):
+    rounds = max(1, iterations // len(REQUESTS))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for method, path in REQUESTS:
+            dispatch(method, path)
+    return (time.perf_counter() - start) / (rounds * len(REQUESTS)) * 1e9
+
+
+async def unknown_route_statements():
+    worker = LocalWorker()
+    worker.create_session()
+    worker.db.reset_counters()
+    response = await worker.fetch('GET', '/wp-login.php')
+    return response.status, worker.db.statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    for method, path in REQUESTS:
+        route, _, _ = ROUTER.match(method, path)
+        legacy = legacy_dispatch(method, path)
+        assert (route is None) == (legacy is None), (method, path)
+
+    legacy_ns = time_per_request(args.iterations, legacy_dispatch)
+    router_ns = time_per_request(args.iterations, ROUTER.match)
+    status, statements = asyncio.run(unknown_route_statements())
+
+    print(f'{"dispatch":12} {"ns/request":>11}')
+    print(f'{"if-chain":12} {legacy_ns:>11.0f}')
+    print(f'{"route table":12} {router_ns:>11.0f}')
+    print(f'unknown route: {status}, {statements} D1 statements (if-chain: 1, the session lookup)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+End-to-end scenarios: sync, webhook storms, list pages, metrics, bulk update
+
+Runs the worker's on_fetch in-process against the SQLite D1 stand-in and
+the fake GitHub (standin/fake_github.py) for a generated repository of
+each size. The repository is first pulled in through POST /api/sync, or
+seeded directly when the sync scenario is skipped, and every scenario
+then runs against it. Per scenario it reports operations, wall-time
+latency percentiles, D1 statements and bytes read, and GitHub calls.
+Results can be saved as JSON, and compared with a saved run or with the
+same scenarios run at an earlier git revision.
+
+    python benchmarks/bench_e2e.py [--sizes 1000,10000,100000]
+        [--scenarios sync,list,metrics,webhooks,bulk] [--output results.json]
+        [--baseline results.json | --baseline-rev HEAD~5] [--max-regression 20]
+
+With --max-regression, the exit status is 1 when any scenario's p50
+latency grew by more than that many percent, or its D1 statements or
+GitHub calls per operation grew at all.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from bench_startup import prepare_tree  # noqa: E402
+from fake_github import FakeGitHub  # noqa: E402
+from local_worker import LocalWorker, seed_issues  # noqa: E402
+
+
+SCENARIOS = ('sync', 'list', 'metrics', 'webhooks', 'bulk')
+WEBHOOK_SECRET = 'bench-webhook-secret'
+LABELS = ['bug', 'enhancement', 'documentation', 'question', 'good first issue', 'help wanted', 'ui', 'api']
+
+# Per-operation counts compared exactly against the baseline
+COUNTED = ('d1_statements_per_op', 'github_calls_per_op')
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_operations(worker, github, operations):
+    """Send (method, path, body, headers) requests in order and summarize them"""
+    worker.db.reset_counters()
+    github.reset_counters()
+    latencies = []
+    statuses = Counter()
+    sent_bytes = 0
+    started = time.perf_counter()
+    for method, path, body, headers in operations:
+        start = time.perf_counter()
+        response = await worker.fetch(method, path, body=body, headers=headers)
+        sent_bytes += len(await response.bytes())
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[str(response.status)] += 1
+    wall = time.perf_counter() - started
+
+    count = len(operations)
+    return {
+        'operations': count,
+        'statuses': dict(statuses),
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'max_ms': round(max(latencies), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'ops_per_s': round(count / wall, 1) if wall else None,
+        'd1_statements_per_op': round(worker.db.statements / count, 2),
+        'd1_bytes_read_per_op': round(worker.db.bytes_read / count),
+        'github_calls_per_op': round(sum(github.calls.values()) / count, 2),
+        'response_bytes_per_op': round(sent_bytes / count),
+    }
+
+
+def list_operations(repository, size, iterations):
+    """Issue list pages at different depths, filters and sort orders"""
+    deep_page = max(1, int(size * 0.8) // 50)
+    variants = {
+        'list_first_page': '',
+        'list_deep_page': f'&page={deep_page}',
+        'list_open': '&state=open',
+        'list_label': '&label=bug',
+        'list_assignee': '&assignee=user3',
+        'list_sort_number': '&sort=number&order=asc',
+    }
+    return {
+        name: [('GET', f'/api/issues?repository={repository}&per_page=50{query}', None, None)] * iterations
+        for name, query in variants.items()
+    }
+
+
+def webhook_operations(github, repository, count, rng):
+    """A storm of `labeled` deliveries, as a mass relabel produces"""
+    numbers = list(github.repositories[repository])
+    operations = []
+    for _ in range(count):
+        number = rng.choice(numbers)
+        labels = rng.sample(LABELS, rng.randint(1, 3))
+        body, headers = github.issue_event(
+            repository, number, 'labeled', secret=WEBHOOK_SECRET, updates={'labels': labels}
+        )
+        operations.append(('POST', '/webhook', body, headers))
+    return operations
+
+
+def bulk_operations(github, repository, batch_size, iterations, rng):
+    numbers = list(github.repositories[repository])
+    operations = []
+    for _ in range(iterations):
+        body = json.dumps({
+            'repository': repository,
+            'issue_numbers': rng.sample(numbers, min(batch_size, len(numbers))),
+            'updates': {'labels': rng.sample(LABELS, 2)},
+        })
+        operations.append(('PATCH', '/api/issues/bulk', body, {'Content-Type': 'application/json'}))
+    return operations
+
+
+async def run_size(size, scenarios, args):
+    repository = f'bench/e2e-{size}'
+    rng = random.Random(size)
+    github = FakeGitHub(rate_limit=10 ** 9, pull_request_every=20).install()
+    issues = github.add_repository(repository, size, body_size=args.body_size)
+    worker = LocalWorker(GITHUB_WEBHOOK_SECRET=WEBHOOK_SECRET)
+    worker.create_session()
+
+    results = {}
+    if 'sync' in scenarios:
+        body = json.dumps({'repository': repository})
+        results['sync'] = await run_operations(worker, github, [('POST', '/api/sync', body, None)])
+        results['sync']['issues_per_s'] = round(size / (results['sync']['mean_ms'] / 1000), 1)
+    else:
+        seed_issues(worker.db, repository, issues)
+
+    if 'list' in scenarios:
+        for name, operations in list_operations(repository, size, args.iterations).items():
+            results[name] = await run_operations(worker, github, operations)
+
+    if 'metrics' in scenarios:
+        operations = [('GET', f'/api/metrics?repository={repository}', None, None)] * args.iterations
+        results['metrics'] = await run_operations(worker, github, operations)
+
+    if 'webhooks' in scenarios:
+        results['webhook_storm'] = await run_operations(
+            worker, github, webhook_operations(github, repository, args.webhooks, rng)
+        )
+
+    if 'bulk' in scenarios:
+        results['bulk_update'] = await run_operations(
+            worker, github, bulk_operations(github, repository, args.bulk_size, args.bulk_iterations, rng)
+        )
+
+    return {f'{name}@{size}': result for name, result in results.items()}
+
+
+async def run_all(args):
+    scenarios = set(args.scenarios.split(','))
+    results = {}
+    for size in [int(size) for size in args.sizes.split(',')]:
+        results.update(await run_size(size, scenarios, args))
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_baseline_rev(rev, args):
+    """The same scenarios run in a subprocess against src/ at an earlier revision"""
+    with tempfile.TemporaryDirectory() as workdir:
+        src_dir = prepare_tree(rev, workdir)
+        output = os.path.join(workdir, 'baseline.json')
+        command = [
+            sys.executable, os.path.abspath(__file__), '--src', src_dir, '--output', output, '--quiet',
+            '--sizes', args.sizes, '--scenarios', args.scenarios, '--iterations', str(args.iterations),
+            '--webhooks', str(args.webhooks), '--bulk-size', str(args.bulk_size),
+            '--bulk-iterations', str(args.bulk_iterations), '--body-size', str(args.body_size),
+        ]
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(output) as results:
+            run = json.load(results)
+    run['meta']['revision'] = rev
+    return run
+
+
+def print_results(results):
+    print(f'{"scenario":30} {"ops":>6} {"p50 ms":>9} {"p95 ms":>9} {"ops/s":>9} {"D1/op":>8} {"KB read/op":>11} {"GH/op":>7}')
+    for key, row in results.items():
+        print(
+            f'{key:30} {row["operations"]:>6} {row["p50_ms"]:>9.2f} {row["p95_ms"]:>9.2f} {row["ops_per_s"]:>9} '
+            f'{row["d1_statements_per_op"]:>8} {row["d1_bytes_read_per_op"] / 1024:>11.1f} {row["github_calls_per_op"]:>7}'
+        )
+
+
+def compare(results, baseline, max_regression):
+    """Print current vs baseline per scenario; return the regressions found"""
+    regressions = []
+    print(f'\nvs baseline {baseline["meta"].get("revision") or ""}')
+    print(f'{"scenario":30} {"p50 ms":>19} {"change":>8} {"D1/op":>15} {"GH/op":>13}')
+    for key, row in results.items():
+        base = baseline['results'].get(key)
+        if not base:
+            print(f'{key:30} {"(not in baseline)":>19}')
+            continue
+        change = (row['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100 if base['p50_ms'] else 0.0
+        print(
+            f'{key:30} {base["p50_ms"]:>9.2f} -> {row["p50_ms"]:<6.2f} {change:>+7.0f}% '
+            f'{base["d1_statements_per_op"]:>6} -> {row["d1_statements_per_op"]:<5} '
+            f'{base["github_calls_per_op"]:>4} -> {row["github_calls_per_op"]:<5}'
+        )
+        if max_regression is not None and change > max_regression:
+            regressions.append(f'{key}: p50_ms {base["p50_ms"]} -> {row["p50_ms"]} ({change:+.0f}%)')
+        # Statement and call counts are deterministic, so any growth counts
+        for metric in COUNTED:
+            if row[metric] > base[metric]:
+                regressions.append(f'{key}: {metric} {base[metric]} -> {row[metric]}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000', help='repository sizes, e.g. 1000,10000,100000')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f'subset of {",".join(SCENARIOS)}')
+    parser.add_argument('--iterations', type=int, default=30, help='requests per list/metrics scenario')
+    parser.add_argument('--webhooks', type=int, default=200, help='deliveries in the webhook storm')
+    parser.add_argument('--bulk-size', type=int, default=50, help='issues per bulk update')
+    parser.add_argument('--bulk-iterations', type=int, default=3)
+    parser.add_argument('--body-size', type=int, default=400)
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    parser.add_argument('--baseline-rev', help='git revision to run the same scenarios against')
+    parser.add_argument('--max-regression', type=float, default=None, help='fail on p50 growth over this percent')
+    parser.add_argument('--src', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--quiet', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.src:
+        sys.path.insert(0, args.src)
+
+    # The worker logs every sync and webhook; keep the report readable
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        results = asyncio.run(run_all(args))
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    run = {
+        'meta': {
+            'revision': git_revision() if not args.src else None,
+            'python': platform.python_version(),
+            'sizes': args.sizes,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(run, output, indent=2)
+    if args.quiet:
+        return
+
+    print_results(results)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as saved:
+            baseline = json.load(saved)
+    elif args.baseline_rev:
+        baseline = run_baseline_rev(args.baseline_rev, args)
+    if baseline:
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print('\nRegressions:')
+            for regression in regressions:
+                print(f'  {regression}')
+            if args.max_regression is not None:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
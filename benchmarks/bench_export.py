@@ -0,0 +1,118 @@
+"""
+Bulk export throughput: /api/export streaming vs paging /api/issues
+
+Seeds a local SQLite D1 with generated issues and measures, per repository
+size, how long it takes to pull every issue through the streaming export
+(NDJSON and CSV) and through 50-row /api/issues pages, along with D1
+statements issued and peak Python heap while streaming.
+
+    python benchmarks/bench_export.py [--sizes 1000,10000] [--body-size 400]
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from js import ReadableStream  # noqa: E402
+from local_worker import LocalWorker, generate_issues, seed_issues  # noqa: E402
+
+
+REPOSITORY = 'bench/export'
+
+
+async def drain_export(worker, export_format):
+    """Consume the stream chunk by chunk without holding the body"""
+    response = await worker.fetch('GET', f'/api/export?repository={REPOSITORY}&format={export_format}')
+    assert response.status == 200, response.status
+    assert isinstance(response.body, ReadableStream)
+    total_bytes = 0
+    rows = 0
+    async for chunk in response.body.iter_chunks():
+        total_bytes += len(chunk)
+        if export_format == 'csv':
+            rows += sum(1 for _ in csv.reader(io.StringIO(chunk.decode('utf-8'))))
+        else:
+            rows += chunk.count(b'\n')
+    if export_format == 'csv':
+        rows -= 1  # header
+    return total_bytes, rows
+
+
+async def page_issues(worker, per_page=50):
+    page = 1
+    total_bytes = 0
+    rows = 0
+    while True:
+        response = await worker.fetch(
+            'GET', f'/api/issues?repository={REPOSITORY}&sort=number&order=asc&page={page}&per_page={per_page}'
+        )
+        body = await response.bytes()
+        total_bytes += len(body)
+        data = json.loads(body)
+        rows += len(data['issues'])
+        if page >= data['pagination']['total_pages']:
+            return total_bytes, rows
+        page += 1
+
+
+async def measure(worker, label, run):
+    worker.db.reset_counters()
+    start = time.perf_counter()
+    total_bytes, rows = await run()
+    seconds = time.perf_counter() - start
+    return {
+        'mode': label,
+        'rows': rows,
+        'bytes': total_bytes,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'mb_per_second': round(total_bytes / seconds / 1e6, 2) if seconds else None,
+        'd1_statements': worker.db.statements,
+    }
+
+
+async def peak_memory(worker, export_format):
+    tracemalloc.start()
+    await drain_export(worker, export_format)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+async def run_size(size, body_size):
+    worker = LocalWorker()
+    worker.create_session()
+    seed_issues(worker.db, REPOSITORY, generate_issues(REPOSITORY, size, body_size=body_size))
+
+    results = [
+        await measure(worker, 'export_ndjson', lambda: drain_export(worker, 'ndjson')),
+        await measure(worker, 'export_csv', lambda: drain_export(worker, 'csv')),
+        await measure(worker, 'paged_api_issues', lambda: page_issues(worker)),
+    ]
+    results[0]['peak_heap_kb'] = round(await peak_memory(worker, 'ndjson') / 1024)
+    worker.db.close()
+    return {'issues': size, 'results': results}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000')
+    parser.add_argument('--body-size', type=int, default=400)
+    args = parser.parse_args()
+
+    report = []
+    for size in [int(value) for value in args.sizes.split(',')]:
+        report.append(await run_size(size, args.body_size))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
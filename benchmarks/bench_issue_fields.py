@@ -0,0 +1,85 @@
+"""
+Issue list projection: bytes read, serialized and sent with and without bodies
+
+Seeds repositories whose issues have long bodies and requests 100-issue
+pages of /api/issues with the default (body-free) field list, with every
+field (fields=...,body,...) and with a minimal projection, reporting bytes
+read from D1, CPU time per request and response bytes, plus the
+client-side store fill over /api/export with and without bodies.
+
+    python benchmarks/bench_issue_fields.py [--body-sizes 400,4000,20000] [--issues 1000]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from local_worker import LocalWorker, generate_issues, seed_issues  # noqa: E402
+from api import ISSUE_FIELDS, DEFAULT_LIST_FIELDS  # noqa: E402
+
+
+REPOSITORY = 'bench/fields'
+
+PROJECTIONS = [
+    ('all fields', ','.join(ISSUE_FIELDS)),
+    ('default', None),
+    ('number,title,state', 'number,title,state'),
+]
+
+STORE_FIELDS = ','.join(DEFAULT_LIST_FIELDS)
+
+
+async def measure_request(worker, path, iterations):
+    samples = []
+    for _ in range(iterations):
+        worker.db.reset_counters()
+        start = time.process_time()
+        response = await worker.fetch('GET', path)
+        body = await response.bytes()
+        samples.append(time.process_time() - start)
+    assert response.status == 200, (path, response.status)
+    return {
+        'd1_bytes_read': worker.db.bytes_read,
+        'cpu_us': round(statistics.median(samples) * 1e6),
+        'response_bytes': len(body),
+    }
+
+
+async def run(body_size, issue_count, iterations):
+    worker = LocalWorker()
+    worker.create_session()
+    seed_issues(worker.db, REPOSITORY, generate_issues(REPOSITORY, issue_count, body_size=body_size))
+
+    report = {}
+    for name, fields in PROJECTIONS:
+        path = f'/api/issues?repository={REPOSITORY}&per_page=100'
+        if fields:
+            path += f'&fields={fields}'
+        report[name] = await measure_request(worker, path, iterations)
+
+    export = f'/api/export?repository={REPOSITORY}'
+    report['store fill, full export'] = await measure_request(worker, export, 3)
+    report['store fill, fields='] = await measure_request(worker, f'{export}&fields={STORE_FIELDS}', 3)
+    return report
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--body-sizes', default='400,4000,20000')
+    parser.add_argument('--issues', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=30)
+    args = parser.parse_args()
+
+    print(f'{"body":>6} {"request":28} {"D1 bytes":>10} {"cpu us":>8} {"sent bytes":>11}')
+    for body_size in [int(value) for value in args.body_sizes.split(',')]:
+        for name, row in (await run(body_size, args.issues, args.iterations)).items():
+            print(f'{body_size:>6} {name:28} {row["d1_bytes_read"]:>10} {row["cpu_us"]:>8} {row["response_bytes"]:>11}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""
+Label storage and issue list payloads on a large repository
+
+Syncs a generated repository (20k issues by default) through the stand-in
+worker from a fake GitHub, then reports the bytes the label tables and
+the whole database take after VACUUM, per issue, and for /api/issues
+pages (unfiltered and with label=, at two page sizes) the bytes read from
+D1 and the response bytes, plain and gzipped. With --baseline-rev the
+same run also goes against src/ at an earlier revision, so per-issue label
+rows can be compared with repo_labels ids.
+
+    python benchmarks/bench_labels.py [--issues 20000] [--baseline-rev HEAD~1]
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from bench_startup import prepare_tree  # noqa: E402
+from fake_github import FakeGitHub  # noqa: E402
+from local_worker import LocalWorker  # noqa: E402
+
+
+REPOSITORY = 'bench/labels'
+LABEL_TABLES = ('labels', 'idx_labels_issue_id', 'repo_labels', 'issue_labels', 'repositories')
+PAGES = [
+    ('per_page=50', 'per_page=50'),
+    ('per_page=100', 'per_page=100'),
+    ('per_page=100, label=bug', 'per_page=100&label=bug'),
+    ('per_page=100, page 50', 'per_page=100&page=50'),
+]
+
+
+def storage(connection, issue_count):
+    """Bytes per table group after VACUUM, and per issue"""
+    connection.execute('VACUUM')
+    sizes = dict(connection.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name').fetchall())
+    label_bytes = sum(size for name, size in sizes.items() if name in LABEL_TABLES or 'label' in name)
+    total = sum(sizes.values())
+    return {
+        'label_tables_bytes': label_bytes,
+        'label_bytes_per_issue': round(label_bytes / issue_count, 1),
+        'database_bytes': total,
+        'database_bytes_per_issue': round(total / issue_count, 1),
+    }
+
+
+async def measure_page(worker, query):
+    path = f'/api/issues?repository={REPOSITORY}&{query}'
+    # The first request fills the isolate's label cache; the second is what a warm isolate does
+    await (await worker.fetch('GET', path)).bytes()
+    worker.db.reset_counters()
+    response = await worker.fetch('GET', path)
+    body = await response.bytes()
+    assert response.status == 200, (path, response.status)
+    return {
+        'd1_bytes_read': worker.db.bytes_read,
+        'response_bytes': len(body),
+        'gzip_bytes': len(gzip.compress(body)),
+    }
+
+
+async def run(args, directory):
+    github = FakeGitHub(rate_limit=10 ** 9).install()
+    github.add_repository(REPOSITORY, args.issues)
+    worker = LocalWorker(os.path.join(directory, 'labels.sqlite'))
+    worker.create_session()
+    response = await worker.fetch('POST', '/api/sync', body=json.dumps({'repository': REPOSITORY}))
+    assert response.status == 200, response.status
+
+    report = {'storage': storage(worker.db.connection, args.issues), 'pages': {}}
+    for name, query in PAGES:
+        report['pages'][name] = await measure_page(worker, query)
+    worker.db.close()
+    return report
+
+
+def run_baseline_rev(rev, args):
+    """The same run in a subprocess against src/ at an earlier revision"""
+    with tempfile.TemporaryDirectory() as workdir:
+        src_dir = prepare_tree(rev, workdir)
+        output = os.path.join(workdir, 'baseline.json')
+        command = [
+            sys.executable, os.path.abspath(__file__), '--src', src_dir, '--output', output,
+            '--issues', str(args.issues),
+        ]
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(output) as results:
+            return json.load(results)
+
+
+def print_results(title, report):
+    print(title)
+    for name, value in report['storage'].items():
+        print(f'  {name:28} {value:>12}')
+    print(f'  {"page":28} {"D1 bytes":>12} {"sent bytes":>12} {"gzip bytes":>12}')
+    for name, row in report['pages'].items():
+        print(f'  {name:28} {row["d1_bytes_read"]:>12} {row["response_bytes"]:>12} {row["gzip_bytes"]:>12}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issues', type=int, default=20000)
+    parser.add_argument('--baseline-rev', help='git revision to run the same measurements against')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--src', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.src:
+        sys.path.insert(0, args.src)
+
+    # The worker logs the sync; only the report matters here
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            report = asyncio.run(run(args, directory))
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.src:
+        return
+
+    print_results(f'Current tree, {args.issues} issues', report)
+    if args.baseline_rev:
+        print()
+        print_results(f'Baseline {args.baseline_rev}', run_baseline_rev(args.baseline_rev, args))
+
+
+if __name__ == '__main__':
+    main()
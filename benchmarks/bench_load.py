@@ -0,0 +1,265 @@
+"""
+Mixed load: webhook storms alongside dashboard polling
+
+Generates open-loop traffic: `issues` webhook deliveries arriving as a
+Poisson process (a mass relabel sweeping through the repository, or
+recorded payloads replayed with --replay), plus N dashboard users, each
+polling /api/issues and /api/metrics on its own interval. Every delivery
+carries a valid X-Hub-Signature-256. Requests are sent at their
+scheduled time whether or not earlier ones have finished, so latency
+includes any queueing behind a busy isolate.
+
+By default the worker runs in-process on the stand-in runtime with a
+seeded D1. With --url the same traffic goes over HTTP to a running worker
+(e.g. `wrangler dev`, with --session set to a valid session cookie).
+Either way the worker should run with TRACING=on: D1 statements per
+request are read from its Server-Timing header.
+
+    python benchmarks/bench_load.py [--scenario mixed|storm|dashboard] [--duration 20]
+        [--webhooks-per-minute 300] [--users 30] [--replay deliveries.jsonl] [--json]
+    python benchmarks/bench_load.py --url http://localhost:8787 --session <id> --secret <webhook secret>
+
+A --replay file holds one delivery per line: either a webhook payload or
+{"event": "issues", "payload": {...}}. Payloads are re-signed with --secret.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from bench_e2e import LABELS, percentile  # noqa: E402
+from fake_github import FakeGitHub, sign  # noqa: E402
+
+
+# name -> (webhooks per minute, dashboard users)
+SCENARIOS = {
+    'storm': (600, 0),
+    'dashboard': (0, 50),
+    'mixed': (300, 30),
+}
+
+D1_TIMING = re.compile(r'd1;dur=[0-9.]+;desc="(\d+) calls?"')
+
+
+def d1_statements(server_timing):
+    """D1 calls reported in a Server-Timing header (0 if there were none)"""
+    found = D1_TIMING.search(server_timing or '')
+    return int(found.group(1)) if found else 0
+
+
+def synthetic_deliveries(github, repository, secret, rng):
+    """Endless `labeled` deliveries walking the issues in order, as a mass relabel does"""
+    numbers = sorted(github.repositories[repository])
+    while True:
+        labels = rng.sample(LABELS, rng.randint(1, 3))
+        for number in numbers:
+            body, headers = github.issue_event(repository, number, 'labeled', secret=secret, updates={'labels': labels})
+            yield 'webhook', 'POST', '/webhook', body, headers
+
+
+def replayed_deliveries(path, secret):
+    """Recorded deliveries, re-signed and repeated as often as needed"""
+    with open(path) as recorded:
+        entries = [json.loads(line) for line in recorded if line.strip()]
+    if not entries:
+        raise SystemExit(f'{path} holds no deliveries')
+    while True:
+        for entry in entries:
+            event, payload = (entry['event'], entry['payload']) if 'payload' in entry else ('issues', entry)
+            body = json.dumps(payload)
+            headers = {
+                'X-GitHub-Event': event,
+                'Content-Type': 'application/json',
+                'X-Hub-Signature-256': sign(body, secret),
+            }
+            yield 'webhook', 'POST', '/webhook', body, headers
+
+
+def schedule(args, deliveries, rng):
+    """(time offset, request) pairs for the whole run, in arrival order"""
+    arrivals = []
+    if args.webhooks_per_minute:
+        rate = args.webhooks_per_minute / 60
+        offset = rng.expovariate(rate)
+        while offset < args.duration:
+            arrivals.append((offset, next(deliveries)))
+            offset += rng.expovariate(rate)
+
+    issues_path = f'/api/issues?repository={args.repository}&per_page=50'
+    metrics_path = f'/api/metrics?repository={args.repository}'
+    for _ in range(args.users):
+        for kind, path, interval in (('issues', issues_path, args.poll_interval),
+                                     ('metrics', metrics_path, args.metrics_interval)):
+            offset = rng.uniform(0, interval)
+            while offset < args.duration:
+                arrivals.append((offset, (kind, 'GET', path, None, {})))
+                offset += interval * rng.uniform(0.9, 1.1)
+    return sorted(arrivals, key=lambda arrival: arrival[0])
+
+
+class InProcessTarget:
+    """The worker's on_fetch on the stand-in runtime, over a seeded D1"""
+
+    def __init__(self, args, github):
+        from local_worker import LocalWorker, seed_issues
+
+        self.worker = LocalWorker(TRACING='on', GITHUB_WEBHOOK_SECRET=args.secret)
+        self.worker.create_session()
+        seed_issues(self.worker.db, args.repository, github.issues(args.repository))
+
+    async def send(self, method, path, body, headers):
+        response = await self.worker.fetch(method, path, body=body, headers=headers)
+        await response.bytes()
+        return response.status, response.headers.get('Server-Timing')
+
+
+class HttpTarget:
+    """A running worker reached over HTTP"""
+
+    def __init__(self, args):
+        self.base_url = args.url.rstrip('/')
+        self.cookie = f'session={args.session}' if args.session else None
+        self.pool = ThreadPoolExecutor(max_workers=args.connections)
+
+    def _send(self, method, path, body, headers):
+        headers = dict(headers)
+        if self.cookie and path.startswith('/api/'):
+            headers['Cookie'] = self.cookie
+        data = body.encode('utf-8') if body else None
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status, response.headers.get('Server-Timing')
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers.get('Server-Timing')
+
+    async def send(self, method, path, body, headers):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, self._send, method, path, body, headers)
+
+
+async def run_load(target, arrivals):
+    """Fire every request at its scheduled offset; latency counts from that moment"""
+    samples = defaultdict(list)
+    started = time.perf_counter()
+
+    async def fire(offset, request):
+        kind, method, path, body, headers = request
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            status, server_timing = await target.send(method, path, body, headers)
+        except Exception as error:
+            status, server_timing = f'error: {error}', None
+        latency = (time.perf_counter() - started - offset) * 1000
+        samples[kind].append((latency, status, d1_statements(server_timing)))
+
+    await asyncio.gather(*(fire(offset, request) for offset, request in arrivals))
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed):
+    report = {}
+    everything = [sample for kind_samples in samples.values() for sample in kind_samples]
+    for kind, kind_samples in sorted(samples.items()) + [('all', everything)]:
+        if not kind_samples:
+            continue
+        latencies = [latency for latency, _, _ in kind_samples]
+        statements = [count for _, _, count in kind_samples]
+        errors = sum(1 for _, status, _ in kind_samples if not (isinstance(status, int) and status < 400))
+        report[kind] = {
+            'requests': len(kind_samples),
+            'errors': errors,
+            'throughput_per_s': round(len(kind_samples) / elapsed, 2),
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'max_ms': round(max(latencies), 2),
+            'd1_statements_mean': round(statistics.fmean(statements), 2),
+            'd1_statements_max': max(statements),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of traffic')
+    parser.add_argument('--webhooks-per-minute', type=float, default=None, help='overrides the scenario')
+    parser.add_argument('--users', type=int, default=None, help='dashboard users; overrides the scenario')
+    parser.add_argument('--poll-interval', type=float, default=10, help='seconds between /api/issues polls per user')
+    parser.add_argument('--metrics-interval', type=float, default=30, help='seconds between /api/metrics polls per user')
+    parser.add_argument('--issues', type=int, default=5000, help='issues in the generated repository')
+    parser.add_argument('--repository', default='bench/load')
+    parser.add_argument('--replay', help='JSON lines of recorded webhook deliveries')
+    parser.add_argument('--secret', default='bench-webhook-secret', help='GITHUB_WEBHOOK_SECRET to sign with')
+    parser.add_argument('--url', help='send traffic to a running worker instead of the in-process stand-in')
+    parser.add_argument('--session', help='session cookie value for API requests with --url')
+    parser.add_argument('--connections', type=int, default=32, help='concurrent HTTP requests with --url')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    webhooks_per_minute, users = SCENARIOS[args.scenario]
+    if args.webhooks_per_minute is None:
+        args.webhooks_per_minute = webhooks_per_minute
+    if args.users is None:
+        args.users = users
+
+    rng = random.Random(args.seed)
+    github = FakeGitHub()
+    github.add_repository(args.repository, args.issues)
+    if args.replay:
+        deliveries = replayed_deliveries(args.replay, args.secret)
+    else:
+        deliveries = synthetic_deliveries(github, args.repository, args.secret, rng)
+    arrivals = schedule(args, deliveries, rng)
+
+    target = HttpTarget(args) if args.url else InProcessTarget(args, github)
+
+    # The in-process worker logs a trace line per request; keep the report readable
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        samples, elapsed = asyncio.run(run_load(target, arrivals))
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    report = {
+        'scenario': args.scenario,
+        'target': args.url or 'in-process',
+        'duration_s': round(elapsed, 2),
+        'webhooks_per_minute': args.webhooks_per_minute,
+        'users': args.users,
+        'classes': summarize(samples, elapsed),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f'{args.scenario}: {args.webhooks_per_minute:g} webhooks/min, {args.users} users, '
+          f'{report["duration_s"]} s against {report["target"]}')
+    print(f'{"class":10} {"requests":>9} {"errors":>7} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} '
+          f'{"p99 ms":>8} {"max ms":>8} {"D1/req":>7} {"D1 max":>7}')
+    for kind, row in report['classes'].items():
+        print(f'{kind:10} {row["requests"]:>9} {row["errors"]:>7} {row["throughput_per_s"]:>8} {row["p50_ms"]:>8} '
+              f'{row["p95_ms"]:>8} {row["p99_ms"]:>8} {row["max_ms"]:>8} {row["d1_statements_mean"]:>7} '
+              f'{row["d1_statements_max"]:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Time-to-close percentile sketch: accuracy and cost
+
+Compares the log-bucketed histogram in src/percentiles.py against exact
+percentiles computed by sorting, over synthetic time-to-close samples with
+a heavy tail, and exits non-zero if any estimate falls outside the
+advertised relative accuracy.
+
+    python benchmarks/bench_percentiles.py [--issues 100000] [--seed 1]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'standin'))
+
+from percentiles import PERCENTILES, RELATIVE_ACCURACY, bucket_for, quantile  # noqa: E402
+
+
+def exact_quantile(sorted_values, q):
+    """Percentile by sorting, using the same rank convention as the sketch"""
+    return sorted_values[int(q * (len(sorted_values) - 1))]
+
+
+def generate_samples(count, rng):
+    """Integer hours: mostly days, a long tail of issues open for months"""
+    samples = []
+    for _ in range(count):
+        if rng.random() < 0.05:
+            samples.append(int(rng.uniform(0, 3)))
+        else:
+            samples.append(int(rng.lognormvariate(3.5, 1.6)))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issues', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    samples = generate_samples(args.issues, rng)
+
+    # Incremental maintenance: close every issue, then reopen a tenth of them
+    start = time.perf_counter()
+    counts = Counter()
+    for hours in samples:
+        counts[bucket_for(hours)] += 1
+    reopened = rng.sample(range(len(samples)), len(samples) // 10)
+    for index in reopened:
+        counts[bucket_for(samples[index])] -= 1
+    update_seconds = time.perf_counter() - start
+
+    remaining = set(range(len(samples))) - set(reopened)
+    closed = [samples[index] for index in remaining]
+
+    start = time.perf_counter()
+    estimates = {p: quantile(counts, p / 100) for p in PERCENTILES}
+    sketch_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ordered = sorted(closed)
+    exact = {p: exact_quantile(ordered, p / 100) for p in PERCENTILES}
+    exact_seconds = time.perf_counter() - start
+
+    failures = []
+    report = {
+        'issues': args.issues,
+        'closed': len(closed),
+        'buckets': sum(1 for count in counts.values() if count),
+        'update_us_per_issue': round(update_seconds / (args.issues + len(reopened)) * 1e6, 3),
+        'sketch_query_ms': round(sketch_seconds * 1000, 3),
+        'exact_sort_ms': round(exact_seconds * 1000, 3),
+        'percentiles': {}
+    }
+    for p in PERCENTILES:
+        error = abs(estimates[p] - exact[p]) / exact[p] if exact[p] else abs(estimates[p])
+        report['percentiles'][f'p{p}'] = {
+            'exact': exact[p],
+            'estimate': round(estimates[p], 2),
+            'relative_error': round(error, 4)
+        }
+        if error > RELATIVE_ACCURACY:
+            failures.append(f'p{p}')
+
+    print(json.dumps(report, indent=2))
+    if failures:
+        print(f'FAIL: {", ".join(failures)} outside {RELATIVE_ACCURACY:.0%} relative accuracy')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
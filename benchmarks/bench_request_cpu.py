@@ -0,0 +1,143 @@
+"""
+Per-request CPU time and JS boundary calls for the API routes
+
+Serves each route repeatedly from a warm worker (modules already imported)
+over a seeded D1 and reports the median CPU time per request, excluding
+nothing: D1 (SQLite) work is included, so compare like with like. The
+stand-in `js` module is instrumented to count Headers/Response calls, each
+of which is a Python->JS proxy call in the real runtime. Pass
+--baseline-rev to run the same measurement against an earlier revision.
+
+    python benchmarks/bench_request_cpu.py [--iterations 300] [--baseline-rev HEAD~1] [--var TRACING=on]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+import js  # noqa: E402
+from bench_startup import prepare_tree  # noqa: E402
+from local_worker import LocalWorker, generate_issues, seed_issues  # noqa: E402
+
+
+REPOSITORY = 'bench/cpu'
+
+ROUTES = [
+    ('GET', '/api/session', True),
+    ('GET', f'/api/issues?repository={REPOSITORY}&per_page=50', True),
+    ('GET', f'/api/issues?repository={REPOSITORY}&per_page=100', True),
+    ('GET', f'/api/issues/42?repository={REPOSITORY}', True),
+    ('GET', f'/api/metrics?repository={REPOSITORY}', True),
+    ('GET', '/api/metrics', True),
+    ('GET', '/api/issues', False),
+]
+
+BOUNDARY_CALLS = [
+    (js.Headers, 'new'), (js.Headers, 'set'), (js.Headers, 'append'), (js.Response, 'new'),
+]
+
+
+def count_boundary_calls():
+    """Wrap the stand-in Headers/Response entry points with a call counter"""
+    calls = Counter()
+    # Only calls made from src/ cross the boundary; the stand-in's own
+    # internal calls (Headers.__init__ -> set) are not counted
+    depth = [0]
+    for cls, name in BOUNDARY_CALLS:
+        original = getattr(cls, name)
+        is_static = isinstance(cls.__dict__[name], staticmethod)
+
+        def wrapper(*args, _original=original, _key=f'{cls.__name__}.{name}', **kwargs):
+            if not depth[0]:
+                calls[_key] += 1
+            depth[0] += 1
+            try:
+                return _original(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+
+        setattr(cls, name, staticmethod(wrapper) if is_static else wrapper)
+    return calls
+
+
+async def measure(iterations, issue_count, env_vars):
+    calls = count_boundary_calls()
+    worker = LocalWorker(**env_vars)
+    worker.create_session()
+    seed_issues(worker.db, REPOSITORY, generate_issues(REPOSITORY, issue_count))
+
+    report = {}
+    for method, path, authenticated in ROUTES:
+        for _ in range(3):
+            await worker.fetch(method, path, authenticated=authenticated)
+
+        calls.clear()
+        samples = []
+        for _ in range(iterations):
+            start = time.process_time()
+            response = await worker.fetch(method, path, authenticated=authenticated)
+            await response.bytes()
+            samples.append(time.process_time() - start)
+        report[f'{method} {path}'] = {
+            'status': response.status,
+            'cpu_us': round(statistics.median(samples) * 1e6),
+            'boundary_calls': round(sum(calls.values()) / iterations, 1),
+        }
+    return report
+
+
+def run_baseline(rev, iterations, issue_count, env_vars):
+    with tempfile.TemporaryDirectory() as workdir:
+        src_dir = prepare_tree(rev, workdir)
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--src', src_dir, '--json',
+             '--iterations', str(iterations), '--issues', str(issue_count)]
+            + [f'--var={key}={value}' for key, value in env_vars.items()],
+            capture_output=True, text=True, check=True
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--issues', type=int, default=2000)
+    parser.add_argument('--baseline-rev', default=None)
+    parser.add_argument('--var', action='append', default=[], help='worker variable, e.g. TRACING=on')
+    parser.add_argument('--src', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--json', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.src:
+        sys.path.insert(0, args.src)
+
+    env_vars = dict(var.split('=', 1) for var in args.var)
+    current = asyncio.run(measure(args.iterations, args.issues, env_vars))
+    if args.json:
+        print(json.dumps(current))
+        return
+
+    baseline = run_baseline(args.baseline_rev, args.iterations, args.issues, env_vars) if args.baseline_rev else None
+
+    header = f'{"route":62} {"status":>6} {"cpu us":>8} {"js calls":>9}'
+    if baseline:
+        header += f' {"base us":>8} {"base calls":>10}'
+    print(header)
+    for route, row in current.items():
+        line = f'{route:62} {row["status"]:>6} {row["cpu_us"]:>8} {row["boundary_calls"]:>9}'
+        if baseline:
+            line += f' {baseline[route]["cpu_us"]:>8} {baseline[route]["boundary_calls"]:>10}'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
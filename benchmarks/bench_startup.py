@@ -0,0 +1,110 @@
+"""
+Worker module import time and memory at cold start
+
+Imports `main` in fresh interpreters with an empty bytecode cache, so every
+module is compiled from source as in a cold isolate, and reports the median
+total import time, per-module cumulative import time (from -X importtime) and
+the Python heap held after import. Pass --baseline-rev to compare the
+working tree with an earlier git revision.
+
+    python benchmarks/bench_startup.py [--runs 15] [--baseline-rev HEAD~1]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import io
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.normpath(os.path.join(BENCH_DIR, '..'))
+STANDIN_DIR = os.path.join(BENCH_DIR, 'standin')
+
+PROBE = '''
+import json, sys, time, tracemalloc
+sys.path[:0] = [{standin!r}, {src!r}]
+tracemalloc.start()
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+current, _ = tracemalloc.get_traced_memory()
+print(json.dumps({{'import_ms': elapsed * 1000, 'heap_kb': current / 1024}}))
+'''
+
+
+def prepare_tree(rev, workdir):
+    """src/ directory for a revision (None = working tree), with its asset bundle built"""
+    if rev is None:
+        root = ROOT
+    else:
+        archive = subprocess.run(
+            ['git', 'archive', '--format=tar', rev], cwd=ROOT, check=True, capture_output=True
+        ).stdout
+        root = os.path.join(workdir, rev.replace('/', '_').replace('~', '_'))
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(root)
+
+    build_script = os.path.join(root, 'scripts', 'build_assets.py')
+    bundle = os.path.join(root, 'src', 'static_bundle.py')
+    if os.path.exists(build_script) and (rev is not None or not os.path.exists(bundle)):
+        subprocess.run(
+            [sys.executable, build_script, '--static-dir', os.path.join(root, 'static'), '--output', bundle],
+            check=True, capture_output=True
+        )
+    return os.path.join(root, 'src')
+
+
+def run_once(src_dir):
+    module_names = {name[:-3] for name in os.listdir(src_dir) if name.endswith('.py')}
+    with tempfile.TemporaryDirectory() as pycache:
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE.format(standin=STANDIN_DIR, src=src_dir)],
+            env=env, capture_output=True, text=True, check=True
+        )
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        if name in module_names:
+            modules[name] = int(cumulative) / 1000
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample['modules'] = modules
+    return sample
+
+
+def measure(src_dir, runs):
+    samples = [run_once(src_dir) for _ in range(runs)]
+    module_names = sorted({name for sample in samples for name in sample['modules']})
+    return {
+        'import_main_ms': round(statistics.median(sample['import_ms'] for sample in samples), 2),
+        'heap_after_import_kb': round(statistics.median(sample['heap_kb'] for sample in samples)),
+        'module_cumulative_ms': {
+            name: round(statistics.median(sample['modules'].get(name, 0) for sample in samples), 2)
+            for name in module_names
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=15)
+    parser.add_argument('--baseline-rev', default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        report = {'current': measure(prepare_tree(None, workdir), args.runs)}
+        if args.baseline_rev:
+            report['baseline'] = {'rev': args.baseline_rev, **measure(prepare_tree(args.baseline_rev, workdir), args.runs)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
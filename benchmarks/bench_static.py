@@ -0,0 +1,118 @@
+"""
+Static asset bytes and latency: hashed, precompressed assets vs plain strings
+
+"Legacy" reproduces the original behaviour: the page, CSS and JS from
+static/ are sent as uncompressed strings with no validators, so every visit downloads all three
+and the edge compresses them on the fly (modelled here as gzip per request).
+"Current" goes through on_fetch: the first visit downloads precompressed
+variants, and repeat visits revalidate the page (304) and reuse the
+immutable, content-hashed CSS and JS from the browser cache.
+
+    python benchmarks/bench_static.py [--iterations 2000]
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from js import Headers, Response  # noqa: E402
+from local_worker import LocalWorker  # noqa: E402
+from assets import ASSETS  # noqa: E402
+
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static')
+
+
+def read_static(name):
+    with open(os.path.join(STATIC_DIR, name), encoding='utf-8') as source:
+        return source.read()
+
+
+LEGACY_CONTENT = {
+    '/': (read_static('index.html'), 'text/html'),
+    '/static/styles.css': (read_static('styles.css'), 'text/css'),
+    '/static/app.js': (read_static('app.js'), 'application/javascript'),
+}
+
+
+def legacy_serve(path):
+    content, content_type = LEGACY_CONTENT[path]
+    headers = Headers.new()
+    headers.set('Content-Type', content_type)
+    response = Response.new(content, headers=headers)
+    # The edge compresses the uncompressed body on every response
+    return response, gzip.compress(content.encode('utf-8'))
+
+
+async def timed(iterations, call):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await call()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    worker = LocalWorker()
+    encoding = 'br, gzip' if 'br' in ASSETS['app.js']['encodings'] else 'gzip'
+    accept = {'Accept-Encoding': encoding}
+    current_paths = ['/', ASSETS['styles.css']['url'], ASSETS['app.js']['url']]
+
+    # First visit: all three resources
+    legacy_first = sum(len(LEGACY_CONTENT[path][0].encode('utf-8')) for path in LEGACY_CONTENT)
+    legacy_first_edge = sum(len(legacy_serve(path)[1]) for path in LEGACY_CONTENT)
+    current_first = 0
+    for path in current_paths:
+        response = await worker.fetch('GET', path, headers=accept, authenticated=False)
+        current_first += len(await response.bytes())
+
+    # Repeat visit: legacy downloads everything again; current revalidates the page only
+    page_etag = ASSETS['index.html']['etags'][encoding.split(', ')[0]]
+    revalidation = await worker.fetch('GET', '/', headers={**accept, 'If-None-Match': page_etag}, authenticated=False)
+    assert revalidation.status == 304, revalidation.status
+    current_repeat = len(await revalidation.bytes())
+
+    async def legacy_call():
+        legacy_serve('/static/app.js')
+
+    async def current_call():
+        await worker.fetch('GET', ASSETS['app.js']['url'], headers=accept, authenticated=False)
+
+    async def current_304():
+        await worker.fetch('GET', ASSETS['app.js']['url'],
+                           headers={**accept, 'If-None-Match': ASSETS['app.js']['etags']['gzip']},
+                           authenticated=False)
+
+    report = {
+        'encoding': encoding,
+        'first_visit': {
+            'legacy_uncompressed_bytes': legacy_first,
+            'legacy_edge_gzip_bytes': legacy_first_edge,
+            'current_bytes': current_first,
+        },
+        'repeat_visit': {
+            'legacy_requests': 3,
+            'legacy_bytes': legacy_first_edge,
+            'current_requests': 1,
+            'current_bytes': current_repeat,
+        },
+        'app_js_handler_us': {
+            'legacy_with_edge_gzip': round(await timed(args.iterations, legacy_call), 1),
+            'current_200': round(await timed(args.iterations, current_call), 1),
+            'current_304': round(await timed(args.iterations, current_304), 1),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
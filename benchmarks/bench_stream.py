@@ -0,0 +1,211 @@
+"""
+Live-update fan-out: /api/stream subscribers vs polling
+
+Opens N event streams on /api/stream for one repository, then sends a run
+of signed `issues` webhook deliveries (alternately closing and reopening
+issues, so every delivery also moves the metrics). Each stream is read by
+its own task, which timestamps the `issues` and `metrics` events it
+receives. Two setups are measured: the in-isolate channel (no Durable
+Object) and the REPOSITORY_WRITER Durable Object holding the channel.
+
+Per subscriber count it reports the time to publish one event to every
+subscriber and the webhook latency (the publish runs in the write path),
+the delay until the last subscriber has read its event, the
+bytes sent per event and subscriber, D1 statements per webhook (which must
+not grow with subscribers), and events lost. For comparison it reports
+the D1 statements per minute that the same dashboards cause by refetching
+/api/issues and /api/metrics on every 30-second cache expiry.
+
+    python benchmarks/bench_stream.py [--subscribers 1,100,1000,5000] [--deliveries 50]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from fake_github import FakeGitHub  # noqa: E402
+from local_worker import DurableObjectNamespace, LocalWorker  # noqa: E402
+
+
+REPOSITORY = 'bench/stream'
+WEBHOOK_SECRET = 'bench-webhook-secret'
+
+# The dashboard's request cache lifetime (REQUEST_CACHE_TTL_MS in static/app.js)
+POLL_INTERVAL_S = 30
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Subscriber:
+    """Reads one event stream, recording when each event arrives"""
+
+    def __init__(self, response):
+        self.response = response
+        self.events = []
+        self.bytes = 0
+
+    async def read(self):
+        buffered = ''
+        async for chunk in self.response.body.iter_chunks():
+            self.bytes += len(chunk)
+            buffered += chunk.decode('utf-8')
+            *events, buffered = buffered.split('\n\n')
+            for event in events:
+                for line in event.split('\n'):
+                    if line.startswith('event: '):
+                        self.events.append((line[7:], time.perf_counter()))
+
+
+async def polling_cost(worker):
+    """D1 statements of one dashboard refresh: an issues page and the metrics"""
+    statements = 0
+    for path in (f'/api/issues?repository={REPOSITORY}&per_page=50', f'/api/metrics?repository={REPOSITORY}'):
+        worker.db.reset_counters()
+        await (await worker.fetch('GET', path)).bytes()
+        statements += worker.db.statements
+    return statements
+
+
+async def run_setup(args, subscriber_count, durable_object):
+    github = FakeGitHub(rate_limit=10 ** 9).install()
+    github.add_repository(REPOSITORY, args.issues)
+    env = {'GITHUB_WEBHOOK_SECRET': WEBHOOK_SECRET}
+    if durable_object:
+        env['REPOSITORY_WRITER'] = DurableObjectNamespace('RepositoryWriter')
+    worker = LocalWorker(**env)
+    worker.create_session()
+    await worker.fetch('POST', '/api/sync', body=json.dumps({'repository': REPOSITORY}))
+    refresh_statements = await polling_cost(worker)
+
+    subscribers = []
+    for _ in range(subscriber_count):
+        response = await worker.fetch('GET', f'/api/stream?repository={REPOSITORY}')
+        assert response.status == 200, response.status
+        subscribers.append(Subscriber(response))
+    readers = [asyncio.ensure_future(subscriber.read()) for subscriber in subscribers]
+    await asyncio.sleep(0)
+
+    numbers = sorted(github.repositories[REPOSITORY])[:args.deliveries]
+    latencies = []
+    delays = []
+    statements = 0
+    for number in numbers:
+        issue = github.repositories[REPOSITORY][number]
+        state = 'open' if issue['state'] == 'closed' else 'closed'
+        body, headers = github.issue_event(REPOSITORY, number, state, secret=WEBHOOK_SECRET, updates={'state': state})
+        received = [len(subscriber.events) for subscriber in subscribers]
+        worker.db.reset_counters()
+
+        start = time.perf_counter()
+        response = await worker.fetch('POST', '/webhook', body=body, headers=headers)
+        await response.bytes()
+        latencies.append((time.perf_counter() - start) * 1000)
+        statements += worker.db.statements
+
+        # Let every reader take its events off its stream
+        while subscribers and any(
+            len(subscriber.events) < count + 2 for subscriber, count in zip(subscribers, received)
+        ):
+            await asyncio.sleep(0)
+            if time.perf_counter() - start > 5:
+                break
+        if subscribers:
+            last = max(
+                subscriber.events[count][1] for subscriber, count in zip(subscribers, received)
+                if len(subscriber.events) > count
+            )
+            delays.append((last - start) * 1000)
+
+    for reader in readers:
+        reader.cancel()
+    await asyncio.gather(*readers, return_exceptions=True)
+
+    expected = 1 + 2 * len(numbers)
+    lost = sum(max(0, expected - len(subscriber.events)) for subscriber in subscribers)
+    event_bytes = statistics.mean(subscriber.bytes for subscriber in subscribers) / expected if subscribers else 0
+    worker.db.close()
+    import writer
+    writer.WRITE_QUEUES.clear()
+    return {
+        'webhook_p50_ms': round(statistics.median(latencies), 2),
+        'webhook_p99_ms': round(percentile(latencies, 0.99), 2),
+        'last_subscriber_p50_ms': round(statistics.median(delays), 2) if delays else None,
+        'last_subscriber_p99_ms': round(percentile(delays, 0.99), 2) if delays else None,
+        'bytes_per_event': round(event_bytes),
+        'd1_statements_per_webhook': round(statements / len(numbers), 2),
+        'events_lost': lost,
+        'polling_d1_statements_per_minute': subscriber_count * refresh_statements * 60 // POLL_INTERVAL_S,
+    }
+
+
+def time_publishes():
+    """Wrap Channel.publish to collect the time each published event takes (serialize, encode, enqueue to all)"""
+    import stream
+
+    samples = []
+    publish = stream.Channel.publish
+
+    def timed(channel, event, data):
+        start = time.perf_counter()
+        publish(channel, event, data)
+        if channel.subscribers:
+            samples.append((time.perf_counter() - start) * 1000)
+
+    stream.Channel.publish = timed
+    return samples
+
+
+async def run_all(args):
+    publish_samples = time_publishes()
+    results = {}
+    for name, durable_object in (('in-isolate', False), ('Durable Object', True)):
+        for count in [int(value) for value in args.subscribers.split(',')]:
+            publish_samples.clear()
+            results[f'{name}, {count}'] = await run_setup(args, count, durable_object)
+            results[f'{name}, {count}']['publish_p50_ms'] = (
+                round(statistics.median(publish_samples), 3) if publish_samples else None
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--subscribers', default='0,1,100,1000,5000')
+    parser.add_argument('--deliveries', type=int, default=50)
+    parser.add_argument('--issues', type=int, default=500)
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    # The worker logs every webhook; only the report matters here
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        results = asyncio.run(run_all(args))
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    print(f'{"setup, subscribers":26} {"publish":>8} {"hook p50":>9} {"hook p99":>9} {"last p50":>9} {"last p99":>9} '
+          f'{"B/event":>8} {"D1/hook":>8} {"lost":>5} {"polling D1/min":>15}')
+    for name, row in results.items():
+        print(f'{name:26} {str(row["publish_p50_ms"]):>8} {row["webhook_p50_ms"]:>9} {row["webhook_p99_ms"]:>9} '
+              f'{str(row["last_subscriber_p50_ms"]):>9} {str(row["last_subscriber_p99_ms"]):>9} '
+              f'{row["bytes_per_event"]:>8} {row["d1_statements_per_webhook"]:>8} {row["events_lost"]:>5} '
+              f'{row["polling_d1_statements_per_minute"]:>15}')
+
+
+if __name__ == '__main__':
+    main()
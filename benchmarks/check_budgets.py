@@ -0,0 +1,177 @@
+"""
+Check every route against its declared query budget
+
+Runs requests for every budgeted route in main.ROUTES on the stand-in
+runtime (fake GitHub, seeded D1, QUERY_BUDGETS=enforce). It varies
+repository size, page size, filters and webhook payload size, since
+budgets must hold regardless of them. Each size also runs with
+D1_SHARDS over --shards in-memory databases, where cross-repository reads
+fan out to shards that hold different amounts of data. For each route it
+reports the most D1 round trips and GitHub calls one request made, next to
+the budget.
+Exits non-zero if any request went over, or if a budgeted route was never
+exercised.
+
+    python benchmarks/check_budgets.py [--sizes 100,2000] [--shards 3]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from fake_github import FakeGitHub  # noqa: E402
+from local_worker import LocalWorker, seed_issues  # noqa: E402
+
+
+REPOSITORY = 'bench/budgets'
+WEBHOOK_SECRET = 'bench-webhook-secret'
+STATS_TOKEN = 'bench-stats-token'
+MANY_LABELS = [f'label-{index}' for index in range(40)]
+MANY_ASSIGNEES = [f'user{index}' for index in range(10)]
+
+
+def requests_for(github, size):
+    """(method, path, body, headers) covering each budgeted route in several shapes"""
+    numbers = sorted(github.repositories[REPOSITORY])
+    number = numbers[len(numbers) // 2]
+    requests = [
+        ('GET', '/', None, None),
+        ('GET', '/static/app.js', None, None),
+        ('GET', '/auth', None, None),
+        ('GET', '/auth/callback?code=bench', None, None),
+        ('GET', '/internal/stats', None, {'Authorization': f'Bearer {STATS_TOKEN}'}),
+        ('GET', '/api/session', None, None),
+        ('GET', '/api/sync/status', None, None),
+        ('GET', '/api/repositories', None, None),
+        ('GET', f'/api/issues/{number}?repository={REPOSITORY}', None, None),
+        ('GET', f'/api/repos/{REPOSITORY}/issues/{number}', None, None),
+        ('GET', f'/api/metrics?repository={REPOSITORY}', None, None),
+        ('GET', f'/api/stream?repository={REPOSITORY}', None, None),
+        ('PATCH', f'/api/issues/{number}?repository={REPOSITORY}', '{"labels": ["bug", "ui"]}', None),
+        ('PATCH', f'/api/repos/{REPOSITORY}/issues/{number}', '{"state": "closed"}', None),
+    ]
+
+    for per_page in (1, 50, 100):
+        for query in ('', '&state=open', '&label=bug', '&assignee=user3', '&assignee=none',
+                      '&sort=number&order=asc', f'&page={max(1, size // per_page - 1)}'):
+            requests.append(('GET', f'/api/issues?repository={REPOSITORY}&per_page={per_page}{query}', None, None))
+        requests.append(('GET', f'/api/issues?per_page={per_page}', None, None))
+
+    deliveries = [
+        ('opened', {}),
+        ('labeled', {'labels': MANY_LABELS}),
+        ('assigned', {'assignees': MANY_ASSIGNEES}),
+        ('closed', {'state': 'closed'}),
+        ('reopened', {'state': 'open'}),
+        ('unlabeled', {'labels': []}),
+    ]
+    for action, updates in deliveries:
+        body, headers = github.issue_event(REPOSITORY, numbers[0], action, secret=WEBHOOK_SECRET, updates=updates)
+        requests.append(('POST', '/webhook', body, headers))
+    for action, name, new_name in (('created', 'triage', None), ('edited', 'bug', 'defect'), ('deleted', 'ui', None)):
+        body, headers = github.label_event(REPOSITORY, action, name, secret=WEBHOOK_SECRET, new_name=new_name)
+        requests.append(('POST', '/webhook', body, headers))
+    return requests
+
+
+async def check_size(size, observed, shards=1):
+    import main
+    import stats
+    from shards import shard_for
+
+    github = FakeGitHub().install()
+    issues = github.add_repository(REPOSITORY, size)
+    names = ['DB'] + [f'DB{index}' for index in range(2, shards + 1)]
+    sharding = {'shards': {name: ':memory:' for name in names[1:]}, 'D1_SHARDS': ','.join(names)} if shards > 1 else {}
+    worker = LocalWorker(
+        QUERY_BUDGETS='enforce', GITHUB_WEBHOOK_SECRET=WEBHOOK_SECRET, STATS_TOKEN=STATS_TOKEN,
+        GITHUB_CLIENT_ID='bench', GITHUB_CLIENT_SECRET='bench', **sharding
+    )
+    worker.create_session()
+    seed_issues(worker.databases[shard_for(worker.env, REPOSITORY)], REPOSITORY, issues)
+
+    # Keep each request's counts: on_fetch creates one RequestCounts per request
+    created = []
+    original_init = stats.RequestCounts.__init__
+
+    def recording_init(counts):
+        original_init(counts)
+        created.append(counts)
+
+    stats.RequestCounts.__init__ = recording_init
+    try:
+        for method, path, body, headers in requests_for(github, size):
+            created.clear()
+            response = await worker.fetch(method, path, body=body, headers=headers)
+            # An event stream stays open; its request's work is done once it is returned
+            if response.headers.get('Content-Type') != 'text/event-stream':
+                await response.bytes()
+            route, _, _ = main.ROUTER.match(method, path.split('?')[0])
+            counts = created[0] if created else None
+            observed[route].append((f'{method} {path[:70]} @{size}/{shards}', response.status, counts))
+    finally:
+        stats.RequestCounts.__init__ = original_init
+
+
+async def run(sizes, shards):
+    import main
+
+    observed = defaultdict(list)
+    for size in sizes:
+        await check_size(size, observed)
+        if shards > 1:
+            await check_size(size, observed, shards)
+    return main.ROUTES, observed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='100,2000')
+    parser.add_argument('--shards', type=int, default=3, help='D1 bindings for the sharded pass (1 skips it)')
+    args = parser.parse_args()
+
+    # The worker logs as it goes; only the report matters here
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        routes, observed = asyncio.run(run([int(size) for size in args.sizes.split(',')], args.shards))
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    failures = []
+    print(f'{"route":62} {"requests":>8} {"D1 max":>7} {"budget":>7} {"GH max":>7} {"budget":>7}')
+    for route in routes:
+        if route.budget is None:
+            continue
+        name = f'{route.method} {route.pattern}'
+        samples = observed.get(route, [])
+        if not samples:
+            failures.append(f'{name}: never exercised')
+            print(f'{name:62} {0:>8}')
+            continue
+        d1_max = max(counts.d1_calls for _, _, counts in samples)
+        github_max = max(counts.github_calls for _, _, counts in samples)
+        budget = route.budget
+        print(f'{name:62} {len(samples):>8} {d1_max:>7} {str(budget.d1):>7} {github_max:>7} {str(budget.github):>7}')
+        for label, status, counts in samples:
+            overruns = budget.overruns(counts.d1_calls, counts.github_calls)
+            if overruns:
+                failures.append(f'{label}: ' + ' and '.join(overruns))
+            elif status >= 500:
+                failures.append(f'{label}: status {status}')
+
+    if failures:
+        print('\nFailed:')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print('\nAll routes within budget')
+
+
+if __name__ == '__main__':
+    main()
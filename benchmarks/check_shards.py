@@ -0,0 +1,228 @@
+"""
+Check sharded D1 against a single database
+
+Runs two workers on the stand-in runtime over the same fake GitHub: one
+with D1_SHARDS spread over several SQLite files, one with a single file.
+Both sync the same repositories, receive the same webhooks and run the
+same scheduled sync. The check then confirms three things. First, each
+repository's rows are only on the shard it is routed to. Second, every
+API response matches between the two workers: per repository, and across
+repositories, where the sharded worker fans out and merges. Third, a
+repository moved to another shard (copy, pin in D1_SHARD_MAP, copy again
+and delete from the source) still answers the same and leaves nothing
+behind. Exits non-zero on any mismatch.
+
+    python benchmarks/check_shards.py [--shards 3] [--repositories 8]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from fake_github import FakeGitHub  # noqa: E402
+from local_worker import LocalWorker  # noqa: E402
+
+
+WEBHOOK_SECRET = 'bench-webhook-secret'
+ADMIN_TOKEN = 'bench-admin-token'
+LABELS = ['bug', 'enhancement', 'documentation', 'question', 'ui', 'api']
+
+# Columns that differ between two syncs of the same data
+TIMING_COLUMNS = ('added_at', 'last_sync', 'cursor_updated_at', 'duration_ms', 'issues_per_second')
+SHARDED_TABLES = (
+    'issues', 'metrics', 'time_to_close_histogram', 'sync_status', 'tracked_repositories', 'repositories', 'repo_labels'
+)
+
+
+class Check:
+    def __init__(self):
+        self.failures = []
+        self.passed = 0
+
+    def equal(self, label, actual, expected):
+        if actual == expected:
+            self.passed += 1
+        else:
+            self.failures.append(label)
+
+    def true(self, label, condition):
+        self.equal(label, bool(condition), True)
+
+
+async def get_json(worker, method, path, body=None, headers=None):
+    response = await worker.fetch(method, path, body=body, headers=headers)
+    return response.status, json.loads((await response.bytes()).decode('utf-8') or 'null')
+
+
+def without_timings(status):
+    for row in status['repositories']:
+        for column in TIMING_COLUMNS:
+            row.pop(column, None)
+    return status
+
+
+async def compare(check, sharded, single, path, label=None):
+    """The same GET on both workers must answer the same"""
+    actual = await get_json(sharded, 'GET', path)
+    expected = await get_json(single, 'GET', path)
+    if path.startswith('/api/sync/status'):
+        actual, expected = (actual[0], without_timings(actual[1])), (expected[0], without_timings(expected[1]))
+    check.equal(label or path, actual, expected)
+
+
+async def compare_all(check, sharded, single, repositories, stage):
+    for repository in repositories:
+        for query in ('', '&state=open', '&label=bug', '&sort=number&order=asc', '&page=2&per_page=20'):
+            await compare(check, sharded, single, f'/api/issues?repository={repository}{query}',
+                          f'{stage}: /api/issues {repository}{query}')
+        await compare(check, sharded, single, f'/api/metrics?repository={repository}', f'{stage}: metrics {repository}')
+        await compare(check, sharded, single, f'/api/issues/3?repository={repository}', f'{stage}: issue 3 {repository}')
+
+    # Across repositories the sharded worker merges every shard's page
+    for query in ('per_page=50', 'per_page=50&page=7', 'sort=created_at&order=asc&per_page=100&page=3',
+                  'sort=closed_at&order=desc&per_page=30&page=5', 'sort=time_to_close&order=asc&per_page=25',
+                  'state=closed&label=bug&per_page=40&page=2', 'assignee=user3&sort=number&fields=number,title'):
+        await compare(check, sharded, single, f'/api/issues?{query}', f'{stage}: /api/issues?{query}')
+    await compare(check, sharded, single, '/api/sync/status', f'{stage}: /api/sync/status')
+
+
+def placement(worker, repository):
+    """Shards holding any row of a repository"""
+    holding = set()
+    for name, database in worker.databases.items():
+        for table in SHARDED_TABLES:
+            row = database.connection.execute(
+                f'SELECT COUNT(*) FROM {table} WHERE repository = ?', (repository,)
+            ).fetchone()
+            if row[0]:
+                holding.add(name)
+    return holding
+
+
+async def send_webhooks(workers, github, repositories, rng, count):
+    for _ in range(count):
+        repository = rng.choice(repositories)
+        number = rng.choice(list(github.repositories[repository]))
+        body, headers = github.issue_event(
+            repository, number, 'labeled', secret=WEBHOOK_SECRET, updates={'labels': rng.sample(LABELS, 2)}
+        )
+        for worker in workers:
+            await worker.fetch('POST', '/webhook', body=body, headers=headers)
+
+
+async def run(args, directory):
+    from shards import shard_for
+
+    check = Check()
+    rng = random.Random(args.seed)
+    github = FakeGitHub(rate_limit=10 ** 9).install()
+    repositories = [f'shard-check/repo-{index}' for index in range(args.repositories)]
+    for index, repository in enumerate(repositories):
+        github.add_repository(repository, rng.randint(60, 240), seed=index)
+
+    names = ['DB'] + [f'DB_{index}' for index in range(1, args.shards)]
+    common = dict(GITHUB_WEBHOOK_SECRET=WEBHOOK_SECRET, ADMIN_TOKEN=ADMIN_TOKEN, GITHUB_SYNC_TOKEN='bench-token')
+    sharded = LocalWorker(
+        os.path.join(directory, 'DB.sqlite'),
+        shards={name: os.path.join(directory, f'{name}.sqlite') for name in names[1:]},
+        D1_SHARDS=','.join(names), **common
+    )
+    single = LocalWorker(os.path.join(directory, 'single.sqlite'), **common)
+    workers = (sharded, single)
+    for worker in workers:
+        worker.create_session()
+
+    for repository in repositories:
+        for worker in workers:
+            await worker.fetch('POST', '/api/sync', body=json.dumps({'repository': repository}))
+
+    # Routing: every repository's rows sit on exactly its shard
+    routes = {repository: shard_for(sharded.env, repository) for repository in repositories}
+    for repository, shard in routes.items():
+        check.equal(f'placement of {repository}', placement(sharded, repository), {shard})
+    check.true('repositories spread over more than one shard', len(set(routes.values())) > 1)
+    await compare_all(check, sharded, single, repositories, 'after sync')
+
+    # Webhooks and a scheduled sync write through the same routing
+    await send_webhooks(workers, github, repositories, rng, 60)
+    for repository in repositories[:3]:
+        for number in rng.sample(list(github.repositories[repository]), 5):
+            github.apply_update(github.repositories[repository][number], {'state': 'closed'})
+    for worker in workers:
+        await worker.scheduled()
+    await compare_all(check, sharded, single, repositories, 'after webhooks and scheduled sync')
+
+    # Move one repository to another shard
+    moved = repositories[0]
+    source = routes[moved]
+    target = next(name for name in names if name != source)
+    admin = {'Authorization': f'Bearer {ADMIN_TOKEN}'}
+
+    def move(**fields):
+        return get_json(sharded, 'POST', '/internal/shards/move',
+                        body=json.dumps({'repository': moved, 'target': target, **fields}), headers=admin)
+
+    status, _ = await get_json(sharded, 'POST', '/internal/shards/move', body='{}')
+    check.equal('move without ADMIN_TOKEN is refused', status, 401)
+    status, _ = await move(delete_source=True)
+    check.equal('delete before pinning is refused', status, 409)
+
+    status, result = await move()
+    check.equal('copy to target', (status, result.get('copied')), (200, len(github.repositories[moved])))
+    check.equal(f'{moved} on both shards after the copy', placement(sharded, moved), {source, target})
+
+    # Webhooks keep landing on the source until the pin is deployed
+    await send_webhooks(workers, github, [moved], rng, 10)
+    sharded.env.D1_SHARD_MAP = json.dumps({moved: target})
+    status, result = await move(source=source, delete_source=True)
+    check.equal('finish the move', (status, result.get('deleted_source')), (200, True))
+    check.true('the finishing move copies the late webhooks', result.get('copied', 0) > 0)
+    check.equal(f'{moved} only on {target} after the move', placement(sharded, moved), {target})
+
+    status, report = await get_json(sharded, 'GET', '/internal/shards', headers=admin)
+    check.equal('nothing misplaced after the move', (status, report['misplaced']), (200, []))
+
+    await send_webhooks(workers, github, repositories, rng, 20)
+    await compare_all(check, sharded, single, repositories, 'after the move')
+
+    for worker in workers:
+        for database in worker.databases.values():
+            database.close()
+    return check, routes, target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--shards', type=int, default=3)
+    parser.add_argument('--repositories', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # The workers log every sync and webhook; only the report matters here
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            check, routes, target = asyncio.run(run(args, directory))
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    for repository, shard in sorted(routes.items()):
+        print(f'{repository:30} {shard}')
+    print(f'\n{check.passed} checks passed')
+    if check.failures:
+        print('\nFailed:')
+        for failure in check.failures:
+            print(f'  {failure}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
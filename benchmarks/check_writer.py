@@ -0,0 +1,364 @@
+"""
+Check that concurrent writes to one repository lose no updates
+
+Fires a burst of `issues` webhook deliveries at the stand-in worker. Every
+hot issue gets several successive edits, delivered concurrently and partly
+out of order, while a manual POST /api/sync of the same repository runs
+alongside. D1 round trips take --d1-latency-ms, so requests interleave as
+they do in a real isolate. The stored data is then compared with GitHub's
+final state: each issue's state, labels and assignees, the time-to-close
+histogram cells against a rebuild from the issues table, and today's
+metrics row. The burst runs in three setups:
+
+- one isolate, writes serialized by its in-process queue
+- two isolates sharing D1 and the REPOSITORY_WRITER Durable Object
+- two isolates without the Durable Object (each isolate orders its own
+  writes only; reported, not checked)
+
+A separate check writes one flush in which a stored issue and a new issue
+gain a label the repository has never had, then a flush whose D1 batch
+fails, and compares the stored labels and the isolate's label cache with
+what was actually written.
+
+Exits non-zero if a serialized setup loses anything, or if the label check
+finds a difference. With --baseline-rev
+the same burst also runs against src/ at an earlier revision.
+
+    python benchmarks/check_writer.py [--issues 200] [--hot 20] [--edits 5] [--baseline-rev HEAD~1]
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+
+from bench_startup import prepare_tree  # noqa: E402
+from fake_github import FakeGitHub  # noqa: E402
+from local_worker import DurableObjectNamespace, LocalWorker  # noqa: E402
+
+
+REPOSITORY = 'bench/writer'
+WEBHOOK_SECRET = 'bench-webhook-secret'
+LABELS = ['bug', 'enhancement', 'documentation', 'question', 'ui', 'api']
+USERS = [f'user{index}' for index in range(8)]
+
+
+def edit(github, issue, rng, updated_at):
+    """One edit to an issue on the fake GitHub, with a distinct updated_at"""
+    updates = {'labels': rng.sample(LABELS, rng.randint(0, 3))}
+    if rng.random() < 0.4:
+        updates['assignees'] = rng.sample(USERS, rng.randint(0, 2))
+    if rng.random() < 0.4:
+        updates['state'] = 'open' if issue['state'] == 'closed' else 'closed'
+    github.apply_update(issue, updates)
+    issue['updated_at'] = updated_at.isoformat() + 'Z'
+
+
+def stored_labels(connection, issue_id):
+    """(name, color) of an issue's stored labels, in either label schema"""
+    if connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'issue_labels'").fetchone() is None:
+        query = 'SELECT name, color FROM labels WHERE issue_id = ?'
+        return [tuple(label) for label in connection.execute(query, (issue_id,))]
+    query = ('SELECT l.name, l.color FROM issue_labels il'
+             ' JOIN repo_labels l ON l.repository = ? AND l.id = il.label_id WHERE il.issue_id = ?')
+    return [tuple(label) for label in connection.execute(query, (REPOSITORY, issue_id))]
+
+
+def mismatches(connection, github):
+    """(issues differing from GitHub, histogram cells off, metrics differing) in the stored data"""
+    from percentiles import contributions
+
+    lost = 0
+    for number, issue in github.repositories[REPOSITORY].items():
+        row = connection.execute(
+            'SELECT id, state, updated_at FROM issues WHERE repository = ? AND number = ?', (REPOSITORY, number)
+        ).fetchone()
+        if row is None:
+            lost += 1
+            continue
+        labels = sorted(stored_labels(connection, row['id']))
+        assignees = sorted(username for (username,) in connection.execute(
+            'SELECT username FROM assignees WHERE issue_id = ?', (row['id'],)
+        ))
+        expected = (
+            issue['state'], issue['updated_at'],
+            sorted((label['name'], label['color']) for label in issue['labels']),
+            sorted(assignee['login'] for assignee in issue['assignees']),
+        )
+        if (row['state'], row['updated_at'], labels, assignees) != expected:
+            lost += 1
+
+    cells = Counter()
+    for row in connection.execute(
+        'SELECT id, time_to_close FROM issues WHERE repository = ? AND time_to_close IS NOT NULL', (REPOSITORY,)
+    ).fetchall():
+        labels = [name for name, _ in stored_labels(connection, row['id'])]
+        usernames = [name for (name,) in connection.execute(
+            'SELECT username FROM assignees WHERE issue_id = ?', (row['id'],)
+        )]
+        cells.update(contributions(row['time_to_close'], labels, usernames))
+    stored_cells = {
+        (row['dimension'], row['dimension_value'], row['bucket']): row['count']
+        for row in connection.execute(
+            'SELECT * FROM time_to_close_histogram WHERE repository = ? AND count != 0', (REPOSITORY,)
+        )
+    }
+    cells_off = sum(1 for cell in set(cells) | set(stored_cells) if cells.get(cell, 0) != stored_cells.get(cell, 0))
+
+    metrics = connection.execute(
+        'SELECT total_issues, open_issues, closed_issues FROM metrics WHERE repository = ? AND metric_date = ?',
+        (REPOSITORY, datetime.utcnow().date().isoformat())
+    ).fetchone()
+    actual = connection.execute(
+        "SELECT COUNT(*), SUM(state = 'open'), SUM(state = 'closed') FROM issues WHERE repository = ?", (REPOSITORY,)
+    ).fetchone()
+    return lost, cells_off, int(metrics is None or tuple(metrics) != tuple(actual))
+
+
+async def run_setup(args, isolates, durable_object, directory):
+    rng = random.Random(args.seed)
+    github = FakeGitHub(rate_limit=10 ** 9, latency_ms=args.github_latency_ms).install()
+    github.add_repository(REPOSITORY, args.issues)
+
+    db_path = os.path.join(directory, f'{isolates}-{durable_object}.sqlite')
+    env = {'GITHUB_WEBHOOK_SECRET': WEBHOOK_SECRET}
+    if durable_object:
+        env['REPOSITORY_WRITER'] = DurableObjectNamespace('RepositoryWriter')
+    workers = [LocalWorker(db_path, d1_latency_ms=args.d1_latency_ms, **env) for _ in range(isolates)]
+    session = workers[0].create_session()
+    for worker in workers[1:]:
+        worker.session_id = session
+    await workers[0].fetch('POST', '/api/sync', body=json.dumps({'repository': REPOSITORY}))
+
+    # Successive edits to the hot issues, each captured as a delivery
+    clock = datetime.utcnow()
+    deliveries = []
+    for number in rng.sample(sorted(github.repositories[REPOSITORY]), args.hot):
+        issue = github.repositories[REPOSITORY][number]
+        for _ in range(args.edits):
+            clock += timedelta(seconds=1)
+            edit(github, issue, rng, clock)
+            deliveries.append(github.issue_event(REPOSITORY, number, 'edited', secret=WEBHOOK_SECRET))
+
+    for worker in workers:
+        worker.db.reset_counters()
+    latencies = []
+
+    async def deliver(body, headers):
+        # Jittered arrival: later edits sometimes land first
+        await asyncio.sleep(rng.uniform(0, args.spread_ms) / 1000)
+        start = time.perf_counter()
+        response = await rng.choice(workers).fetch('POST', '/webhook', body=body, headers=headers)
+        await response.bytes()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    async def manual_sync():
+        await asyncio.sleep(rng.uniform(0, args.spread_ms) / 1000)
+        await rng.choice(workers).fetch('POST', '/api/sync', body=json.dumps({'repository': REPOSITORY}))
+
+    started = time.perf_counter()
+    await asyncio.gather(manual_sync(), *(deliver(body, headers) for body, headers in deliveries))
+    elapsed = time.perf_counter() - started
+
+    lost, cells_off, metrics_off = mismatches(workers[0].db.connection, github)
+    try:
+        import writer
+        queues = list(writer.WRITE_QUEUES.values())
+        if durable_object:
+            queues = [instance.queue for instance in env['REPOSITORY_WRITER'].instances.values() if instance.queue]
+        flushes = sum(queue.flushes for queue in queues)
+        coalesced = sum(queue.coalesced for queue in queues)
+        writer.WRITE_QUEUES.clear()
+    except ImportError:
+        flushes = coalesced = None
+
+    for worker in workers:
+        worker.db.close()
+    return {
+        'deliveries': len(deliveries),
+        'elapsed_s': round(elapsed, 3),
+        'webhook_p50_ms': round(statistics.median(latencies), 2),
+        'webhook_max_ms': round(max(latencies), 2),
+        'd1_batches': sum(worker.db.batches for worker in workers),
+        'd1_statements': sum(worker.db.statements for worker in workers),
+        'flushes': flushes,
+        'coalesced': coalesced,
+        'issues_lost': lost,
+        'histogram_cells_off': cells_off,
+        'metrics_off': metrics_off,
+    }
+
+
+async def check_new_labels():
+    """Differences between written label payloads and the stored labels and label cache, for new labels in one flush"""
+    import metadata
+    import writer
+
+    github = FakeGitHub(rate_limit=10 ** 9).install()
+    issues = github.add_repository(REPOSITORY, 20)
+    worker = LocalWorker()
+    worker.create_session()
+    await worker.fetch('POST', '/api/sync', body=json.dumps({'repository': REPOSITORY}))
+    failures = []
+
+    def compare(payloads, when):
+        for payload in payloads:
+            labels = sorted(stored_labels(worker.db.connection, payload['id']))
+            expected = sorted((label['name'], label['color']) for label in payload['labels'])
+            if labels != expected:
+                failures.append(f'{when}: issue {payload["number"]} stored {labels}, expected {expected}')
+
+    def edited(issue, labels, number=None):
+        payload = copy.deepcopy(issue)
+        payload['labels'] = payload['labels'] + labels
+        payload['updated_at'] = (datetime.utcnow() + timedelta(days=1)).isoformat() + 'Z'
+        if number is not None:
+            payload['number'] = number
+            payload['id'] = issue['id'] - issue['number'] + number
+        return payload
+
+    # A stored issue gains a new label ahead of a new issue with it, in one flush
+    label = [{'name': 'brand-new', 'color': '123456'}]
+    flush = [edited(issues[0], label), edited(issues[1], label, number=len(issues) + 1)]
+    await writer.write_issues(worker.env, REPOSITORY, flush)
+    compare(flush, 'one flush')
+
+    # A batch that fails leaves nothing in the cache it did not write
+    label = [{'name': 'flaky', 'color': '654321'}]
+    flush = [edited(issues[2], label)]
+    batch = worker.db.batch
+    calls = []
+
+    async def failing_batch(statements):
+        calls.append(len(statements))
+        # The first batch reads the stored rows; the second writes them
+        if len(calls) == 2:
+            raise Exception('injected D1 failure')
+        return await batch(statements)
+
+    worker.db.batch = failing_batch
+    try:
+        await writer.write_issues(worker.env, REPOSITORY, flush)
+        failures.append('failed batch: the injected failure did not happen')
+    except Exception:
+        pass
+    finally:
+        worker.db.batch = batch
+    cached = metadata.cached_labels(worker.env, REPOSITORY)
+    if cached is not None and 'flaky' in cached.colors:
+        failures.append('failed batch: the label cache holds a label that was never written')
+    await writer.write_issues(worker.env, REPOSITORY, flush)
+    compare(flush, 'retry after a failed batch')
+
+    writer.WRITE_QUEUES.clear()
+    worker.db.close()
+    return failures
+
+
+async def run_all(args):
+    import main
+
+    setups = [('1 isolate, in-process queue', 1, False, True)]
+    if hasattr(main, 'RepositoryWriter'):
+        setups.append(('2 isolates, Durable Object', 2, True, True))
+    setups.append(('2 isolates, no Durable Object', 2, False, False))
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, isolates, durable_object, checked in setups:
+            results[name] = await run_setup(args, isolates, durable_object, directory)
+            results[name]['checked'] = checked
+    return results
+
+
+def run_baseline_rev(rev, args):
+    """The same bursts run in a subprocess against src/ at an earlier revision"""
+    with tempfile.TemporaryDirectory() as workdir:
+        src_dir = prepare_tree(rev, workdir)
+        output = os.path.join(workdir, 'baseline.json')
+        command = [
+            sys.executable, os.path.abspath(__file__), '--src', src_dir, '--output', output,
+            '--issues', str(args.issues), '--hot', str(args.hot), '--edits', str(args.edits),
+            '--spread-ms', str(args.spread_ms), '--d1-latency-ms', str(args.d1_latency_ms),
+            '--github-latency-ms', str(args.github_latency_ms), '--seed', str(args.seed),
+        ]
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(output) as results:
+            return json.load(results)
+
+
+def print_results(title, results):
+    print(title)
+    print(f'{"setup":32} {"webhooks":>8} {"p50 ms":>8} {"max ms":>8} {"batches":>8} {"stmts":>7} '
+          f'{"flushes":>8} {"merged":>7} {"lost":>5} {"cells":>6} {"metrics":>8}')
+    for name, row in results.items():
+        print(f'{name:32} {row["deliveries"]:>8} {row["webhook_p50_ms"]:>8} {row["webhook_max_ms"]:>8} '
+              f'{row["d1_batches"]:>8} {row["d1_statements"]:>7} {str(row["flushes"]):>8} {str(row["coalesced"]):>7} '
+              f'{row["issues_lost"]:>5} {row["histogram_cells_off"]:>6} {row["metrics_off"]:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--issues', type=int, default=200)
+    parser.add_argument('--hot', type=int, default=20, help='issues edited during the burst')
+    parser.add_argument('--edits', type=int, default=5, help='edits (deliveries) per hot issue')
+    parser.add_argument('--spread-ms', type=float, default=30, help='deliveries arrive within this window')
+    parser.add_argument('--d1-latency-ms', type=float, default=1)
+    parser.add_argument('--github-latency-ms', type=float, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline-rev', help='git revision to run the same bursts against')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--src', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.src:
+        sys.path.insert(0, args.src)
+
+    # The worker logs every webhook; only the report matters here
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        results = asyncio.run(run_all(args))
+        label_failures = [] if args.src else asyncio.run(check_new_labels())
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.src:
+        return
+
+    print_results('Current tree', results)
+    if args.baseline_rev:
+        print()
+        print_results(f'Baseline {args.baseline_rev}', run_baseline_rev(args.baseline_rev, args))
+
+    print('\nNew labels in one flush and after a failed batch: ' + ('ok' if not label_failures else 'FAILED'))
+    for failure in label_failures:
+        print(f'  {failure}')
+
+    failures = [
+        name for name, row in results.items()
+        if row['checked'] and (row['issues_lost'] or row['histogram_cells_off'] or row['metrics_off'])
+    ]
+    if failures:
+        print('\nLost updates with serialized writes: ' + ', '.join(failures))
+    if failures or label_failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
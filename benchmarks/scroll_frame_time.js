@@ -0,0 +1,82 @@
+/*
+ * Issues table scroll frame time
+ *
+ * Paste into the browser devtools console on the signed-in dashboard. It
+ * fills the table with synthetic issues, scrolls from top to bottom one step
+ * per animation frame, and reports frame-time percentiles and how many rows
+ * were in the DOM, first with the virtualized renderer (displayIssues) and
+ * then with every row rendered up front, as the table used to be.
+ *
+ *   await measureScrollFrameTime(10000)
+ */
+async function measureScrollFrameTime(rowCount = 10000, frames = 300) {
+  const labelPool = ['bug', 'enhancement', 'documentation', 'question', 'ui', 'api'];
+  const issues = [];
+  for (let number = 1; number <= rowCount; number++) {
+    const closed = number % 3 === 0;
+    issues.push({
+      number,
+      title: `Synthetic issue ${number} ` + labelPool[number % labelPool.length].repeat(3),
+      state: closed ? 'closed' : 'open',
+      html_url: '#',
+      labels: labelPool.slice(0, number % 3).map(name => ({ name, color: 'd73a4a' })),
+      assignees: number % 2 ? [`user${number % 17}`] : [],
+      assignee: number % 2 ? `user${number % 17}` : null,
+      created_at: new Date(Date.UTC(2024, 0, 1) + number * 3600000).toISOString(),
+      updated_at: new Date(Date.UTC(2024, 0, 2) + number * 3600000).toISOString(),
+      closed_at: null,
+      time_to_close: closed ? number % 900 : null
+    });
+  }
+
+  document.getElementById('app-section').style.display = 'block';
+  const viewport = document.getElementById('issues-viewport');
+  const tbody = document.getElementById('issues-body');
+
+  async function scrollThrough() {
+    const step = (viewport.scrollHeight - viewport.clientHeight) / frames;
+    const durations = [];
+    let maxRows = 0;
+    await new Promise(requestAnimationFrame);
+    let last = performance.now();
+    for (let i = 1; i <= frames; i++) {
+      viewport.scrollTop = step * i;
+      await new Promise(requestAnimationFrame);
+      const now = performance.now();
+      durations.push(now - last);
+      last = now;
+      maxRows = Math.max(maxRows, tbody.rows.length);
+    }
+    durations.sort((a, b) => a - b);
+    const pick = q => +durations[Math.min(durations.length - 1, Math.floor(q * durations.length))].toFixed(2);
+    return {
+      p50_ms: pick(0.5),
+      p95_ms: pick(0.95),
+      p99_ms: pick(0.99),
+      max_ms: +durations[durations.length - 1].toFixed(2),
+      frames_over_16ms: durations.filter(d => d > 16.7).length,
+      dom_rows: maxRows
+    };
+  }
+
+  let start = performance.now();
+  displayIssues(issues);
+  const virtualRenderMs = performance.now() - start;
+  const virtualized = { render_ms: +virtualRenderMs.toFixed(2), ...(await scrollThrough()) };
+
+  // Baseline: build every row, then scroll with the virtual window disabled
+  start = performance.now();
+  viewport.onscroll = null;
+  tbody.innerHTML = '';
+  issues.forEach(issue => tbody.appendChild(createIssueRow(issue)));
+  viewport.scrollTop = 0;
+  const fullRenderMs = performance.now() - start;
+  const fullRender = { render_ms: +fullRenderMs.toFixed(2), ...(await scrollThrough()) };
+
+  viewport.onscroll = renderVisibleRows;
+  displayIssues([]);
+
+  const report = { rows: rowCount, frames, virtualized, full_render: fullRender };
+  console.table({ virtualized, full_render: fullRender });
+  return report;
+}
@@ -0,0 +1,147 @@
+"""
+SQLite-backed stand-in for a Cloudflare D1 binding
+
+Mirrors the D1 statement API used by src/ (prepare/bind/run/all/first and
+DB.batch) and returns results in D1's shape. Every executed statement is
+counted in `statements`, and the size of every returned value in
+`bytes_read`, so benchmarks can report D1 work per request.
+With js_results=True, results come back wrapped in the stand-in JsProxy,
+as JS objects do in Pyodide, so FFI crossings can be counted. With
+latency_ms, every call (a batch is one) first yields to the event loop for
+that long, as a real round trip does, so concurrent requests interleave.
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import time
+
+from pyodide.ffi import JsProxy
+
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'schema.sql')
+
+
+def schema_path():
+    """schema.sql of the src/ tree on sys.path (a --baseline-rev checkout), else this tree's"""
+    for entry in sys.path:
+        if entry and os.path.exists(os.path.join(entry, 'main.py')):
+            candidate = os.path.join(entry, '..', 'schema.sql')
+            if os.path.exists(candidate):
+                return candidate
+    return SCHEMA_PATH
+
+
+def value_size(value):
+    """Bytes a column value occupies in a result set (SQLite storage size)"""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, bytes):
+        return len(value)
+    return 8
+
+
+class D1Result(dict):
+    """D1 result envelope: {'results': [...], 'success': True, 'meta': {...}}"""
+
+
+class D1PreparedStatement:
+    def __init__(self, database, query, params=()):
+        self.database = database
+        self.query = query
+        self.params = params
+
+    def bind(self, *params):
+        return D1PreparedStatement(self.database, self.query, params)
+
+    def _execute(self):
+        start = time.perf_counter()
+        cursor = self.database.connection.execute(self.query, self.params)
+        rows = [dict(row) for row in cursor.fetchall()] if cursor.description else []
+        duration = time.perf_counter() - start
+        self.database.statements += 1
+        self.database.bytes_read += sum(value_size(value) for row in rows for value in row.values())
+        return D1Result(
+            results=rows,
+            success=True,
+            meta={
+                'changes': cursor.rowcount if cursor.rowcount > 0 else 0,
+                'last_row_id': cursor.lastrowid,
+                'rows_read': len(rows),
+                'duration': duration * 1000,
+            }
+        )
+
+    async def run(self):
+        await self.database.round_trip()
+        result = self._execute()
+        self.database.connection.commit()
+        return self.database.wrap(result)
+
+    async def all(self):
+        await self.database.round_trip()
+        return self.database.wrap(self._execute())
+
+    async def first(self, column=None):
+        await self.database.round_trip()
+        rows = self._execute()['results']
+        if not rows:
+            return None
+        return rows[0][column] if column else self.database.wrap(rows[0])
+
+    async def raw(self):
+        await self.database.round_trip()
+        return [list(row.values()) for row in self._execute()['results']]
+
+
+class D1Database:
+    def __init__(self, path=':memory:', js_results=False, latency_ms=0):
+        self.path = path
+        self.js_results = js_results
+        self.latency_ms = latency_ms
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.statements = 0
+        self.batches = 0
+        self.bytes_read = 0
+
+    def wrap(self, value):
+        return JsProxy(value) if self.js_results else value
+
+    def prepare(self, query):
+        return D1PreparedStatement(self, query)
+
+    async def round_trip(self):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    async def batch(self, statements):
+        await self.round_trip()
+        self.batches += 1
+        try:
+            results = [statement._execute() for statement in statements]
+        except Exception:
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+        return self.wrap(results)
+
+    async def exec(self, script):
+        self.connection.executescript(script)
+        return {'count': script.count(';')}
+
+    def load_schema(self, path=None):
+        with open(path or schema_path()) as schema:
+            self.connection.executescript(schema.read())
+
+    def reset_counters(self):
+        self.statements = 0
+        self.batches = 0
+        self.bytes_read = 0
+
+    def close(self):
+        self.connection.close()
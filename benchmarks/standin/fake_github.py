@@ -0,0 +1,219 @@
+"""
+In-process fake of the GitHub REST API
+
+The worker's outbound fetch() goes through the stand-in js module, so this
+fake answers those calls directly rather than over a socket: the issue
+list (paginated, with pull requests mixed in, honouring `since` and
+sort=updated), single issues, issue PATCHes, /user and the OAuth token
+exchange, with X-RateLimit-* headers that count down and a 403 once the
+budget is spent. Repositories are generated with
+local_worker.generate_issues and updated in place by PATCHes.
+
+    github = FakeGitHub()
+    github.add_repository('bench/repo', 10000)
+    github.install()
+
+It also builds signed `issues` webhook deliveries for the same issues, and
+`label` deliveries that rename, recolor or delete a label on all of them.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import re
+import time
+from collections import Counter
+from datetime import datetime
+from urllib.parse import parse_qsl, urlsplit
+
+import js
+from local_worker import LABEL_COLORS, generate_issues
+
+
+ISSUES_PATH = re.compile(r'^/repos/([^/]+/[^/]+)/issues$')
+ISSUE_PATH = re.compile(r'^/repos/([^/]+/[^/]+)/issues/(\d+)$')
+
+
+def now_iso():
+    return datetime.utcnow().replace(microsecond=0).isoformat() + 'Z'
+
+
+def sign(body, secret):
+    """X-Hub-Signature-256 value for a webhook body"""
+    digest = hmac.new(secret.encode('utf-8'), body.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f'sha256={digest}'
+
+
+class FakeGitHub:
+    """Generated repositories served through the stand-in fetch()"""
+
+    def __init__(self, rate_limit=5000, latency_ms=0, pull_request_every=0):
+        self.repositories = {}
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.reset_at = int(time.time()) + 3600
+        self.latency_ms = latency_ms
+        # Every Nth list item is a pull request, which the worker must skip
+        self.pull_request_every = pull_request_every
+        self.calls = Counter()
+
+    def add_repository(self, full_name, issue_count, seed=1, **options):
+        issues = generate_issues(full_name, issue_count, seed=seed, **options)
+        self.repositories[full_name] = {issue['number']: issue for issue in issues}
+        return issues
+
+    def issues(self, full_name):
+        return list(self.repositories[full_name].values())
+
+    def install(self):
+        js.set_fetch_handler(self.handle)
+        return self
+
+    def reset_counters(self):
+        self.calls.clear()
+
+    def _response(self, status, data):
+        headers = {
+            'Content-Type': 'application/json',
+            'X-RateLimit-Limit': str(self.rate_limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(self.reset_at),
+        }
+        return js.Response.new(json.dumps(data), status=status, headers=headers)
+
+    async def handle(self, url, options):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        method = options.get('method', 'GET').upper()
+        parts = urlsplit(url)
+        query = dict(parse_qsl(parts.query))
+
+        if self.remaining <= 0:
+            self.calls['rate_limited'] += 1
+            return self._response(403, {'message': 'API rate limit exceeded'})
+        self.remaining -= 1
+
+        match = ISSUES_PATH.match(parts.path)
+        if match and method == 'GET':
+            self.calls['list_issues'] += 1
+            return self._list_issues(match.group(1), query)
+
+        match = ISSUE_PATH.match(parts.path)
+        if match:
+            repository = self.repositories.get(match.group(1), {})
+            issue = repository.get(int(match.group(2)))
+            if issue is None:
+                return self._response(404, {'message': 'Not Found'})
+            if method == 'PATCH':
+                self.calls['update_issue'] += 1
+                self.apply_update(issue, json.loads(options.get('body') or '{}'))
+            else:
+                self.calls['get_issue'] += 1
+            return self._response(200, issue)
+
+        if parts.path == '/user':
+            self.calls['user'] += 1
+            return self._response(200, {'login': 'bench-user', 'id': 1})
+
+        if parts.path == '/login/oauth/access_token' and method == 'POST':
+            self.calls['oauth_token'] += 1
+            return self._response(200, {'access_token': 'fake-token', 'token_type': 'bearer'})
+
+        self.calls['not_found'] += 1
+        return self._response(404, {'message': 'Not Found'})
+
+    def _list_issues(self, full_name, query):
+        if full_name not in self.repositories:
+            return self._response(404, {'message': 'Not Found'})
+        state = query.get('state', 'open')
+        per_page = min(int(query.get('per_page', 30)), 100)
+        page = int(query.get('page', 1))
+
+        since = query.get('since')
+        items = [
+            issue for issue in self.repositories[full_name].values()
+            if (state == 'all' or issue['state'] == state) and (not since or issue['updated_at'] >= since)
+        ]
+        if query.get('sort') == 'updated':
+            items.sort(key=lambda issue: issue['updated_at'], reverse=query.get('direction', 'desc') == 'desc')
+        if self.pull_request_every:
+            with_prs = []
+            for index, issue in enumerate(items, 1):
+                with_prs.append(issue)
+                if index % self.pull_request_every == 0:
+                    with_prs.append({**issue, 'number': issue['number'] + 10_000_000, 'pull_request': {}})
+            items = with_prs
+        start = (page - 1) * per_page
+        return self._response(200, items[start:start + per_page])
+
+    def apply_update(self, issue, updates):
+        """Apply a PATCH /issues/:number body the way GitHub does"""
+        for key in ('title', 'body'):
+            if key in updates:
+                issue[key] = updates[key]
+        if 'state' in updates and updates['state'] != issue['state']:
+            issue['state'] = updates['state']
+            issue['closed_at'] = now_iso() if updates['state'] == 'closed' else None
+        if 'labels' in updates:
+            issue['labels'] = [
+                label if isinstance(label, dict) else {'name': label, 'color': LABEL_COLORS.get(label, 'ededed')}
+                for label in updates['labels']
+            ]
+        if 'assignees' in updates:
+            issue['assignees'] = [{'login': login} for login in updates['assignees']]
+            issue['assignee'] = issue['assignees'][0] if issue['assignees'] else None
+        issue['updated_at'] = now_iso()
+        return issue
+
+    def issue_event(self, full_name, number, action, secret=None, updates=None):
+        """(body, headers) of a signed `issues` webhook delivery, applying updates first"""
+        issue = self.repositories[full_name][number]
+        if updates:
+            self.apply_update(issue, updates)
+        body = json.dumps({
+            'action': action,
+            'issue': issue,
+            'repository': {'full_name': full_name},
+        })
+        headers = {
+            'X-GitHub-Event': 'issues',
+            'X-GitHub-Delivery': f'{full_name}#{number}@{issue["updated_at"]}',
+            'Content-Type': 'application/json',
+            'X-Hub-Signature-256': sign(body, secret or ''),
+        }
+        return body, headers
+
+    def label_event(self, full_name, action, name, secret=None, new_name=None, color=None):
+        """(body, headers) of a signed `label` webhook delivery, applying the change to every issue first"""
+        label = {'name': name, 'color': color or LABEL_COLORS.get(name, 'ededed')}
+        changes = {}
+        for issue in self.repositories[full_name].values():
+            for existing in list(issue['labels']):
+                if existing['name'] != name:
+                    continue
+                if action == 'deleted':
+                    issue['labels'].remove(existing)
+                    continue
+                label['color'] = color or existing['color']
+                if color and color != existing['color']:
+                    changes['color'] = {'from': existing['color']}
+                existing.update(name=new_name or name, color=label['color'])
+        if action == 'edited' and new_name and new_name != name:
+            changes['name'] = {'from': name}
+            label['name'] = new_name
+
+        body = json.dumps({
+            'action': action,
+            'label': label,
+            'changes': changes,
+            'repository': {'full_name': full_name},
+        })
+        headers = {
+            'X-GitHub-Event': 'label',
+            'X-GitHub-Delivery': f'{full_name}:{action}:{name}@{now_iso()}',
+            'Content-Type': 'application/json',
+            'X-Hub-Signature-256': sign(body, secret or ''),
+        }
+        return body, headers
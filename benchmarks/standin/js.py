@@ -0,0 +1,284 @@
+"""
+Local stand-in for the Pyodide `js` module
+
+Implements just enough of the Workers runtime surface used by src/ for the
+worker to run under CPython: Response, Headers, URL, ReadableStream (pull
+or push), TextEncoder, Object, JSON, fetch and crypto. Outbound fetch()
+calls are routed to a handler installed with set_fetch_handler().
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+from types import SimpleNamespace
+from urllib.parse import parse_qsl, urlsplit
+
+from pyodide.ffi import JsProxy
+
+
+class Headers:
+    """Case-insensitive header map"""
+
+    def __init__(self, init=None):
+        self._values = {}
+        for key, value in (init or {}).items():
+            self.set(key, value)
+
+    @staticmethod
+    def new(init=None):
+        return Headers(init)
+
+    def set(self, key, value):
+        self._values[key.lower()] = (key, str(value))
+
+    def append(self, key, value):
+        if self.has(key):
+            name, existing = self._values[key.lower()]
+            self._values[key.lower()] = (name, f'{existing}, {value}')
+        else:
+            self.set(key, value)
+
+    def get(self, key):
+        entry = self._values.get(key.lower())
+        return entry[1] if entry else None
+
+    def has(self, key):
+        return key.lower() in self._values
+
+    def delete(self, key):
+        self._values.pop(key.lower(), None)
+
+    def items(self):
+        return [(name, value) for name, value in self._values.values()]
+
+    def __iter__(self):
+        return iter(self.items())
+
+
+class URLSearchParams:
+    def __init__(self, query=''):
+        self._pairs = parse_qsl(query.lstrip('?'), keep_blank_values=True)
+
+    def get(self, key):
+        for name, value in self._pairs:
+            if name == key:
+                return value
+        return None
+
+    def has(self, key):
+        return any(name == key for name, _ in self._pairs)
+
+    def getAll(self, key):
+        return [value for name, value in self._pairs if name == key]
+
+
+class URL:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.href = url
+        self.protocol = parts.scheme + ':'
+        self.host = parts.netloc
+        self.origin = f'{parts.scheme}://{parts.netloc}'
+        self.pathname = parts.path or '/'
+        self.search = f'?{parts.query}' if parts.query else ''
+        self.searchParams = URLSearchParams(parts.query)
+
+    @staticmethod
+    def new(url):
+        return URL(url)
+
+
+class TextEncoder:
+    @staticmethod
+    def new():
+        return TextEncoder()
+
+    def encode(self, text=''):
+        return text.encode('utf-8')
+
+
+class TextDecoder:
+    @staticmethod
+    def new():
+        return TextDecoder()
+
+    def decode(self, data=b''):
+        return bytes(data).decode('utf-8')
+
+
+class Object:
+    @staticmethod
+    def fromEntries(entries):
+        return dict(entries)
+
+
+class JSON:
+    @staticmethod
+    def stringify(value):
+        if isinstance(value, JsProxy):
+            value = value._value
+        return json.dumps(value, separators=(',', ':'))
+
+    @staticmethod
+    def parse(text):
+        return json.loads(text)
+
+
+class _StreamController:
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+        self.cancelled = False
+        self.failure = None
+        self.ready = asyncio.Event()
+
+    def enqueue(self, chunk):
+        if self.closed or self.cancelled:
+            raise TypeError('Invalid state: the stream is closed')
+        self.chunks.append(bytes(chunk))
+        self.ready.set()
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+    def error(self, reason):
+        self.failure = reason
+        self.ready.set()
+
+
+class ReadableStream:
+    """Pull-based, or push-based (a start() that enqueues later); consumers drain it with iter_chunks() or getReader()"""
+
+    def __init__(self, source):
+        self._source = source or {}
+        self._controller = _StreamController()
+        self._started = False
+
+    @staticmethod
+    def new(source=None):
+        return ReadableStream(source)
+
+    def getReader(self):
+        return _StreamReader(self.iter_chunks())
+
+    async def iter_chunks(self):
+        controller = self._controller
+        if not self._started:
+            self._started = True
+            if 'start' in self._source:
+                await _maybe_await(self._source['start'](controller))
+        try:
+            while True:
+                while controller.chunks:
+                    yield controller.chunks.pop(0)
+                if controller.failure is not None:
+                    raise Exception(controller.failure)
+                if controller.closed:
+                    return
+                if 'pull' in self._source:
+                    await _maybe_await(self._source['pull'](controller))
+                elif 'start' in self._source:
+                    # Pushed chunks arrive from elsewhere; wait for the next one
+                    controller.ready.clear()
+                    await controller.ready.wait()
+                else:
+                    return
+        finally:
+            # The consumer stopped reading (a client disconnecting) before the stream ended
+            if not controller.closed and controller.failure is None:
+                controller.cancelled = True
+                if 'cancel' in self._source:
+                    await _maybe_await(self._source['cancel'](None))
+
+
+class _Uint8ArrayProxy(bytes):
+    """A chunk read from a stream, as Pyodide hands it to Python"""
+
+    def to_bytes(self):
+        return bytes(self)
+
+
+class _StreamReader:
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    async def read(self):
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return SimpleNamespace(done=True, value=None)
+        return SimpleNamespace(done=False, value=_Uint8ArrayProxy(chunk))
+
+
+async def _maybe_await(value):
+    if hasattr(value, '__await__'):
+        return await value
+    return value
+
+
+class Response:
+    def __init__(self, body=None, status=200, headers=None, statusText='', **init):
+        self.body = body
+        self.status = status
+        self.statusText = statusText
+        self.headers = headers if isinstance(headers, Headers) else Headers(headers)
+        self.ok = 200 <= status < 300
+
+    @staticmethod
+    def new(body=None, status=200, headers=None, statusText='', **init):
+        return Response(body, status, headers, statusText, **init)
+
+    async def bytes(self):
+        if self.body is None:
+            return b''
+        if isinstance(self.body, ReadableStream):
+            return b''.join([chunk async for chunk in self.body.iter_chunks()])
+        if isinstance(self.body, str):
+            return self.body.encode('utf-8')
+        return bytes(self.body)
+
+    async def text(self):
+        return (await self.bytes()).decode('utf-8')
+
+    async def json(self):
+        return json.loads(await self.text())
+
+
+_fetch_handler = None
+
+
+def set_fetch_handler(handler):
+    """Route outbound fetch(url, options) calls to an async handler"""
+    global _fetch_handler
+    _fetch_handler = handler
+
+
+async def fetch(url, options=None):
+    if _fetch_handler is None:
+        raise Exception(f'No fetch handler installed for {url}')
+    return await _fetch_handler(url, options or {})
+
+
+class _Uint8Array:
+    @staticmethod
+    def new(data):
+        return bytes(data)
+
+
+class _SubtleCrypto:
+    async def importKey(self, key_format, key_data, algorithm, extractable, usages):
+        return bytes(key_data)
+
+    async def sign(self, algorithm, key, data):
+        return hmac.new(key, bytes(data), hashlib.sha256).digest()
+
+
+class _Crypto:
+    TextEncoder = TextEncoder
+    Uint8Array = _Uint8Array
+    subtle = _SubtleCrypto()
+
+
+crypto = _Crypto()
@@ -0,0 +1,258 @@
+"""
+Run the worker's on_fetch (and on_scheduled) locally against the stand-in runtime
+
+    sys.path[:0] = [STANDIN_DIR, SRC_DIR]
+    from local_worker import LocalWorker
+    worker = LocalWorker()
+    response = await worker.fetch('GET', '/api/issues?repository=o/r')
+
+Several LocalWorkers opened on the same SQLite file act as isolates sharing
+one D1 database; give them the same DurableObjectNamespace to share
+Durable Objects too.
+"""
+
+import os
+import random
+import sys
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from d1 import D1Database
+from js import Headers, ReadableStream
+
+
+STANDIN_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(STANDIN_DIR, '..', '..', 'src')
+BASE_URL = 'http://localhost:8787'
+
+# Request bodies reach the worker in chunks of this size, like a network read
+REQUEST_CHUNK_SIZE = 16 * 1024
+
+if SRC_DIR not in sys.path:
+    sys.path.insert(1, SRC_DIR)
+
+
+def ensure_static_bundle():
+    """Run the asset build (normally wrangler's build step) if it has not run yet"""
+    if not os.path.exists(os.path.join(SRC_DIR, 'static_bundle.py')):
+        import runpy
+        build = runpy.run_path(os.path.join(STANDIN_DIR, '..', '..', 'scripts', 'build_assets.py'))
+        with open(os.path.join(SRC_DIR, 'static_bundle.py'), 'w', encoding='utf-8') as output:
+            output.write(build['render_module'](build['build']()))
+
+
+ensure_static_bundle()
+
+
+class Request:
+    """Incoming request as seen by on_fetch"""
+
+    def __init__(self, method, url, body=None, headers=None):
+        self.method = method
+        self.url = url
+        self.headers = Headers(headers)
+        self._body = body
+
+    @property
+    def body(self):
+        """The body as a ReadableStream, delivered in chunks of REQUEST_CHUNK_SIZE bytes"""
+        if self._body is None:
+            return None
+        data = self._body if isinstance(self._body, bytes) else self._body.encode('utf-8')
+        chunks = [data[start:start + REQUEST_CHUNK_SIZE] for start in range(0, len(data), REQUEST_CHUNK_SIZE)]
+
+        def pull(controller):
+            if chunks:
+                controller.enqueue(chunks.pop(0))
+            else:
+                controller.close()
+        return ReadableStream.new({'pull': pull})
+
+    async def text(self):
+        if self._body is None:
+            return ''
+        if isinstance(self._body, bytes):
+            return self._body.decode('utf-8')
+        return self._body
+
+    def clone(self):
+        return Request(self.method, self.url, self._body, dict(self.headers.items()))
+
+
+class LocalWorker:
+    """A worker isolate: one env (D1 bindings + vars) plus an authenticated session"""
+
+    def __init__(self, db_path=':memory:', js_results=False, shards=None, d1_latency_ms=0, **env_vars):
+        self.db = D1Database(db_path, js_results=js_results, latency_ms=d1_latency_ms)
+        self.db.load_schema()
+        # Further D1 bindings (binding name -> SQLite path), as D1_SHARDS names them
+        self.databases = {'DB': self.db}
+        for name, path in (shards or {}).items():
+            self.databases[name] = D1Database(path, js_results=js_results, latency_ms=d1_latency_ms)
+            self.databases[name].load_schema()
+        self.env = SimpleNamespace(**self.databases, **env_vars)
+        for value in env_vars.values():
+            if isinstance(value, DurableObjectNamespace):
+                value.bind(self.env)
+        self.session_id = None
+
+    def create_session(self, username='bench-user', access_token='bench-token'):
+        self.session_id = str(uuid.uuid4())
+        self.db.connection.execute(
+            'INSERT INTO sessions (id, username, access_token, created_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+            (
+                self.session_id,
+                username,
+                access_token,
+                datetime.utcnow().isoformat(),
+                (datetime.utcnow() + timedelta(days=7)).isoformat(),
+            )
+        )
+        self.db.connection.commit()
+        return self.session_id
+
+    async def fetch(self, method, path, body=None, headers=None, authenticated=True):
+        from main import on_fetch
+
+        request_headers = dict(headers or {})
+        if authenticated and self.session_id:
+            request_headers.setdefault('Cookie', f'session={self.session_id}')
+        request = Request(method, BASE_URL + path, body, request_headers)
+        return await on_fetch(request, self.env)
+
+    async def scheduled(self, cron='*/15 * * * *'):
+        """Fire the worker's cron trigger"""
+        from main import on_scheduled
+
+        await on_scheduled(SimpleNamespace(cron=cron, scheduledTime=datetime.utcnow().timestamp() * 1000), self.env, None)
+
+
+class DurableObjectStub:
+    """What namespace.get(id) returns: fetch() reaches the object, creating it on first use"""
+
+    def __init__(self, namespace, name):
+        self.namespace = namespace
+        self.name = name
+
+    async def fetch(self, url, options=None):
+        options = options or {}
+        instance = self.namespace.instances.get(self.name)
+        if instance is None:
+            import main
+
+            cls = getattr(main, self.namespace.class_name)
+            ctx = SimpleNamespace(id=self.name)
+            instance = self.namespace.instances[self.name] = cls(ctx, self.namespace.env)
+        request = Request(options.get('method', 'GET'), url, options.get('body'), options.get('headers'))
+        return await instance.fetch(request)
+
+
+class DurableObjectNamespace:
+    """A Durable Object binding: one instance of the worker's class per name, shared by every worker bound to it"""
+
+    def __init__(self, class_name):
+        self.class_name = class_name
+        self.instances = {}
+        self.env = None
+
+    def bind(self, env):
+        # Objects run with the env of the first worker bound (they share its D1 bindings)
+        if self.env is None:
+            self.env = env
+
+    def idFromName(self, name):
+        return name
+
+    def get(self, object_id):
+        return DurableObjectStub(self, object_id)
+
+
+# Label names generated issues draw from, with their color in every repository
+LABEL_COLORS = {
+    'bug': 'd73a4a', 'enhancement': 'a2eeef', 'documentation': '0075ca', 'question': 'd876e3',
+    'good first issue': '7057ff', 'help wanted': '008672', 'ui': 'fbca04', 'api': '1d76db',
+}
+
+
+def generate_issue(number, repository, rng, body_size=400, closed_ratio=0.6):
+    """A GitHub REST API issue payload with plausible labels, assignees and timings"""
+    created = datetime(2023, 1, 1) + timedelta(hours=rng.randint(0, 24 * 540))
+    updated = created + timedelta(hours=rng.randint(0, 24 * 30))
+    state = 'closed' if rng.random() < closed_ratio else 'open'
+    closed = created + timedelta(hours=int(rng.lognormvariate(3.5, 1.5))) if state == 'closed' else None
+    label_pool = list(LABEL_COLORS)
+    user_pool = [f'user{index}' for index in range(25)]
+    assignees = [{'login': login} for login in rng.sample(user_pool, rng.choice([0, 0, 1, 1, 2]))]
+    owner = repository.split('/')[0]
+
+    return {
+        'id': zlib.crc32(repository.encode()) % 100000 * 10000000 + number,
+        'number': number,
+        'title': f'Issue {number}: ' + ' '.join(rng.choice(label_pool) for _ in range(6)),
+        'body': ''.join(rng.choice('abcdefghij klmnop\n') for _ in range(body_size)),
+        'state': state,
+        'created_at': created.isoformat() + 'Z',
+        'updated_at': max(updated, closed or updated).isoformat() + 'Z',
+        'closed_at': closed.isoformat() + 'Z' if closed else None,
+        'html_url': f'https://github.com/{repository}/issues/{number}',
+        'user': {'login': owner},
+        'assignee': assignees[0] if assignees else None,
+        'assignees': assignees,
+        'labels': [{'name': name, 'color': LABEL_COLORS[name]} for name in rng.sample(label_pool, rng.choice([0, 1, 1, 2, 3]))],
+        'milestone': {'title': 'v1.0'} if rng.random() < 0.2 else None,
+    }
+
+
+def generate_issues(repository, count, seed=1, **options):
+    rng = random.Random(seed)
+    return [generate_issue(number, repository, rng, **options) for number in range(1, count + 1)]
+
+
+def seed_issues(db, repository, issues):
+    """Bulk-load issue payloads straight into SQLite, bypassing the worker"""
+    from github import calculate_time_to_close
+
+    connection = db.connection
+    issue_rows = []
+    label_ids = {name: index for index, name in enumerate(LABEL_COLORS, 1)}
+    label_rows = []
+    assignee_rows = []
+    for issue in issues:
+        time_to_close = None
+        if issue['state'] == 'closed' and issue.get('closed_at'):
+            time_to_close = calculate_time_to_close(issue['created_at'], issue['closed_at'])
+        issue_rows.append((
+            issue['id'], issue['number'], issue['title'], issue.get('body', ''), issue['state'],
+            issue['created_at'], issue['updated_at'], issue.get('closed_at'), issue['html_url'],
+            repository, issue['assignee']['login'] if issue.get('assignee') else None,
+            issue['milestone']['title'] if issue.get('milestone') else None, time_to_close,
+        ))
+        label_rows.extend((issue['id'], label_ids[label['name']]) for label in issue['labels'])
+        assignee_rows.extend((issue['id'], assignee['login']) for assignee in issue['assignees'])
+
+    connection.executemany(
+        'INSERT INTO issues (id, number, title, body, state, created_at, updated_at, closed_at, html_url, '
+        'repository, assignee, milestone, time_to_close) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        issue_rows
+    )
+    if connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'issue_labels'").fetchone() is None:
+        # A --baseline-rev tree from before labels were normalized
+        names = {label_id: name for name, label_id in label_ids.items()}
+        connection.executemany(
+            'INSERT INTO labels (issue_id, name, color) VALUES (?, ?, ?)',
+            [(issue_id, names[label_id], LABEL_COLORS[names[label_id]]) for issue_id, label_id in label_rows]
+        )
+    else:
+        connection.execute(
+            'INSERT INTO repositories (repository, added_at) VALUES (?, ?) ON CONFLICT DO NOTHING',
+            (repository, datetime.utcnow().isoformat())
+        )
+        connection.executemany(
+            'INSERT INTO repo_labels (repository, id, name, color) VALUES (?, ?, ?, ?) ON CONFLICT DO NOTHING',
+            [(repository, label_id, name, LABEL_COLORS[name]) for name, label_id in label_ids.items()]
+        )
+        connection.executemany('INSERT INTO issue_labels (issue_id, label_id) VALUES (?, ?)', label_rows)
+    connection.executemany('INSERT INTO assignees (issue_id, username) VALUES (?, ?)', assignee_rows)
+    connection.commit()
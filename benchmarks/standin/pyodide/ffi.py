@@ -0,0 +1,106 @@
+"""
+Local stand-in for pyodide.ffi
+
+Python objects are handed to the stand-in `js` module as-is, so proxies are
+plain wrappers and to_js() only applies the dict converter.
+"""
+
+import copy
+
+
+class JsProxy:
+    """
+    A JS object seen from Python
+
+    The stand-in only creates these when a D1Database is opened with
+    js_results=True, to model the FFI: every item or attribute read, write
+    or iteration step counts as one crossing in JsProxy.crossings, while
+    to_py() converts the whole value in one.
+    """
+
+    crossings = 0
+
+    def __init__(self, value):
+        self._value = value
+
+    @staticmethod
+    def _wrap(value):
+        return JsProxy(value) if isinstance(value, (dict, list)) else value
+
+    @classmethod
+    def _cross(cls):
+        cls.crossings += 1
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        self._cross()
+        try:
+            return self._wrap(self._value[name])
+        except (KeyError, TypeError):
+            raise AttributeError(name)
+
+    def __getitem__(self, key):
+        self._cross()
+        return self._wrap(self._value[key])
+
+    def __setitem__(self, key, value):
+        self._cross()
+        self._value[key] = value
+
+    def __iter__(self):
+        for item in list(self._value):
+            self._cross()
+            yield self._wrap(item)
+
+    def __len__(self):
+        self._cross()
+        return len(self._value)
+
+    def __bool__(self):
+        return True
+
+    def keys(self):
+        self._cross()
+        return list(self._value.keys())
+
+    def get(self, key, default=None):
+        self._cross()
+        return self._wrap(self._value.get(key, default))
+
+    def to_py(self):
+        self._cross()
+        return copy.deepcopy(self._value)
+
+
+# Proxies created and not destroyed yet (a count that only grows is a leak)
+LIVE_PROXIES = 0
+
+
+class _Proxy:
+    def __init__(self, target):
+        global LIVE_PROXIES
+        LIVE_PROXIES += 1
+        self._target = target
+
+    def __call__(self, *args, **kwargs):
+        if self._target is None:
+            raise Exception('Proxy has been destroyed')
+        return self._target(*args, **kwargs)
+
+    def destroy(self):
+        global LIVE_PROXIES
+        if self._target is None:
+            raise Exception('Object has already been destroyed')
+        LIVE_PROXIES -= 1
+        self._target = None
+
+
+def create_proxy(obj):
+    return _Proxy(obj)
+
+
+def to_js(obj, dict_converter=None, **kwargs):
+    if isinstance(obj, dict) and dict_converter is not None:
+        return dict_converter(list(obj.items()))
+    return obj
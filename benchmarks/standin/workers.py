@@ -0,0 +1,15 @@
+"""
+Local stand-in for the Python Workers `workers` module
+
+Only DurableObject, the base class of Durable Object classes exported
+from the worker's main module, is needed. local_worker.DurableObjectNamespace
+constructs them.
+"""
+
+
+class DurableObject:
+    """Base class of a Durable Object: ctx is its state, env the worker env"""
+
+    def __init__(self, ctx, env):
+        self.ctx = ctx
+        self.env = env
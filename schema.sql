@@ -15,19 +15,35 @@ CREATE TABLE IF NOT EXISTS issues (
     assignee TEXT,
     milestone TEXT,
     time_to_close INTEGER,
+    relations_hash TEXT,
     UNIQUE(repository, number)
 );
 
--- Labels table
-CREATE TABLE IF NOT EXISTS labels (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    issue_id INTEGER NOT NULL,
+-- Repositories with stored issues; labels_version changes whenever repo_labels does
+-- (workers cache each repository's labels against it, see src/metadata.py)
+CREATE TABLE IF NOT EXISTS repositories (
+    repository TEXT PRIMARY KEY,
+    added_at TEXT NOT NULL,
+    labels_version INTEGER NOT NULL DEFAULT 0
+);
+
+-- Each repository's labels, numbered from 1 within the repository
+CREATE TABLE IF NOT EXISTS repo_labels (
+    repository TEXT NOT NULL,
+    id INTEGER NOT NULL,
     name TEXT NOT NULL,
     color TEXT,
-    FOREIGN KEY (issue_id) REFERENCES issues(id) ON DELETE CASCADE
+    PRIMARY KEY (repository, id),
+    UNIQUE (repository, name)
 );
 
-CREATE INDEX IF NOT EXISTS idx_labels_issue_id ON labels(issue_id);
+-- Labels on each issue, by their repo_labels id in the issue's repository
+CREATE TABLE IF NOT EXISTS issue_labels (
+    issue_id INTEGER NOT NULL,
+    label_id INTEGER NOT NULL,
+    PRIMARY KEY (issue_id, label_id),
+    FOREIGN KEY (issue_id) REFERENCES issues(id) ON DELETE CASCADE
+) WITHOUT ROWID;
 
 -- Assignees table (for multiple assignees support)
 CREATE TABLE IF NOT EXISTS assignees (
@@ -53,13 +69,36 @@ CREATE TABLE IF NOT EXISTS metrics (
     UNIQUE(repository, metric_date)
 );
 
+-- Time-to-close histograms (log-bucketed counts, see src/percentiles.py)
+-- dimension is 'all', 'label' or 'assignee'; dimension_value is '' for 'all'
+CREATE TABLE IF NOT EXISTS time_to_close_histogram (
+    repository TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    dimension_value TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (repository, dimension, dimension_value, bucket)
+);
+
 -- Sync status table
 CREATE TABLE IF NOT EXISTS sync_status (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     repository TEXT NOT NULL UNIQUE,
     last_sync TEXT NOT NULL,
     status TEXT NOT NULL,
-    error_message TEXT
+    error_message TEXT,
+    -- updated_at of the newest issue synced; scheduled syncs fetch from here
+    cursor_updated_at TEXT,
+    duration_ms INTEGER,
+    issues_per_second REAL,
+    written INTEGER,
+    skipped INTEGER
+);
+
+-- Repositories kept fresh by the scheduled sync
+CREATE TABLE IF NOT EXISTS tracked_repositories (
+    repository TEXT PRIMARY KEY,
+    added_at TEXT NOT NULL
 );
 
 -- User sessions table
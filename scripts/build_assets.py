@@ -0,0 +1,157 @@
+"""
+Build the static asset bundle
+
+Reads static/index.html, static/styles.css and static/app.js, minifies them,
+content-hashes the CSS and JS, points the page at the hashed URLs and writes
+everything to src/static_bundle.py. The gzip (and, when the brotli module is
+installed, brotli) variants are compressed here, so a Worker isolate only
+has to decode them instead of compressing at startup.
+
+Runs as the wrangler build command; run it by hand after editing static/:
+
+    python scripts/build_assets.py [--output src/static_bundle.py]
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+STATIC_DIR = os.path.join(ROOT, 'static')
+DEFAULT_OUTPUT = os.path.join(ROOT, 'src', 'static_bundle.py')
+
+# name -> content type; the page is last so it can reference the hashed URLs
+SOURCES = [
+    ('styles.css', 'text/css; charset=utf-8'),
+    ('app.js', 'application/javascript; charset=utf-8'),
+    ('index.html', 'text/html; charset=utf-8'),
+]
+
+QUOTED = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+
+
+def minify_css(source):
+    """Drop comments and whitespace outside of quoted strings"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    parts = QUOTED.split(source)
+    for index in range(0, len(parts), 2):
+        text = re.sub(r'\s+', ' ', parts[index])
+        text = re.sub(r'\s*([{}:;,>])\s*', r'\1', text)
+        parts[index] = text.replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_js(source):
+    """Line-level minification that cannot change semantics
+
+    Leading indentation, blank lines and whole-line // comments are removed;
+    line breaks are kept so automatic semicolon insertion is unaffected.
+    Inside multi-line template literals only indentation is dropped, which
+    the HTML they build ignores.
+    """
+    lines = []
+    in_template = False
+    for line in source.splitlines():
+        stripped = line.strip()
+        if not in_template and (not stripped or stripped.startswith('//')):
+            continue
+        lines.append(stripped)
+        if QUOTED.sub('', line).count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+def minify_html(source):
+    """Collapse whitespace between tags"""
+    source = re.sub(r'<!--.*?-->', '', source, flags=re.S)
+    source = re.sub(r'>\s+<', '><', source)
+    return re.sub(r'\s+', ' ', source).strip()
+
+
+MINIFIERS = {
+    'css': minify_css,
+    'js': minify_js,
+    'html': minify_html,
+}
+
+
+def build_asset(name, content_type, content):
+    data = content.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem, _, extension = name.rpartition('.')
+
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+
+    return {
+        'name': name,
+        'hash': digest,
+        'url': f'/static/{stem}.{digest}.{extension}',
+        'content_type': content_type,
+        'identity': content,
+        'compressed': {encoding: base64.b64encode(body).decode('ascii') for encoding, body in variants.items()},
+    }
+
+
+def build(static_dir=STATIC_DIR):
+    """Minified, hashed and compressed assets keyed by name"""
+    assets = {}
+    for name, content_type in SOURCES:
+        with open(os.path.join(static_dir, name), encoding='utf-8') as source:
+            content = MINIFIERS[name.rpartition('.')[2]](source.read())
+        if name == 'index.html':
+            for asset in assets.values():
+                content = content.replace('/static/' + asset['name'], asset['url'])
+        assets[name] = build_asset(name, content_type, content)
+    return assets
+
+
+def render_module(assets):
+    lines = [
+        '"""',
+        'Static asset bundle',
+        '',
+        'Generated by scripts/build_assets.py from static/. Do not edit.',
+        '"""',
+        '',
+        'ASSETS = {',
+    ]
+    for name, asset in assets.items():
+        lines.append(f'    {name!r}: {{')
+        for key in ('name', 'hash', 'url', 'content_type', 'identity'):
+            lines.append(f'        {key!r}: {asset[key]!r},')
+        lines.append(f"        'compressed': {asset['compressed']!r},")
+        lines.append('    },')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build src/static_bundle.py from static/')
+    parser.add_argument('--static-dir', default=STATIC_DIR)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    assets = build(args.static_dir)
+    with open(args.output, 'w', encoding='utf-8') as output:
+        output.write(render_module(assets))
+
+    for asset in assets.values():
+        sizes = ', '.join(
+            f'{encoding} {len(base64.b64decode(body))}' for encoding, body in asset['compressed'].items()
+        )
+        print(f"{asset['url']}: identity {len(asset['identity'].encode('utf-8'))}, {sizes}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+-- Move labels stored per issue (the labels table) into repositories,
+-- repo_labels and issue_labels. Apply schema.sql first, then:
+--
+--   wrangler d1 execute oss-pm-db --file=./scripts/migrate_labels.sql
+--
+-- With D1_SHARDS, run it against every shard's database.
+
+INSERT INTO repositories (repository, added_at)
+SELECT DISTINCT repository, strftime('%Y-%m-%dT%H:%M:%f', 'now') FROM issues WHERE true
+ON CONFLICT DO NOTHING;
+
+-- One row per label name in each repository; the color is taken from its most recently updated issue
+INSERT INTO repo_labels (repository, id, name, color)
+SELECT repository, ROW_NUMBER() OVER (PARTITION BY repository ORDER BY name), name, color
+FROM (
+    SELECT i.repository, l.name, l.color,
+        ROW_NUMBER() OVER (PARTITION BY i.repository, l.name ORDER BY i.updated_at DESC) AS newest
+    FROM labels l
+    INNER JOIN issues i ON i.id = l.issue_id
+)
+WHERE newest = 1
+ON CONFLICT DO NOTHING;
+
+INSERT INTO issue_labels (issue_id, label_id)
+SELECT DISTINCT l.issue_id, r.id
+FROM labels l
+INNER JOIN issues i ON i.id = l.issue_id
+INNER JOIN repo_labels r ON r.repository = i.repository AND r.name = l.name
+WHERE true
+ON CONFLICT DO NOTHING;
+
+DROP INDEX IF EXISTS idx_labels_issue_id;
+DROP TABLE labels;
@@ -0,0 +1,132 @@
+"""
+Rank D1 query fingerprints by total time
+
+Reads worker logs (plain JSON lines or `wrangler tail --format json` output)
+and aggregates the D1 statements they mention by fingerprint:
+
+- request traces (TRACING=on) give every statement's duration
+- slow_query lines (SLOW_QUERY_MS) give the slow ones, with bindings shape
+  and, under EXPLAIN_SLOW_QUERIES, the query plan
+- query_registered lines map fingerprints back to normalized SQL
+
+Fingerprints seen in traces are ranked by traced time; the rest by the
+time of their slow executions alone. Lines that are not JSON are skipped,
+so benchmark output can be piped in directly:
+
+    wrangler tail --format json > tail.log
+    python scripts/query_report.py tail.log [--top 20] [--plans]
+
+    python benchmarks/bench_request_cpu.py --var TRACING=on --var SLOW_QUERY_MS=5 \\
+        --var EXPLAIN_SLOW_QUERIES=on | python scripts/query_report.py --plans
+"""
+
+import argparse
+import fileinput
+import json
+
+
+def log_events(lines):
+    """Worker log entries (dicts) found in plain or wrangler-tail JSON lines"""
+    for line in lines:
+        line = line.strip()
+        if not line.startswith('{'):
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if 'logs' not in entry:
+            yield entry
+            continue
+        for log in entry.get('logs') or []:
+            for message in log.get('message') or []:
+                if isinstance(message, str) and message.startswith('{'):
+                    try:
+                        yield json.loads(message)
+                    except ValueError:
+                        pass
+
+
+def new_row():
+    return {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'slow': 0, 'slow_ms': 0.0, 'slow_max_ms': 0.0}
+
+
+def aggregate(events):
+    """(rows by fingerprint, sql by fingerprint, slowest plan by fingerprint)"""
+    rows = {}
+    sql = {}
+    plans = {}
+    for event in events:
+        kind = event.get('event')
+        if kind == 'query_registered':
+            sql[event['fingerprint']] = event['sql']
+        elif kind == 'request':
+            for span in event.get('spans', []):
+                if span.get('type') != 'd1':
+                    continue
+                fingerprints = span.get('fingerprints') or [span.get('fingerprint')]
+                # A batch's time is shared evenly among its statements
+                duration = span['duration_ms'] / len(fingerprints)
+                for fingerprint in fingerprints:
+                    row = rows.setdefault(fingerprint, new_row())
+                    row['calls'] += 1
+                    row['total_ms'] += duration
+                    row['max_ms'] = max(row['max_ms'], duration)
+        elif kind == 'slow_query':
+            fingerprints = event['fingerprint'] if isinstance(event['fingerprint'], list) else [event['fingerprint']]
+            duration = event['duration_ms'] / len(fingerprints)
+            for fingerprint in fingerprints:
+                row = rows.setdefault(fingerprint, new_row())
+                row['slow'] += 1
+                row['slow_ms'] += duration
+                if duration > row['slow_max_ms']:
+                    row['slow_max_ms'] = duration
+                    if event.get('plan'):
+                        plans[fingerprint] = (event['plan'], event.get('bindings'))
+            if event.get('sql') and len(fingerprints) == 1:
+                sql.setdefault(fingerprints[0], event['sql'])
+
+    # Fingerprints only known from slow_query lines are ranked by that time
+    for row in rows.values():
+        if not row['calls']:
+            row['calls'], row['total_ms'], row['max_ms'] = row['slow'], row['slow_ms'], row['slow_max_ms']
+    return rows, sql, plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank D1 query fingerprints by total time from worker logs')
+    parser.add_argument('files', nargs='*', help='log files (default: stdin)')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--plans', action='store_true', help='print the captured query plan of each slow fingerprint')
+    parser.add_argument('--width', type=int, default=80, help='SQL column width')
+    args = parser.parse_args()
+
+    with fileinput.input(args.files or ('-',)) as lines:
+        rows, sql, plans = aggregate(log_events(lines))
+    if not rows:
+        print('No D1 statements found (run with TRACING=on or SLOW_QUERY_MS set)')
+        return
+
+    ranked = sorted(rows.items(), key=lambda item: item[1]['total_ms'], reverse=True)[:args.top]
+    grand_total = sum(row['total_ms'] for row in rows.values()) or 1.0
+    print(f"{'fingerprint':<14}{'calls':>8}{'total ms':>11}{'share':>7}{'mean ms':>9}{'max ms':>9}{'slow':>6}  sql")
+    for fingerprint, row in ranked:
+        text = sql.get(fingerprint, '?')
+        if len(text) > args.width:
+            text = text[:args.width - 3] + '...'
+        print(
+            f"{fingerprint:<14}{row['calls']:>8}{row['total_ms']:>11.1f}{row['total_ms'] / grand_total:>7.0%}"
+            f"{row['total_ms'] / row['calls']:>9.2f}{row['max_ms']:>9.2f}{row['slow']:>6}  {text}"
+        )
+
+    if args.plans:
+        for fingerprint, _ in ranked:
+            if fingerprint in plans:
+                plan, bindings = plans[fingerprint]
+                print(f'\n{fingerprint} ({bindings or "no bindings"}): {sql.get(fingerprint, "?")}')
+                for step in plan:
+                    print(f'  {step}')
+
+
+if __name__ == '__main__':
+    main()
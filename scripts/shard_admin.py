@@ -0,0 +1,100 @@
+"""
+Inspect D1 shard placement and move repositories between shards
+
+Talks to a deployed worker's /internal/shards endpoints with the
+ADMIN_TOKEN secret (--token, or the ADMIN_TOKEN environment variable).
+
+    python scripts/shard_admin.py --url https://your-worker.workers.dev placement [--shards DB,DB_1,DB_2]
+    python scripts/shard_admin.py --url ... move owner/repo DB_2
+    python scripts/shard_admin.py --url ... move owner/repo DB_2 --source DB_1 --delete-source
+
+A move is two calls around a deploy: copy to the target, pin the
+repository to it in D1_SHARD_MAP and deploy, then move again from the old
+shard with --delete-source. See DEPLOYMENT.md.
+"""
+
+import argparse
+import json
+import os
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+def call(args, method, path, body=None):
+    """JSON response of an /internal/shards request; exits with its error on failure"""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    request = urllib.request.Request(args.url.rstrip('/') + path, data=data, method=method, headers={
+        'Authorization': f'Bearer {args.token}',
+        'Content-Type': 'application/json',
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        sys.exit(f'{method} {path}: {error.code} {error.read().decode("utf-8", "replace")}')
+
+
+def show_placement(args):
+    query = '?' + urllib.parse.urlencode({'shards': args.shards}) if args.shards else ''
+    report = call(args, 'GET', '/internal/shards' + query)
+
+    print(f'shards: {", ".join(report["shards"])}')
+    print(f'{"repository":40} {"shard":>8} {"issues":>8} {"routed":>8}' + (f' {"proposed":>9}' if args.shards else ''))
+    for entry in report['repositories']:
+        line = f'{entry["repository"]:40} {entry["shard"]:>8} {entry["issues"]:>8} {entry["routed_to"]:>8}'
+        if args.shards:
+            line += f' {entry["proposed"]:>9}'
+        print(line)
+
+    if report['misplaced']:
+        print('\nNot on the shard they are routed to (a move in progress, or D1_SHARDS changed early):')
+        for entry in report['misplaced']:
+            print(f'  {entry["repository"]} on {entry["shard"]}, routed to {entry["routed_to"]}')
+    if args.shards:
+        print(f'\n{len(report["moves"])} repositories to move before setting D1_SHARDS = "{args.shards}":')
+        for entry in report['moves']:
+            print(f'  python scripts/shard_admin.py --url {args.url} move {entry["repository"]} {entry["proposed"]}')
+
+
+def move(args):
+    body = {'repository': args.repository, 'target': args.target, 'delete_source': args.delete_source}
+    if args.source:
+        body['source'] = args.source
+    result = call(args, 'POST', '/internal/shards/move', body)
+
+    print(f'{result["repository"]}: {result["source"]} -> {result["target"]}, '
+          f'{result["copied"]} issues copied, {result["current"]} already current')
+    if result['deleted_source']:
+        print(f'Deleted from {result["source"]}')
+    else:
+        print(f'Next: pin "{result["repository"]}": "{result["target"]}" in D1_SHARD_MAP, deploy, then run again '
+              f'with --source {result["source"]} --delete-source')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', required=True, help='the deployed worker')
+    parser.add_argument('--token', default=os.environ.get('ADMIN_TOKEN'), help='ADMIN_TOKEN (default: $ADMIN_TOKEN)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    placement = commands.add_parser('placement', help='issue counts per repository and shard')
+    placement.add_argument('--shards', help='a proposed D1_SHARDS list, to see which repositories it would move')
+    placement.set_defaults(run=show_placement)
+
+    mover = commands.add_parser('move', help='copy a repository to another shard')
+    mover.add_argument('repository')
+    mover.add_argument('target', help='D1 binding to move to')
+    mover.add_argument('--source', help='D1 binding to move from (default: where it is routed now)')
+    mover.add_argument('--delete-source', action='store_true', help='delete it from the source after copying')
+    mover.set_defaults(run=move)
+
+    args = parser.parse_args()
+    if not args.token:
+        parser.error('--token or ADMIN_TOKEN is required')
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
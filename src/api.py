@@ -2,179 +2,248 @@
 API Handlers
 """
 
-from js import Response, Headers, URL
+from js import URL
+import heapq
+import itertools
 import json
-from github import sync_repository, update_github_issue, sync_issue
+from db import fetch_all, fetch_batch, fetch_one
+from responses import json_response, error_response
+from github import update_github_issue
+from metadata import label_check_statement, page_labels, refresh_labels
+from shards import fan_out, repository_env, shard_envs, shard_for
+import writer
 
 
-async def handle_get_issues(request, env, session, cors_headers):
+# Each issue's labels and assignees, aggregated as JSON in the issue's own row
+LABELS_COLUMN = '''
+    (SELECT json_group_array(json_object('name', l.name, 'color', l.color))
+        FROM issue_labels il
+        INNER JOIN repo_labels l ON l.repository = i.repository AND l.id = il.label_id
+        WHERE il.issue_id = i.id) as labels_json'''
+# Issue lists send label ids only; the page's labels come once, alongside
+LABEL_IDS_COLUMN = '''
+    (SELECT json_group_array(label_id) FROM issue_labels WHERE issue_id = i.id) as label_ids_json'''
+ASSIGNEES_COLUMN = '''
+    (SELECT json_group_array(username)
+        FROM assignees WHERE issue_id = i.id) as assignees_json'''
+ISSUE_RELATION_COLUMNS = LABELS_COLUMN + ',' + ASSIGNEES_COLUMN
+
+# Fields a client can select with fields=, in response order
+ISSUE_FIELDS = [
+    'id', 'number', 'title', 'body', 'state', 'created_at', 'updated_at', 'closed_at',
+    'html_url', 'repository', 'assignee', 'milestone', 'time_to_close', 'labels', 'assignees'
+]
+
+# The issue list never shows bodies; GET /api/issues/:number returns the full issue
+DEFAULT_LIST_FIELDS = [field for field in ISSUE_FIELDS if field != 'body']
+
+
+def parse_fields(value, default):
+    """Fields named in a comma-separated fields= value, in ISSUE_FIELDS order"""
+    if not value:
+        return list(default)
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = requested.difference(ISSUE_FIELDS)
+    if unknown:
+        raise ValueError('unknown fields: ' + ', '.join(sorted(unknown)))
+    return [field for field in ISSUE_FIELDS if field in requested]
+
+
+def issue_select_list(fields, labels_column=LABELS_COLUMN):
+    """SELECT list for the given fields; the issue id is always read (keyset cursors need it)"""
+    columns = ['i.' + field for field in fields if field not in ('labels', 'assignees')]
+    if 'id' not in fields:
+        columns.insert(0, 'i.id')
+    if 'labels' in fields:
+        columns.append(labels_column)
+    if 'assignees' in fields:
+        columns.append(ASSIGNEES_COLUMN)
+    return ', '.join(columns)
+
+
+def hydrate_issue(row, fields=None):
+    """Replace an issue row's aggregated JSON columns with labels (or label ids) and assignees lists"""
+    if 'labels_json' in row:
+        row['labels'] = json.loads(row.pop('labels_json') or '[]')
+    if 'label_ids_json' in row:
+        row['labels'] = json.loads(row.pop('label_ids_json') or '[]')
+    if 'assignees_json' in row:
+        row['assignees'] = json.loads(row.pop('assignees_json') or '[]')
+    if fields is not None and 'id' not in fields:
+        del row['id']
+    return row
+
+
+def build_issue_filters(params):
+    """Translate issue filter query parameters into SQL joins, conditions and bindings"""
+    repository = params.get('repository')
+    state = params.get('state') or 'all'
+    label = params.get('label')
+    assignee = params.get('assignee')
+    
+    joins = []
+    conditions = []
+    bindings = []
+    
+    if repository:
+        conditions.append('i.repository = ?')
+        bindings.append(repository)
+    
+    if state != 'all':
+        conditions.append('i.state = ?')
+        bindings.append(state)
+    
+    if label:
+        joins.append(
+            ' INNER JOIN issue_labels il ON il.issue_id = i.id'
+            ' INNER JOIN repo_labels l ON l.repository = i.repository AND l.id = il.label_id'
+        )
+        conditions.append('l.name = ?')
+        bindings.append(label)
+    
+    if assignee:
+        if assignee == 'none':
+            conditions.append('i.assignee IS NULL')
+        else:
+            joins.append(' INNER JOIN assignees a ON i.id = a.issue_id')
+            conditions.append('a.username = ?')
+            bindings.append(assignee)
+    
+    return joins, conditions, bindings
+
+
+async def handle_get_issues(request, env, session):
     """Get issues with filtering and sorting"""
     url = URL.new(request.url)
-    repository = url.searchParams.get('repository')
-    state = url.searchParams.get('state') or 'all'
-    label = url.searchParams.get('label')
-    assignee = url.searchParams.get('assignee')
     sort_by = url.searchParams.get('sort') or 'updated_at'
     order = url.searchParams.get('order') or 'desc'
     page = int(url.searchParams.get('page') or '1')
     per_page = int(url.searchParams.get('per_page') or '50')
     
+    try:
+        fields = parse_fields(url.searchParams.get('fields'), DEFAULT_LIST_FIELDS)
+    except ValueError as error:
+        return error_response(str(error), 400)
+    # Label ids are numbered per repository, so issues listing them name their repository
+    if 'labels' in fields:
+        fields = [field for field in ISSUE_FIELDS if field in fields or field == 'repository']
+    
     try:
         # Build query
-        query = 'SELECT DISTINCT i.* FROM issues i'
-        conditions = []
-        bindings = []
-        
-        if repository:
-            conditions.append('i.repository = ?')
-            bindings.append(repository)
-        
-        if state != 'all':
-            conditions.append('i.state = ?')
-            bindings.append(state)
-        
-        if label:
-            query += ' INNER JOIN labels l ON i.id = l.issue_id'
-            conditions.append('l.name = ?')
-            bindings.append(label)
-        
-        if assignee:
-            if assignee == 'none':
-                conditions.append('i.assignee IS NULL')
-            else:
-                query += ' INNER JOIN assignees a ON i.id = a.issue_id'
-                conditions.append('a.username = ?')
-                bindings.append(assignee)
+        joins, conditions, bindings = build_issue_filters(url.searchParams)
+        query = 'SELECT DISTINCT ' + issue_select_list(fields, LABEL_IDS_COLUMN) + ' FROM issues i' + ''.join(joins)
         
         if conditions:
             query += ' WHERE ' + ' AND '.join(conditions)
         
-        # Add sorting
+        # Add sorting (ties broken by id, so pages neither repeat nor skip issues)
         valid_sort_fields = ['number', 'title', 'state', 'created_at', 'updated_at', 'closed_at', 'time_to_close']
         sort_field = sort_by if sort_by in valid_sort_fields else 'updated_at'
         sort_order = 'ASC' if order.lower() == 'asc' else 'DESC'
-        query += f' ORDER BY i.{sort_field} {sort_order}'
+        query += f' ORDER BY i.{sort_field} {sort_order}, i.id {sort_order}'
         
-        # Add pagination
-        offset = (page - 1) * per_page
-        query += ' LIMIT ? OFFSET ?'
-        bindings.extend([per_page, offset])
-        
-        # Execute query
-        result = await env.DB.prepare(query).bind(*bindings).all()
-        
-        # Get labels and assignees for each issue
-        for issue in result['results']:
-            labels = await env.DB.prepare(
-                'SELECT name, color FROM labels WHERE issue_id = ?'
-            ).bind(issue['id']).all()
-            issue['labels'] = labels['results']
-            
-            assignees = await env.DB.prepare(
-                'SELECT username FROM assignees WHERE issue_id = ?'
-            ).bind(issue['id']).all()
-            issue['assignees'] = [a['username'] for a in assignees['results']]
-        
-        # Get total count
-        count_query = 'SELECT COUNT(DISTINCT i.id) as total FROM issues i'
-        if label:
-            count_query += ' INNER JOIN labels l ON i.id = l.issue_id'
-        if assignee and assignee != 'none':
-            count_query += ' INNER JOIN assignees a ON i.id = a.issue_id'
+        count_query = 'SELECT COUNT(DISTINCT i.id) as total FROM issues i' + ''.join(joins)
         if conditions:
             count_query += ' WHERE ' + ' AND '.join(conditions)
         
-        count_bindings = bindings[:-2]  # Remove LIMIT and OFFSET
-        count_result = await env.DB.prepare(count_query).bind(*count_bindings).first()
+        offset = (page - 1) * per_page
+        repository = url.searchParams.get('repository')
+        shards = [repository_env(env, repository)] if repository else shard_envs(env)
+        
+        if len(shards) == 1:
+            # Page, total count and (when the cached copy is out of date) the repository's
+            # labels in one round trip; label ids and assignees come back in the page's rows
+            db = shards[0].DB
+            rows, totals, labels = await fetch_batch(db, [
+                db.prepare(query + ' LIMIT ? OFFSET ?').bind(*bindings, per_page, offset),
+                db.prepare(count_query).bind(*bindings),
+                label_check_statement(shards[0], [repository] if repository else None),
+            ])
+            refresh_labels(shards[0], labels, [repository] if repository else None)
+            total = totals[0]['total']
+        else:
+            rows, total = await fetch_merged_issue_page(
+                env, query, count_query, bindings, sort_field, sort_order == 'DESC', offset, per_page
+            )
+        
+        issues = [hydrate_issue(row, fields) for row in rows]
         
         response_data = {
-            'issues': result['results'],
+            'issues': issues,
+            'labels': await page_labels(env, issues) if 'labels' in fields else {},
             'pagination': {
                 'page': page,
                 'per_page': per_page,
-                'total': count_result['total'],
-                'total_pages': (count_result['total'] + per_page - 1) // per_page
+                'total': total,
+                'total_pages': (total + per_page - 1) // per_page
             }
         }
         
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
-        
-        return Response.new(json.dumps(response_data), headers=headers)
+        return json_response(response_data)
     
     except Exception as error:
         print(f'Error fetching issues: {error}')
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
-        return Response.new(json.dumps({'error': str(error)}), status=500, headers=headers)
+        return error_response(str(error), 500)
 
 
-async def handle_get_issue(request, env, session, issue_number, cors_headers):
+async def fetch_merged_issue_page(env, query, count_query, bindings, sort_field, descending, offset, limit):
+    """(page rows, total) across every shard: each shard's first offset + limit rows, merged in sort order"""
+    query = query.replace(' FROM issues i', f', i.{sort_field} AS sort_key FROM issues i', 1)
+    
+    async def read(shard_env):
+        db = shard_env.DB
+        rows, totals, labels = await fetch_batch(db, [
+            db.prepare(query + ' LIMIT ?').bind(*bindings, offset + limit),
+            db.prepare(count_query).bind(*bindings),
+            label_check_statement(shard_env),
+        ])
+        refresh_labels(shard_env, labels)
+        return rows, totals
+    
+    results = await fan_out(env, read)
+    
+    # SQLite sorts NULLs first ascending and last descending
+    def sort_key(row):
+        return (row['sort_key'] is not None, row['sort_key'], row['id'])
+    
+    merged = heapq.merge(*(rows for rows, _ in results), key=sort_key, reverse=descending)
+    page = list(itertools.islice(merged, offset, offset + limit))
+    for row in page:
+        del row['sort_key']
+    return page, sum(totals[0]['total'] for _, totals in results)
+
+
+async def handle_get_issue(request, env, session, issue_number, repository=None):
     """Get single issue"""
     url = URL.new(request.url)
-    repository = url.searchParams.get('repository')
+    repository = repository or url.searchParams.get('repository')
     
     if not repository:
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
-        return Response.new(json.dumps({'error': 'repository parameter required'}), status=400, headers=headers)
+        return error_response('repository parameter required', 400)
     
     try:
-        issue = await env.DB.prepare(
-            'SELECT * FROM issues WHERE repository = ? AND number = ?'
-        ).bind(repository, issue_number).first()
+        env = repository_env(env, repository)
+        issue = await fetch_one(env.DB.prepare(
+            'SELECT i.*,' + ISSUE_RELATION_COLUMNS + ' FROM issues i WHERE i.repository = ? AND i.number = ?'
+        ).bind(repository, issue_number))
         
         if not issue:
-            headers = Headers.new()
-            for key, value in cors_headers.items():
-                headers.set(key, value)
-            headers.set('Content-Type', 'application/json')
-            return Response.new(json.dumps({'error': 'Issue not found'}), status=404, headers=headers)
-        
-        # Get labels and assignees
-        labels = await env.DB.prepare(
-            'SELECT name, color FROM labels WHERE issue_id = ?'
-        ).bind(issue['id']).all()
-        issue['labels'] = labels['results']
-        
-        assignees = await env.DB.prepare(
-            'SELECT username FROM assignees WHERE issue_id = ?'
-        ).bind(issue['id']).all()
-        issue['assignees'] = [a['username'] for a in assignees['results']]
-        
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
+            return error_response('Issue not found', 404)
         
-        return Response.new(json.dumps(issue), headers=headers)
+        return json_response(hydrate_issue(issue))
     
     except Exception as error:
         print(f'Error fetching issue: {error}')
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
-        return Response.new(json.dumps({'error': str(error)}), status=500, headers=headers)
+        return error_response(str(error), 500)
 
 
-async def handle_update_issue(request, env, session, issue_number, cors_headers):
+async def handle_update_issue(request, env, session, issue_number, repository=None):
     """Update issue"""
     url = URL.new(request.url)
-    repository = url.searchParams.get('repository')
+    repository = repository or url.searchParams.get('repository')
     
     if not repository:
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
-        return Response.new(json.dumps({'error': 'repository parameter required'}), status=400, headers=headers)
+        return error_response('repository parameter required', 400)
     
     try:
         updates = json.loads(await request.text())
@@ -183,26 +252,17 @@ async def handle_update_issue(request, env, session, issue_number, cors_headers)
         # Update on GitHub
         updated_issue = await update_github_issue(owner, repo, issue_number, updates, session['accessToken'])
         
-        # Sync back to database
-        await sync_issue(updated_issue, repository, env)
-        
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
+        # Write back only the columns and label/assignee rows that changed, through the repository's writer
+        await writer.write_issues(env, repository, [updated_issue], update_metrics=True)
         
-        return Response.new(json.dumps({'success': True, 'issue': updated_issue}), headers=headers)
+        return json_response({'success': True, 'issue': updated_issue})
     
     except Exception as error:
         print(f'Error updating issue: {error}')
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
-        return Response.new(json.dumps({'error': str(error)}), status=500, headers=headers)
+        return error_response(str(error), 500)
 
 
-async def handle_bulk_update(request, env, session, cors_headers):
+async def handle_bulk_update(request, env, session):
     """Bulk update issues"""
     try:
         data = json.loads(await request.text())
@@ -211,70 +271,117 @@ async def handle_bulk_update(request, env, session, cors_headers):
         updates = data.get('updates')
         
         if not repository or not issue_numbers or not updates:
-            headers = Headers.new()
-            for key, value in cors_headers.items():
-                headers.set(key, value)
-            headers.set('Content-Type', 'application/json')
-            return Response.new(
-                json.dumps({'error': 'repository, issue_numbers, and updates are required'}),
-                status=400,
-                headers=headers
-            )
+            return error_response('repository, issue_numbers, and updates are required', 400)
         
         owner, repo = repository.split('/')
         results = []
+        updated_issues = []
         
         for issue_number in issue_numbers:
             try:
                 updated_issue = await update_github_issue(owner, repo, issue_number, updates, session['accessToken'])
-                await sync_issue(updated_issue, repository, env)
+                updated_issues.append(updated_issue)
                 results.append({'issue_number': issue_number, 'success': True})
             except Exception as error:
                 results.append({'issue_number': issue_number, 'success': False, 'error': str(error)})
         
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
+        # Every successful update is written back in one batch
+        try:
+            await writer.write_issues(env, repository, updated_issues, update_metrics=True)
+        except Exception as error:
+            print(f'Error saving bulk update: {error}')
+            for result in results:
+                if result['success']:
+                    result.update(success=False, error=f'updated on GitHub but not saved: {error}')
         
-        return Response.new(json.dumps({'results': results}), headers=headers)
+        return json_response({'results': results})
     
     except Exception as error:
         print(f'Error in bulk update: {error}')
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
-        return Response.new(json.dumps({'error': str(error)}), status=500, headers=headers)
+        return error_response(str(error), 500)
+
+
+async def handle_get_sync_status(request, env, session):
+    """Tracked repositories with their latest sync: status, cursor, duration and throughput"""
+    try:
+        async def read(shard_env):
+            rows = await fetch_all(shard_env.DB.prepare('''
+                SELECT t.repository, t.added_at, s.last_sync, s.status, s.error_message, s.cursor_updated_at,
+                    s.duration_ms, s.issues_per_second, s.written, s.skipped
+                FROM tracked_repositories t
+                LEFT JOIN sync_status s ON s.repository = t.repository
+                ORDER BY t.repository
+            '''))
+            # A repository part-way through a move between shards is listed once, from where it is routed
+            return [row for row in rows if shard_for(env, row['repository']) == shard_env.shard]
+        
+        repositories = list(heapq.merge(*await fan_out(env, read), key=lambda row: row['repository']))
+        
+        return json_response({'repositories': repositories})
+    
+    except Exception as error:
+        print(f'Error fetching sync status: {error}')
+        return error_response(str(error), 500)
 
 
-async def handle_sync_repository(request, env, session, cors_headers):
+async def handle_get_repositories(request, env, session):
+    """Every repository with stored issues: when it was added, its label count, tracking and latest sync"""
+    try:
+        async def read(shard_env):
+            rows = await fetch_all(shard_env.DB.prepare('''
+                SELECT r.repository, r.added_at,
+                    (SELECT COUNT(*) FROM repo_labels l WHERE l.repository = r.repository) as labels,
+                    t.repository IS NOT NULL as tracked,
+                    s.status, s.last_sync, s.cursor_updated_at
+                FROM repositories r
+                LEFT JOIN tracked_repositories t ON t.repository = r.repository
+                LEFT JOIN sync_status s ON s.repository = r.repository
+                ORDER BY r.repository
+            '''))
+            # A repository part-way through a move between shards is listed once, from where it is routed
+            return [row for row in rows if shard_for(env, row['repository']) == shard_env.shard]
+        
+        repositories = list(heapq.merge(*await fan_out(env, read), key=lambda row: row['repository']))
+        for row in repositories:
+            row['tracked'] = bool(row['tracked'])
+        
+        return json_response({'repositories': repositories})
+    
+    except Exception as error:
+        print(f'Error fetching repositories: {error}')
+        return error_response(str(error), 500)
+
+
+async def handle_stream(request, env, session):
+    """Server-sent events carrying a repository's issue and metric changes as they are written"""
+    url = URL.new(request.url)
+    repository = url.searchParams.get('repository')
+    
+    if not repository:
+        return error_response('repository parameter required', 400)
+    
+    try:
+        return await writer.subscribe(env, repository)
+    
+    except Exception as error:
+        print(f'Error opening event stream: {error}')
+        return error_response(str(error), 500)
+
+
+async def handle_sync_repository(request, env, session):
     """Sync repository"""
     try:
         data = json.loads(await request.text())
         repository = data.get('repository')
         
         if not repository:
-            headers = Headers.new()
-            for key, value in cors_headers.items():
-                headers.set(key, value)
-            headers.set('Content-Type', 'application/json')
-            return Response.new(json.dumps({'error': 'repository parameter required'}), status=400, headers=headers)
+            return error_response('repository parameter required', 400)
         
         owner, repo = repository.split('/')
-        result = await sync_repository(owner, repo, session['accessToken'], env)
-        
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
+        result = await writer.sync(env, owner, repo, session['accessToken'])
         
-        return Response.new(json.dumps(result), headers=headers)
+        return json_response(result)
     
     except Exception as error:
         print(f'Error syncing repository: {error}')
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
-        return Response.new(json.dumps({'error': str(error)}), status=500, headers=headers)
+        return error_response(str(error), 500)
@@ -0,0 +1,106 @@
+"""
+Static Asset Serving
+"""
+
+from js import Response, Headers
+from pyodide.ffi import to_js
+import base64
+from static_bundle import ASSETS
+from stats import record_cache
+
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+for asset in ASSETS.values():
+    asset['encodings'] = ['identity'] + list(asset['compressed'])
+    asset['etags'] = {encoding: f'"{asset["hash"]}-{encoding}"' for encoding in asset['encodings']}
+    asset['bodies'] = {}
+
+# Static paths: the hashed URL is immutable, the plain one must be revalidated
+STATIC_ROUTES = {}
+for asset in ASSETS.values():
+    if asset['name'] == 'index.html':
+        continue
+    STATIC_ROUTES[asset['url']] = (asset, IMMUTABLE_CACHE_CONTROL)
+    STATIC_ROUTES['/static/' + asset['name']] = (asset, REVALIDATE_CACHE_CONTROL)
+
+
+def asset_url(name):
+    """Content-hashed URL for an asset"""
+    return ASSETS[name]['url']
+
+
+def asset_body(asset, encoding):
+    """Bytes of one variant, decoded on first use and kept for the isolate's lifetime"""
+    body = asset['bodies'].get(encoding)
+    if body is None:
+        if encoding == 'identity':
+            body = asset['identity'].encode('utf-8')
+        else:
+            body = base64.b64decode(asset['compressed'][encoding])
+        asset['bodies'][encoding] = body
+    return body
+
+
+def choose_encoding(accept_encoding, encodings):
+    """Pick the smallest precompressed variant allowed by Accept-Encoding"""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        token, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(token.strip().lower())
+
+    for encoding in ('br', 'gzip'):
+        if encoding in encodings and (encoding in accepted or '*' in accepted):
+            return encoding
+    return 'identity'
+
+
+def not_modified(if_none_match, asset):
+    """True if the client already holds any representation of this content"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or any(etag in tags for etag in asset['etags'].values())
+
+
+def serve_asset(request, asset, cache_control):
+    """Serve an asset with validators, honouring If-None-Match and Accept-Encoding"""
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'), asset['encodings'])
+
+    headers = Headers.new()
+    headers.set('Content-Type', asset['content_type'])
+    headers.set('Cache-Control', cache_control)
+    headers.set('ETag', asset['etags'][encoding])
+    headers.set('Vary', 'Accept-Encoding')
+
+    # A hit: the client's cached copy is still current
+    cached = not_modified(request.headers.get('If-None-Match'), asset)
+    record_cache('assets', cached)
+    if cached:
+        return Response.new(None, status=304, headers=headers)
+
+    if encoding != 'identity':
+        headers.set('Content-Encoding', encoding)
+
+    # encodeBody='manual' stops the runtime from compressing the body again
+    return Response.new(to_js(asset_body(asset, encoding)), headers=headers, encodeBody='manual')
+
+
+def handle_static(request, path):
+    """Serve a /static/ path, or None if no asset lives there"""
+    route = STATIC_ROUTES.get(path)
+    if route:
+        asset, cache_control = route
+        return serve_asset(request, asset, cache_control)
+
+    # A hash from an earlier deploy (e.g. a tab opened before it): serve the
+    # current content, but not as immutable
+    stem, _, rest = path.removeprefix('/static/').partition('.')
+    _, _, extension = rest.rpartition('.')
+    asset = ASSETS.get(f'{stem}.{extension}')
+    if asset and asset['name'] != 'index.html' and rest.count('.') == 1:
+        return serve_asset(request, asset, REVALIDATE_CACHE_CONTROL)
+    return None
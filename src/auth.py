@@ -6,6 +6,8 @@ from js import Response, Headers, URL, fetch, crypto
 import json
 from datetime import datetime, timedelta
 import uuid
+from db import fetch_one
+from responses import json_response
 
 
 GITHUB_AUTHORIZE_URL = 'https://github.com/login/oauth/authorize'
@@ -122,9 +124,9 @@ async def verify_session(request, env):
         return None
     
     try:
-        result = await env.DB.prepare(
+        result = await fetch_one(env.DB.prepare(
             'SELECT * FROM sessions WHERE id = ? AND expires_at > ?'
-        ).bind(session_id, datetime.utcnow().isoformat()).first()
+        ).bind(session_id, datetime.utcnow().isoformat()))
         
         if not result:
             return None
@@ -139,6 +141,14 @@ async def verify_session(request, env):
         return None
 
 
+async def handle_get_session(request, env, session):
+    """Return the signed-in user (lets the UI check auth without querying issues)"""
+    return json_response(
+        {'authenticated': True, 'username': session['username']},
+        headers={'Cache-Control': 'no-store'}
+    )
+
+
 def get_auth_token(request):
     """Get session token for Authorization header"""
     auth_header = request.headers.get('Authorization')
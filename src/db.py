@@ -0,0 +1,60 @@
+"""
+D1 Data Access
+"""
+
+from pyodide.ffi import JsProxy
+
+
+# D1 rejects statements with more bound parameters than this
+D1_MAX_BOUND_PARAMETERS = 100
+
+
+def to_python(value):
+    """Convert a JS value to Python in one call; Python values pass through"""
+    if isinstance(value, JsProxy):
+        return value.to_py()
+    return value
+
+
+async def fetch_all(statement):
+    """Every row of a statement as a list of dicts"""
+    result = await statement.all()
+    if isinstance(result, JsProxy):
+        return result.results.to_py()
+    return result['results']
+
+
+async def fetch_batch(database, statements):
+    """Every statement's rows from one D1 batch, as lists of dicts"""
+    results = to_python(await database.batch(statements))
+    return [result['results'] for result in results]
+
+
+async def fetch_one(statement):
+    """The first row of a statement as a dict, or None"""
+    return to_python(await statement.first())
+
+
+def d1_binding(env, name):
+    """The D1 binding called name, behind the same wrappers (counting, tracing, query log) as env.DB"""
+    wrapped = getattr(type(env), 'd1_binding', None)
+    if wrapped is not None:
+        return wrapped(env, name)
+    return env.DB if name == 'DB' else getattr(env, name)
+
+
+def multi_row_statements(env, prefix, rows, suffix=''):
+    """Pack rows into as few multi-row VALUES statements as D1's parameter limit allows"""
+    if not rows:
+        return []
+    width = len(rows[0])
+    placeholder = '(' + ', '.join(['?'] * width) + ')'
+    per_statement = max(1, D1_MAX_BOUND_PARAMETERS // width)
+
+    statements = []
+    for start in range(0, len(rows), per_statement):
+        chunk = rows[start:start + per_statement]
+        query = prefix + ' VALUES ' + ', '.join([placeholder] * len(chunk)) + suffix
+        bindings = [value for row in chunk for value in row]
+        statements.append(env.DB.prepare(query).bind(*bindings))
+    return statements
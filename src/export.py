@@ -0,0 +1,138 @@
+"""
+Bulk Export Handler
+"""
+
+from js import Response, URL, ReadableStream, TextEncoder, Object
+from pyodide.ffi import create_proxy, to_js
+import csv
+import io
+import json
+from api import build_issue_filters, hydrate_issue, issue_select_list, parse_fields, ISSUE_FIELDS
+from db import fetch_all
+from responses import build_headers, error_response
+from shards import repository_env
+
+
+# Issues read from D1 per keyset page; memory use is bounded by this, not by repository size
+EXPORT_CHUNK_SIZE = 500
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CSV_COLUMNS = [
+    'id', 'number', 'title', 'state', 'created_at', 'updated_at', 'closed_at',
+    'html_url', 'repository', 'assignee', 'milestone', 'time_to_close',
+    'labels', 'assignees', 'body'
+]
+
+
+async def iter_export_chunks(env, params, fields=ISSUE_FIELDS, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of hydrated issues, reading D1 in keyset order by issue id"""
+    joins, conditions, bindings = build_issue_filters(params)
+    query = 'SELECT DISTINCT ' + issue_select_list(fields) + ' FROM issues i' + ''.join(joins)
+    query += ' WHERE ' + ' AND '.join(conditions + ['i.id > ?'])
+    query += ' ORDER BY i.id LIMIT ?'
+
+    last_id = -1
+    while True:
+        rows = await fetch_all(env.DB.prepare(query).bind(*bindings, last_id, chunk_size))
+        if not rows:
+            return
+
+        last_id = rows[-1]['id']
+        yield [hydrate_issue(row, fields) for row in rows]
+
+        if len(rows) < chunk_size:
+            return
+
+
+def format_ndjson(issues, first_chunk, columns):
+    """Serialize a chunk of issues as newline-delimited JSON"""
+    return ''.join(json.dumps(issue) + '\n' for issue in issues)
+
+
+def format_csv(issues, first_chunk, columns=CSV_COLUMNS):
+    """Serialize a chunk of issues as CSV, with the header row on the first chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if first_chunk:
+        writer.writerow(columns)
+    for issue in issues:
+        row = dict(issue)
+        row['labels'] = ';'.join(label['name'] for label in issue.get('labels', []))
+        row['assignees'] = ';'.join(issue.get('assignees', []))
+        writer.writerow([row.get(column) for column in columns])
+    return buffer.getvalue()
+
+
+FORMATTERS = {
+    'ndjson': format_ndjson,
+    'csv': format_csv,
+}
+
+
+async def handle_export(request, env, session):
+    """Stream every issue matching the issue list filters as NDJSON or CSV"""
+    url = URL.new(request.url)
+    repository = url.searchParams.get('repository')
+    export_format = url.searchParams.get('format') or 'ndjson'
+
+    if not repository or export_format not in EXPORT_FORMATS:
+        return error_response('repository parameter required and format must be ndjson or csv', 400)
+
+    try:
+        fields = parse_fields(url.searchParams.get('fields'), ISSUE_FIELDS)
+    except ValueError as error:
+        return error_response(str(error), 400)
+    columns = [column for column in CSV_COLUMNS if column in fields]
+
+    chunks = iter_export_chunks(repository_env(env, repository), url.searchParams, fields)
+    formatter = FORMATTERS[export_format]
+    encoder = TextEncoder.new()
+    state = {'first_chunk': True, 'released': False}
+
+    def release():
+        # Once per stream, whether it ended, failed or the client cancelled it
+        if not state['released']:
+            state['released'] = True
+            pull_proxy.destroy()
+            cancel_proxy.destroy()
+
+    async def pull(controller):
+        try:
+            issues = await anext(chunks)
+        except StopAsyncIteration:
+            issues = None
+        except Exception as error:
+            print(f'Error exporting issues: {error}')
+            controller.error(str(error))
+            release()
+            return
+
+        # The client cancelled while this chunk was being read
+        if state['released']:
+            return
+        if issues is None:
+            if state['first_chunk'] and export_format == 'csv':
+                controller.enqueue(encoder.encode(format_csv([], True, columns)))
+            controller.close()
+            release()
+            return
+        controller.enqueue(encoder.encode(formatter(issues, state['first_chunk'], columns)))
+        state['first_chunk'] = False
+
+    def cancel(reason):
+        release()
+
+    pull_proxy = create_proxy(pull)
+    cancel_proxy = create_proxy(cancel)
+    stream = ReadableStream.new(to_js({'pull': pull_proxy, 'cancel': cancel_proxy}, dict_converter=Object.fromEntries))
+
+    filename = repository.replace('/', '-') + '-issues.' + export_format
+    headers = build_headers({
+        'Content-Type': EXPORT_FORMATS[export_format],
+        'Content-Disposition': f'attachment; filename="{filename}"',
+    })
+    return Response.new(stream, headers=headers)
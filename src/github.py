@@ -3,12 +3,48 @@ GitHub API Client
 """
 
 from js import fetch, Headers
+import hashlib
 import json
+import time
+from collections import Counter
+from contextlib import nullcontext
 from datetime import datetime
+from db import fetch_batch, multi_row_statements, D1_MAX_BOUND_PARAMETERS
+from metadata import (
+    commit_labels,
+    issue_label_statements,
+    label_check_statement,
+    label_write_statements,
+    refresh_labels,
+    repository_statement
+)
+from tracing import record_github_call
+from stats import record_github_response, record_sync
+from percentiles import (
+    contributions,
+    histogram_delta_statements,
+    rebuild_time_to_close_histograms
+)
 
 
 GITHUB_API_BASE = 'https://api.github.com'
 
+ISSUE_COLUMNS = [
+    'id', 'number', 'title', 'body', 'state', 'created_at', 'updated_at', 'closed_at',
+    'html_url', 'repository', 'assignee', 'milestone', 'time_to_close'
+]
+
+# Columns a later sync or update may change on an existing issue row
+MUTABLE_ISSUE_COLUMNS = [
+    'title', 'body', 'state', 'updated_at', 'closed_at', 'assignee', 'milestone', 'time_to_close'
+]
+
+# Changes to these move the repository metrics rollup (a new row does too)
+ROLLUP_COLUMNS = ('state', 'time_to_close')
+
+# Issues written per D1 batch during a repository sync
+SYNC_BATCH_SIZE = 100
+
 
 async def github_request(path, access_token, options=None):
     """Make authenticated GitHub API request"""
@@ -30,7 +66,10 @@ async def github_request(path, access_token, options=None):
     if 'body' in options:
         fetch_options['body'] = options['body']
     
+    start = time.perf_counter()
     response = await fetch(f'{GITHUB_API_BASE}{path}', fetch_options)
+    record_github_call(start, fetch_options.get('method', 'GET'), path, response)
+    record_github_response(response)
     
     if not response.ok:
         error_text = await response.text()
@@ -65,38 +104,58 @@ async def fetch_repository_issues(owner, repo, access_token, state='all'):
     return issues
 
 
-async def sync_repository(owner, repo, access_token, env):
-    """Sync issues from GitHub to database"""
+async def sync_repository(owner, repo, access_token, env, write_lock=None):
+    """Sync issues from GitHub to database; the writes run under write_lock (the repository's writer), if given"""
     repository = f'{owner}/{repo}'
+    start = time.perf_counter()
     
     try:
-        # Update sync status
-        await env.DB.prepare('''
-            INSERT INTO sync_status (repository, last_sync, status)
-            VALUES (?, ?, 'in_progress')
-            ON CONFLICT(repository) DO UPDATE SET
-                last_sync = excluded.last_sync,
-                status = 'in_progress',
-                error_message = NULL
-        ''').bind(repository, datetime.utcnow().isoformat()).run()
+        # Update sync status; a synced repository is kept fresh by the scheduled sync from now on
+        started_at = datetime.utcnow()
+        await env.DB.batch([
+            env.DB.prepare('''
+                INSERT INTO sync_status (repository, last_sync, status)
+                VALUES (?, ?, 'in_progress')
+                ON CONFLICT(repository) DO UPDATE SET
+                    last_sync = excluded.last_sync,
+                    status = 'in_progress',
+                    error_message = NULL
+            ''').bind(repository, started_at.isoformat()),
+            env.DB.prepare(
+                'INSERT INTO tracked_repositories (repository, added_at) VALUES (?, ?) ON CONFLICT DO NOTHING'
+            ).bind(repository, started_at.isoformat()),
+            repository_statement(env, repository),
+        ])
         
-        # Fetch all issues
+        # Fetch all issues (an issue listed twice while pages shift is written once)
         issues = await fetch_repository_issues(owner, repo, access_token)
+        records = {issue['number']: issue_record(issue, repository) for issue in issues}
         
-        # Store in database
-        for issue in issues:
-            await sync_issue(issue, repository, env)
+        async with write_lock or nullcontext():
+            written, skipped = await write_synced_records(repository, records, env)
+            
+            # Update sync status
+            # (issues edited while the list was paged through are after the cursor: it is the start time)
+            duration = time.perf_counter() - start
+            await env.DB.prepare('''
+                UPDATE sync_status SET status = ?, last_sync = ?, cursor_updated_at = ?,
+                    duration_ms = ?, issues_per_second = ?, written = ?, skipped = ?
+                WHERE repository = ?
+            ''').bind(
+                'completed', datetime.utcnow().isoformat(), started_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                round(duration * 1000), round(len(records) / duration, 1) if duration > 0 else None,
+                written, skipped, repository
+            ).run()
+            
+            # Update metrics (histograms only move when an issue was written)
+            await update_repository_metrics(repository, env)
+            if written:
+                await rebuild_time_to_close_histograms(repository, env)
         
-        # Update sync status
-        await env.DB.prepare(
-            'UPDATE sync_status SET status = ?, last_sync = ? WHERE repository = ?'
-        ).bind('completed', datetime.utcnow().isoformat(), repository).run()
-        
-        # Update metrics
-        await update_repository_metrics(repository, env)
-        
-        return {'success': True, 'count': len(issues)}
+        record_sync(written, start, succeeded=True, skipped=skipped)
+        return {'success': True, 'count': written + skipped, 'written': written, 'skipped': skipped}
     except Exception as error:
+        record_sync(0, start, succeeded=False)
         # Update sync status with error
         await env.DB.prepare(
             'UPDATE sync_status SET status = ?, error_message = ? WHERE repository = ?'
@@ -105,54 +164,177 @@ async def sync_repository(owner, repo, access_token, env):
         raise error
 
 
-async def sync_issue(issue, repository, env):
-    """Sync single issue to database"""
-    time_to_close = None
-    if issue['state'] == 'closed' and issue.get('closed_at'):
-        time_to_close = calculate_time_to_close(issue['created_at'], issue['closed_at'])
-    
-    # Insert or update issue
-    await env.DB.prepare('''
-        INSERT INTO issues (id, number, title, body, state, created_at, updated_at, closed_at, html_url, repository, assignee, milestone, time_to_close)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(repository, number) DO UPDATE SET
-            title = excluded.title,
-            body = excluded.body,
-            state = excluded.state,
-            updated_at = excluded.updated_at,
-            closed_at = excluded.closed_at,
-            assignee = excluded.assignee,
-            milestone = excluded.milestone,
-            time_to_close = excluded.time_to_close
-    ''').bind(
-        issue['id'],
-        issue['number'],
-        issue['title'],
-        issue.get('body', ''),
-        issue['state'],
-        issue['created_at'],
-        issue['updated_at'],
-        issue.get('closed_at'),
-        issue['html_url'],
-        repository,
-        issue['assignee']['login'] if issue.get('assignee') else None,
-        issue['milestone']['title'] if issue.get('milestone') else None,
-        time_to_close
-    ).run()
-    
-    # Update labels
-    await env.DB.prepare('DELETE FROM labels WHERE issue_id = ?').bind(issue['id']).run()
-    for label in issue.get('labels', []):
-        await env.DB.prepare(
-            'INSERT INTO labels (issue_id, name, color) VALUES (?, ?, ?)'
-        ).bind(issue['id'], label['name'], label['color']).run()
+async def write_synced_records(repository, records, env):
+    """Write synced issue records in batches, skipping stored rows that match or are newer; returns (written, skipped)"""
+    stored = await load_sync_states(repository, env)
+    pending = []
+    written = 0
+    skipped = 0
+    for number, record in records.items():
+        # A webhook may have stored a newer version since the list was fetched
+        state = stored.get(number)
+        if state and (state[0] > record['updated_at'] or state == (record['updated_at'], relations_hash(record))):
+            skipped += 1
+            continue
+        
+        pending.append(record)
+        if len(pending) >= SYNC_BATCH_SIZE:
+            await write_issue_records(pending, env, skip_unchanged=True)
+            written += len(pending)
+            pending = []
     
-    # Update assignees
-    await env.DB.prepare('DELETE FROM assignees WHERE issue_id = ?').bind(issue['id']).run()
-    for assignee in issue.get('assignees', []):
-        await env.DB.prepare(
-            'INSERT INTO assignees (issue_id, username) VALUES (?, ?)'
-        ).bind(issue['id'], assignee['login']).run()
+    if pending:
+        await write_issue_records(pending, env, skip_unchanged=True)
+        written += len(pending)
+    return written, skipped
+
+
+async def load_sync_states(repository, env):
+    """(updated_at, relations_hash) of every stored issue in a repository, by number (refreshing its cached labels)"""
+    rows, labels = await fetch_batch(env.DB, [
+        env.DB.prepare('SELECT number, updated_at, relations_hash FROM issues WHERE repository = ?').bind(repository),
+        label_check_statement(env, [repository]),
+    ])
+    refresh_labels(env, labels, [repository])
+    return {row['number']: (row['updated_at'], row['relations_hash']) for row in rows}
+
+
+async def load_stored_issues(repository, numbers, env):
+    """Stored issue records (with labels and assignees) by number, read in one batch that refreshes the cached labels"""
+    columns = ', '.join('i.' + column for column in ISSUE_COLUMNS + ['relations_hash'])
+    per_statement = D1_MAX_BOUND_PARAMETERS - 1
+    statements = [
+        env.DB.prepare(f'''
+            SELECT {columns},
+                (SELECT json_group_array(json_object('id', l.id, 'name', l.name, 'color', l.color))
+                    FROM issue_labels il
+                    INNER JOIN repo_labels l ON l.repository = i.repository AND l.id = il.label_id
+                    WHERE il.issue_id = i.id) as labels_json,
+                (SELECT json_group_array(username) FROM assignees WHERE issue_id = i.id) as assignees_json
+            FROM issues i
+            WHERE i.repository = ? AND i.number IN ({', '.join(['?'] * len(chunk))})
+        ''').bind(repository, *chunk)
+        for chunk in (numbers[start:start + per_statement] for start in range(0, len(numbers), per_statement))
+    ]
+    *results, labels = await fetch_batch(env.DB, statements + [label_check_statement(env, [repository])])
+    refresh_labels(env, labels, [repository])
+
+    stored = {}
+    for row in (row for rows in results for row in rows):
+        row['labels'] = json.loads(row.pop('labels_json') or '[]')
+        row['assignees'] = json.loads(row.pop('assignees_json') or '[]')
+        stored[row['number']] = row
+    return stored
+
+
+async def apply_issue_changes(issues, repository, env, stored, update_metrics=True):
+    """Write GitHub issue payloads over their stored records in one batch; returns (numbers that changed, new metrics row or None)"""
+    issue_statements = []
+    previous_cells = Counter()
+    current_cells = Counter()
+    rollups_changed = False
+    changed_numbers = []
+    changed_records = []
+    
+    # An issue updated twice is written once, from its latest payload
+    latest = {issue['number']: issue for issue in issues}
+    for number, issue in latest.items():
+        record = issue_record(issue, repository)
+        previous = stored.get(number)
+        # A delivery older than the stored row (retried or out of order) changes nothing, cells included
+        if previous is not None and record['updated_at'] < previous['updated_at']:
+            continue
+        changes, moves_rollups = issue_change_statements(previous, record, env)
+        if not changes:
+            # Unchanged: its histogram cells stay where they are
+            continue
+        issue_statements.extend(changes)
+        changed_numbers.append(number)
+        changed_records.append(record)
+        rollups_changed = rollups_changed or moves_rollups
+        if previous is not None:
+            previous_cells.update(record_contributions(previous))
+        current_cells.update(record_contributions(record))
+    
+    # New and recolored labels of every changed record go in ahead of all the issue rows naming them
+    statements, labels = label_write_statements(env, repository, changed_records)
+    statements.extend(issue_statements)
+    statements.extend(histogram_delta_statements(repository, previous_cells, current_cells, env))
+    metrics = None
+    if update_metrics and rollups_changed:
+        # Last in the batch; it returns the recomputed row
+        statements.append(repository_metrics_statement(repository, env))
+        metrics_rows = (await fetch_batch(env.DB, statements))[-1]
+        metrics = metrics_rows[0] if metrics_rows else None
+    elif statements:
+        await env.DB.batch(statements)
+    commit_labels(env, repository, labels)
+    return changed_numbers, metrics
+
+
+def issue_change_statements(stored, record, env):
+    """(statements bringing a stored record up to date, whether the metrics rollup moves); record is not older than stored"""
+    if stored is None:
+        return issue_write_statements([record], env), True
+    
+    changes = {column: record[column] for column in MUTABLE_ISSUE_COLUMNS if stored[column] != record[column]}
+    record_hash = relations_hash(record)
+    if record_hash != stored['relations_hash']:
+        changes['relations_hash'] = record_hash
+    
+    statements = []
+    if changes:
+        statements.append(env.DB.prepare(
+            'UPDATE issues SET ' + ', '.join(f'{column} = ?' for column in changes) + ' WHERE id = ?'
+        ).bind(*changes.values(), stored['id']))
+    
+    moves_rollups = any(column in ROLLUP_COLUMNS for column in changes)
+    if record_hash == stored['relations_hash']:
+        return statements, moves_rollups
+    
+    # Colors live in repo_labels (apply_issue_changes updates them); issues only gain and lose labels
+    stored_labels = {label['name']: label['id'] for label in stored['labels']}
+    labels = {label['name'] for label in record['labels']}
+    statements.extend(relation_delete_statements(
+        env, 'issue_labels', 'label_id', stored['id'],
+        sorted(label_id for name, label_id in stored_labels.items() if name not in labels)
+    ))
+    statements.extend(issue_label_statements(
+        env, record['repository'], [[stored['id'], name] for name in sorted(labels.difference(stored_labels))]
+    ))
+    
+    stored_assignees = set(stored['assignees'])
+    assignees = set(record['assignees'])
+    statements.extend(relation_delete_statements(
+        env, 'assignees', 'username', stored['id'], sorted(stored_assignees - assignees)
+    ))
+    statements.extend(multi_row_statements(
+        env,
+        'INSERT INTO assignees (issue_id, username)',
+        [[stored['id'], username] for username in sorted(assignees - stored_assignees)]
+    ))
+    
+    return statements, moves_rollups
+
+
+def relation_delete_statements(env, table, column, issue_id, values):
+    """Statements deleting an issue's label or assignee rows with the given values"""
+    per_statement = D1_MAX_BOUND_PARAMETERS - 1
+    return [
+        env.DB.prepare(
+            f'DELETE FROM {table} WHERE issue_id = ? AND {column} IN ({", ".join(["?"] * len(chunk))})'
+        ).bind(issue_id, *chunk)
+        for chunk in (values[start:start + per_statement] for start in range(0, len(values), per_statement))
+    ]
+
+
+def record_contributions(record):
+    """Histogram cells of an issue record, stored or from GitHub"""
+    return contributions(
+        record['time_to_close'],
+        [label['name'] for label in record['labels']],
+        record['assignees']
+    )
 
 
 async def update_github_issue(owner, repo, issue_number, updates, access_token):
@@ -176,32 +358,120 @@ def calculate_time_to_close(created_at, closed_at):
     return round(delta.total_seconds() / 3600)  # hours
 
 
-async def update_repository_metrics(repository, env):
-    """Update repository metrics"""
-    today = datetime.utcnow().date().isoformat()
+def issue_time_to_close(issue):
+    """Hours from creation to close for a closed GitHub issue payload, else None"""
+    if issue['state'] == 'closed' and issue.get('closed_at'):
+        return calculate_time_to_close(issue['created_at'], issue['closed_at'])
+    return None
+
+
+def issue_record(issue, repository):
+    """A GitHub issue payload as an issues row plus its label and assignee rows"""
+    return {
+        'id': issue['id'],
+        'number': issue['number'],
+        'title': issue['title'],
+        'body': issue.get('body', ''),
+        'state': issue['state'],
+        'created_at': issue['created_at'],
+        'updated_at': issue['updated_at'],
+        'closed_at': issue.get('closed_at'),
+        'html_url': issue['html_url'],
+        'repository': repository,
+        'assignee': issue['assignee']['login'] if issue.get('assignee') else None,
+        'milestone': issue['milestone']['title'] if issue.get('milestone') else None,
+        'time_to_close': issue_time_to_close(issue),
+        'labels': [{'name': label['name'], 'color': label['color']} for label in issue.get('labels', [])],
+        'assignees': [assignee['login'] for assignee in issue.get('assignees', [])],
+    }
+
+
+def relations_hash(issue):
+    """Content hash of an issue record's labels and assignees"""
+    canonical = [
+        sorted([label['name'], label['color'] or ''] for label in issue['labels']),
+        sorted(issue['assignees'])
+    ]
+    return hashlib.sha1(json.dumps(canonical).encode('utf-8')).hexdigest()
+
+
+async def write_issue_records(records, env, skip_unchanged=False):
+    """Write one repository's issue records in one D1 batch, their new labels first, then cache those labels"""
+    repository = records[0]['repository']
+    statements, labels = label_write_statements(env, repository, records)
+    await env.DB.batch(statements + issue_write_statements(records, env, skip_unchanged))
+    commit_labels(env, repository, labels)
+
+
+def issue_write_statements(issues, env, skip_unchanged=False):
+    """Statements that upsert issue records and replace their label/assignee rows"""
+    repository = issues[0]['repository']
     
-    stats = await env.DB.prepare('''
-        SELECT 
-            COUNT(*) as total,
-            SUM(CASE WHEN state = 'open' THEN 1 ELSE 0 END) as open,
-            SUM(CASE WHEN state = 'closed' THEN 1 ELSE 0 END) as closed,
-            AVG(CASE WHEN time_to_close IS NOT NULL THEN time_to_close END) as avg_time
-        FROM issues WHERE repository = ?
-    ''').bind(repository).first()
+    upsert = ' ON CONFLICT(repository, number) DO UPDATE SET ' + ', '.join(
+        f'{column} = excluded.{column}' for column in MUTABLE_ISSUE_COLUMNS + ['relations_hash']
+    )
+    # Leaves the stored row untouched unless GitHub reports it newer, or as
+    # recent with different labels/assignees
+    if skip_unchanged:
+        upsert += (
+            ' WHERE excluded.updated_at > issues.updated_at'
+            ' OR (excluded.updated_at = issues.updated_at'
+            ' AND excluded.relations_hash IS NOT issues.relations_hash)'
+        )
+
+    statements = multi_row_statements(
+        env,
+        'INSERT INTO issues (' + ', '.join(ISSUE_COLUMNS) + ', relations_hash)',
+        [[issue[column] for column in ISSUE_COLUMNS] + [relations_hash(issue)] for issue in issues],
+        upsert
+    )
+    # Labels and assignees are replaced only on rows that now carry the
+    # record's updated_at, so a newer stored row keeps its own
+    current = [[issue['id'], issue['updated_at']] for issue in issues]
+    for table in ('issue_labels', 'assignees'):
+        statements.extend(multi_row_statements(
+            env,
+            f'DELETE FROM {table} WHERE issue_id IN (SELECT i.id FROM issues i INNER JOIN (',
+            current,
+            ') v ON i.id = v.column1 AND i.updated_at = v.column2)'
+        ))
+    statements.extend(issue_label_statements(
+        env, repository,
+        [[issue['id'], label['name'], issue['updated_at']] for issue in issues for label in issue['labels']],
+        current_only=True
+    ))
+    statements.extend(multi_row_statements(
+        env,
+        'INSERT INTO assignees (issue_id, username) SELECT v.column1, v.column2 FROM (',
+        [[issue['id'], username, issue['updated_at']] for issue in issues for username in issue['assignees']],
+        ') v INNER JOIN issues i ON i.id = v.column1 AND i.updated_at = v.column3'
+    ))
+    return statements
+
+
+def repository_metrics_statement(repository, env):
+    """Statement that recomputes today's metrics row from the issues table and returns it (no read round trip)"""
+    today = datetime.utcnow().date().isoformat()
     
-    await env.DB.prepare('''
+    return env.DB.prepare('''
         INSERT INTO metrics (repository, metric_date, total_issues, open_issues, closed_issues, avg_time_to_close)
-        VALUES (?, ?, ?, ?, ?, ?)
+        SELECT
+            ?,
+            ?,
+            COUNT(*),
+            COALESCE(SUM(CASE WHEN state = 'open' THEN 1 ELSE 0 END), 0),
+            COALESCE(SUM(CASE WHEN state = 'closed' THEN 1 ELSE 0 END), 0),
+            COALESCE(AVG(CASE WHEN time_to_close IS NOT NULL THEN time_to_close END), 0)
+        FROM issues WHERE repository = ?
         ON CONFLICT(repository, metric_date) DO UPDATE SET
             total_issues = excluded.total_issues,
             open_issues = excluded.open_issues,
             closed_issues = excluded.closed_issues,
             avg_time_to_close = excluded.avg_time_to_close
-    ''').bind(
-        repository,
-        today,
-        stats['total'] or 0,
-        stats['open'] or 0,
-        stats['closed'] or 0,
-        stats['avg_time'] or 0
-    ).run()
+        RETURNING total_issues, open_issues, closed_issues, avg_time_to_close
+    ''').bind(repository, today, repository)
+
+
+async def update_repository_metrics(repository, env):
+    """Update repository metrics"""
+    await repository_metrics_statement(repository, env).run()
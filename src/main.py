@@ -3,29 +3,228 @@ OSS Project Management - Python Cloudflare Worker
 Main entry point for the application
 """
 
-from js import Response, Headers, URL, fetch
-from auth import handle_auth, handle_auth_callback, verify_session
-from webhook import handle_webhook
-from api import (
-    handle_get_issues,
-    handle_get_issue,
-    handle_update_issue,
-    handle_bulk_update,
-    handle_sync_repository
-)
-from metrics import handle_get_metrics
-from ui import serve_ui
-from static_files import serve_css, serve_js
-import json
-
-
-def get_cors_headers():
-    """Get CORS headers for API requests"""
-    return {
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Methods': 'GET, POST, PUT, PATCH, DELETE, OPTIONS',
-        'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-    }
+from js import URL
+from workers import DurableObject
+from responses import json_response, error_response, text_response
+from router import Budget, Route, Router
+from tracing import Trace, TracedEnv, current_trace, tracing_enabled
+from querylog import QueryLog, LoggedEnv, slow_query_threshold, explain_enabled
+import stats
+import importlib
+import sys
+import time
+
+
+# Handler modules are imported on first use rather than at isolate start, so
+# a cold start only pays for the modules its first request needs (a webhook
+# delivery never loads the UI bundle or the metrics code). Milliseconds spent
+# importing each one, including the modules it pulls in, in load order; the
+# response to the request that imported a module reports it in Server-Timing.
+MODULE_IMPORT_TIMES = {}
+
+
+def load_module(name):
+    """Import a handler module on first use, recording its import time"""
+    module = sys.modules.get(name)
+    stats.record_cache('modules', module is not None)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        MODULE_IMPORT_TIMES[name] = (time.perf_counter() - start) * 1000
+    return module
+
+
+def import_timing(since):
+    """Server-Timing entries for the modules imported after the first `since`"""
+    imported = list(MODULE_IMPORT_TIMES.items())[since:]
+    return ', '.join(f'import;desc="{name}";dur={elapsed:.1f}' for name, elapsed in imported)
+
+
+# Middleware: async (request, env, context, call_next) -> Response
+
+async def require_session(request, env, context, call_next):
+    """Reject the request with 401 unless it carries a valid session"""
+    session = await load_module('auth').verify_session(request, env)
+    if not session:
+        return error_response('Unauthorized', 401)
+    context['session'] = session
+    return await call_next()
+
+
+def cache_control(value):
+    """Set Cache-Control on responses whose handler did not choose one"""
+    async def middleware(request, env, context, call_next):
+        response = await call_next()
+        if not response.headers.has('Cache-Control'):
+            response.headers.set('Cache-Control', value)
+        return response
+    return middleware
+
+
+async def trace_request(request, env, context, call_next):
+    """Report worker time in Server-Timing; with TRACING on, also D1/GitHub spans and a JSON log line"""
+    if not tracing_enabled(env):
+        start = time.perf_counter()
+        response = await call_next()
+        response.headers.append('Server-Timing', f'app;dur={(time.perf_counter() - start) * 1000:.1f}')
+        return response
+
+    trace = Trace()
+    token = current_trace.set(trace)
+    try:
+        response = await call_next(TracedEnv(env, trace))
+    finally:
+        current_trace.reset(token)
+    response.headers.append('Server-Timing', trace.server_timing())
+    trace.log(method=request.method, route=context['route'], status=response.status)
+    return response
+
+
+def require_token(secret_name):
+    """Reject the request with 401 unless it carries the named secret as a bearer token"""
+    async def middleware(request, env, context, call_next):
+        if not stats.bearer_token_valid(request, env, secret_name):
+            return error_response('Unauthorized', 401)
+        return await call_next()
+    return middleware
+
+
+async def log_queries(request, env, context, call_next):
+    """With SLOW_QUERY_MS set, register every D1 statement by fingerprint and log the slow ones"""
+    threshold = slow_query_threshold(env)
+    if threshold is None:
+        return await call_next()
+    log = QueryLog(env.DB, threshold, explain=explain_enabled(env), route=context['route'])
+    return await call_next(LoggedEnv(env, log))
+
+
+API_MIDDLEWARE = [trace_request, log_queries, require_session, cache_control('private, no-cache')]
+
+
+# Route handlers: async (request, env, context) -> Response. context holds
+# the path params, the route pattern and, behind require_session, the session.
+
+async def serve_page(request, env, context):
+    return load_module('ui').serve_ui(request, env)
+
+
+async def serve_static(request, env, context):
+    response = load_module('assets').handle_static(request, '/static/' + context['params']['file'])
+    return response or text_response('Not Found', 404)
+
+
+async def start_auth(request, env, context):
+    return await load_module('auth').handle_auth(env)
+
+
+async def finish_auth(request, env, context):
+    return await load_module('auth').handle_auth_callback(request, env)
+
+
+async def receive_webhook(request, env, context):
+    return await load_module('webhook').handle_webhook(request, env)
+
+
+async def show_shards(request, env, context):
+    return await load_module('rebalance').handle_get_placement(request, env)
+
+
+async def move_shard(request, env, context):
+    return await load_module('rebalance').handle_move_repository(request, env)
+
+
+async def serve_stats(request, env, context):
+    return text_response(stats.render(), headers={
+        'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+        'Cache-Control': 'no-store'
+    })
+
+
+def api_handler(module_name, function_name):
+    """Route handler calling module.function(request, env, session)"""
+    async def handler(request, env, context):
+        function = getattr(load_module(module_name), function_name)
+        return await function(request, env, context['session'])
+    return handler
+
+
+def issue_handler(function_name):
+    """Route handler for a single issue, addressed by number and, optionally, in the path by repository"""
+    async def handler(request, env, context):
+        params = context['params']
+        repository = f"{params['owner']}/{params['repo']}" if 'owner' in params else None
+        function = getattr(load_module('api'), function_name)
+        return await function(request, env, context['session'], params['number'], repository=repository)
+    return handler
+
+
+# Budgets count D1 round trips (a batch is one) and GitHub API calls per
+# request, session lookup included. Routes whose work grows with the
+# repository or the request body (sync, bulk update, export, import) have none.
+ROUTES = [
+    Route('GET', '/', serve_page, budget=Budget(d1=0, github=0)),
+    Route('GET', '/static/{file}', serve_static, budget=Budget(d1=0, github=0)),
+    Route('GET', '/auth', start_auth, budget=Budget(d1=0, github=0)),
+    Route('GET', '/auth/callback', finish_auth, budget=Budget(d1=1)),
+    # Read the stored issue, then write what changed in one batch
+    Route('POST', '/webhook', receive_webhook, [trace_request, log_queries], budget=Budget(d1=2, github=0)),
+    Route('GET', '/internal/stats', serve_stats, [require_token('STATS_TOKEN')], budget=Budget(d1=0, github=0)),
+    Route('GET', '/internal/shards', show_shards, [require_token('ADMIN_TOKEN')]),
+    Route('POST', '/internal/shards/move', move_shard, [require_token('ADMIN_TOKEN')]),
+
+    Route('GET', '/api/session', api_handler('auth', 'handle_get_session'), API_MIDDLEWARE,
+          budget=Budget(d1=1, github=0)),
+    # Session, then page and total count in one batch: independent of page size and filters
+    # (without a repository, every shard is read at once; that counts as one shard's round trips)
+    Route('GET', '/api/issues', api_handler('api', 'handle_get_issues'), API_MIDDLEWARE,
+          budget=Budget(d1=2, github=0)),
+    Route('PATCH', '/api/issues/bulk', api_handler('api', 'handle_bulk_update'), API_MIDDLEWARE),
+    Route('GET', '/api/issues/{number:int}', issue_handler('handle_get_issue'), API_MIDDLEWARE,
+          budget=Budget(d1=2, github=0)),
+    Route('PATCH', '/api/issues/{number:int}', issue_handler('handle_update_issue'), API_MIDDLEWARE,
+          budget=Budget(d1=3, github=1)),
+    Route('GET', '/api/repos/{owner}/{repo}/issues/{number:int}', issue_handler('handle_get_issue'), API_MIDDLEWARE,
+          budget=Budget(d1=2, github=0)),
+    Route('PATCH', '/api/repos/{owner}/{repo}/issues/{number:int}', issue_handler('handle_update_issue'), API_MIDDLEWARE,
+          budget=Budget(d1=3, github=1)),
+    Route('POST', '/api/sync', api_handler('api', 'handle_sync_repository'), API_MIDDLEWARE),
+    Route('GET', '/api/sync/status', api_handler('api', 'handle_get_sync_status'), API_MIDDLEWARE,
+          budget=Budget(d1=2, github=0)),
+    Route('GET', '/api/repositories', api_handler('api', 'handle_get_repositories'), API_MIDDLEWARE,
+          budget=Budget(d1=2, github=0)),
+    Route('GET', '/api/metrics', api_handler('metrics', 'handle_get_metrics'), API_MIDDLEWARE,
+          budget=Budget(d1=9, github=0)),
+    # Session only; the stream then carries what the repository's writer applies
+    Route('GET', '/api/stream', api_handler('api', 'handle_stream'), API_MIDDLEWARE,
+          budget=Budget(d1=1, github=0)),
+    Route('GET', '/api/export', api_handler('export', 'handle_export'), API_MIDDLEWARE),
+    Route('POST', '/api/import', api_handler('snapshot', 'handle_import'), API_MIDDLEWARE),
+]
+
+# Compiled once per isolate
+ROUTER = Router(ROUTES)
+
+# Stats are kept per "METHOD pattern", a fixed set of labels
+ROUTE_NAMES = {route: f'{route.method} {route.pattern}' for route in ROUTES}
+REQUEST_STATS = stats.RequestStats(ROUTE_NAMES.values())
+
+
+def query_budget_mode(env):
+    """QUERY_BUDGETS: 'enforce' fails over-budget requests with a 500, 'log' only logs them"""
+    mode = str(getattr(env, 'QUERY_BUDGETS', '') or '').lower()
+    return mode if mode in ('enforce', 'log') else None
+
+
+def check_budget(route, counts, response, mode):
+    """Log a request that exceeded its route's budget; under 'enforce', replace its response"""
+    overruns = route.budget.overruns(counts.d1_calls, counts.github_calls)
+    if not overruns:
+        return response
+    message = f'{ROUTE_NAMES[route]} made ' + ' and '.join(overruns)
+    print(f'Error: query budget exceeded: {message}')
+    if mode != 'enforce':
+        return response
+    return json_response({'error': 'Query budget exceeded', 'message': message}, status=500)
 
 
 async def on_fetch(request, env):
@@ -34,81 +233,65 @@ async def on_fetch(request, env):
     path = url.pathname
     method = request.method
     
-    cors_headers = get_cors_headers()
-    
     # Handle OPTIONS for CORS
     if method == 'OPTIONS':
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        return Response.new(None, status=200, headers=headers)
+        return text_response(None)
+    
+    start = time.perf_counter()
+
+    # Resolved before any middleware runs, so unknown routes never reach D1
+    route, params, allowed_methods = ROUTER.match('GET' if method == 'HEAD' else method, path)
+    if not route:
+        if allowed_methods:
+            response = text_response('Method Not Allowed', 405, {'Allow': ', '.join(allowed_methods)})
+        else:
+            response = text_response('Not Found', 404)
+        REQUEST_STATS.record('unmatched', response.status, start, 0)
+        return response
     
+    imported = len(MODULE_IMPORT_TIMES)
+    counts = stats.RequestCounts()
+    token = stats.current_counts.set(counts)
     try:
-        # Public routes
-        if path == '/':
-            return serve_ui(env)
-        
-        # Static files
-        if path == '/static/styles.css':
-            return serve_css()
-        
-        if path == '/static/app.js':
-            return serve_js()
-        
-        if path == '/auth':
-            return handle_auth(env)
-        
-        if path == '/auth/callback':
-            return await handle_auth_callback(request, env)
-        
-        if path == '/webhook' and method == 'POST':
-            return await handle_webhook(request, env)
-        
-        # Protected API routes
-        session = await verify_session(request, env)
-        if not session:
-            headers = Headers.new()
-            for key, value in cors_headers.items():
-                headers.set(key, value)
-            headers.set('Content-Type', 'application/json')
-            body = json.dumps({'error': 'Unauthorized'})
-            return Response.new(body, status=401, headers=headers)
-        
-        # API Routes
-        if path == '/api/issues' and method == 'GET':
-            return await handle_get_issues(request, env, session, cors_headers)
-        
-        if path.startswith('/api/issues/') and path != '/api/issues/bulk':
-            issue_number = path.split('/')[-1]
-            if issue_number.isdigit():
-                if method == 'GET':
-                    return await handle_get_issue(request, env, session, issue_number, cors_headers)
-                elif method == 'PATCH':
-                    return await handle_update_issue(request, env, session, issue_number, cors_headers)
-        
-        if path == '/api/issues/bulk' and method == 'PATCH':
-            return await handle_bulk_update(request, env, session, cors_headers)
-        
-        if path == '/api/sync' and method == 'POST':
-            return await handle_sync_repository(request, env, session, cors_headers)
-        
-        if path == '/api/metrics' and method == 'GET':
-            return await handle_get_metrics(request, env, session, cors_headers)
-        
-        # 404 for unknown routes
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        return Response.new('Not Found', status=404, headers=headers)
+        context = {'params': params, 'route': route.pattern}
+        response = await route(request, stats.CountingEnv(env, counts), context)
     
     except Exception as error:
         print(f'Error handling request: {error}')
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
-        body = json.dumps({
+        response = json_response({
             'error': 'Internal Server Error',
             'message': str(error)
-        })
-        return Response.new(body, status=500, headers=headers)
+        }, status=500)
+    
+    finally:
+        stats.current_counts.reset(token)
+
+    REQUEST_STATS.record(ROUTE_NAMES[route], response.status, start, counts.statements)
+
+    budget_mode = route.budget and query_budget_mode(env)
+    if budget_mode:
+        response = check_budget(route, counts, response, budget_mode)
+    if len(MODULE_IMPORT_TIMES) > imported:
+        response.headers.append('Server-Timing', import_timing(imported))
+    return response
+
+
+class RepositoryWriter(DurableObject):
+    """Durable Object (REPOSITORY_WRITER binding) serializing one repository's D1 writes across isolates"""
+
+    def __init__(self, ctx, env):
+        super().__init__(ctx, env)
+        self.ctx = ctx
+        self.env = env
+        self.queue = None
+
+    async def fetch(self, request):
+        return await load_module('writer').handle_writer_request(self, request)
+
+
+async def on_scheduled(event, env, ctx):
+    """Cron trigger: advance the stalest tracked repositories' incremental syncs"""
+    try:
+        await load_module('scheduler').run_scheduled_sync(env)
+    except Exception as error:
+        print(f'Error in scheduled sync: {error}')
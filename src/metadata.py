@@ -0,0 +1,230 @@
+"""
+Repository and Label Metadata
+"""
+
+import json
+from datetime import datetime
+from db import fetch_all, fetch_batch, D1_MAX_BOUND_PARAMETERS
+from shards import repository_env
+
+
+# Labels of the repositories this isolate has served, by (shard, repository)
+LABEL_CACHE = {}
+
+
+class RepositoryLabels:
+    """One repository's labels: by id for reading issues, colors by name for writing them"""
+
+    def __init__(self, version, rows=()):
+        # None until the next label check confirms the version
+        self.version = version
+        self.by_id = {row['id']: {'name': row['name'], 'color': row['color']} for row in rows if row['id'] is not None}
+        self.colors = {label['name']: label['color'] for label in self.by_id.values()}
+
+
+def cache_key(env, repository):
+    """Cache key of a repository's labels on the shard env reads and writes"""
+    return (getattr(env, 'shard', 'DB'), repository)
+
+
+def cached_labels(env, repository):
+    """The cached labels of a repository, or None"""
+    return LABEL_CACHE.get(cache_key(env, repository))
+
+
+def mark_stale(env, repository):
+    """Make the next label check reread a repository's labels"""
+    entry = cached_labels(env, repository)
+    if entry is not None:
+        entry.version = None
+
+
+def label_check_statement(env, repositories=None):
+    """Statement returning a row per repository (given, or every one on the shard), with its labels if the cache is out of date"""
+    shard = getattr(env, 'shard', 'DB')
+    versions = {
+        repository: entry.version
+        for (entry_shard, repository), entry in LABEL_CACHE.items()
+        if entry_shard == shard and (repositories is None or repository in repositories)
+    }
+    query = '''
+        SELECT r.repository, r.labels_version, l.id, l.name, l.color
+        FROM repositories r
+        LEFT JOIN repo_labels l ON l.repository = r.repository
+            AND r.labels_version IS NOT json_extract(?, '$."' || r.repository || '"')
+    '''
+    bindings = [json.dumps(versions)]
+    if repositories is not None:
+        query += ' WHERE r.repository IN (' + ', '.join(['?'] * len(repositories)) + ')'
+        bindings.extend(repositories)
+    return env.DB.prepare(query).bind(*bindings)
+
+
+def refresh_labels(env, rows, repositories=None):
+    """Update the cache from a label_check_statement result for the same repositories"""
+    shard = getattr(env, 'shard', 'DB')
+    found = {}
+    for row in rows:
+        found.setdefault(row['repository'], []).append(row)
+
+    for repository, repository_rows in found.items():
+        key = (shard, repository)
+        entry = LABEL_CACHE.get(key)
+        version = repository_rows[0]['labels_version']
+        if entry is None or entry.version != version:
+            LABEL_CACHE[key] = RepositoryLabels(version, repository_rows)
+
+    # A repository without a row (not written yet, or moved away) has no labels to cache
+    for key in list(LABEL_CACHE):
+        if key[0] == shard and key[1] not in found and (repositories is None or key[1] in repositories):
+            del LABEL_CACHE[key]
+
+
+async def load_labels(env, repository):
+    """A repository's labels, read only if the cache is out of date; None if it has none stored"""
+    refresh_labels(env, await fetch_all(label_check_statement(env, [repository])), [repository])
+    return cached_labels(env, repository)
+
+
+def labels_version_statement(env, repository):
+    """Statement bumping a repository's labels_version after its labels change"""
+    return env.DB.prepare(
+        'UPDATE repositories SET labels_version = labels_version + 1 WHERE repository = ?'
+    ).bind(repository)
+
+
+def repository_statement(env, repository):
+    """Statement adding a repository's row unless it exists"""
+    return env.DB.prepare(
+        'INSERT INTO repositories (repository, added_at) VALUES (?, ?) ON CONFLICT DO NOTHING'
+    ).bind(repository, datetime.utcnow().isoformat())
+
+
+def label_upsert_statements(env, repository, labels):
+    """Statements adding (name, color) labels with the next free ids, or updating their colors"""
+    per_statement = (D1_MAX_BOUND_PARAMETERS - 2) // 2
+    statements = []
+    for start in range(0, len(labels), per_statement):
+        chunk = labels[start:start + per_statement]
+        statements.append(env.DB.prepare('''
+            INSERT INTO repo_labels (repository, id, name, color)
+            SELECT ?1, (SELECT COALESCE(MAX(id), 0) FROM repo_labels WHERE repository = ?1) + ROW_NUMBER() OVER (),
+                v.column1, v.column2
+            FROM (VALUES ''' + ', '.join(['(?, ?)'] * len(chunk)) + ''') v WHERE true
+            ON CONFLICT(repository, name) DO UPDATE SET color = COALESCE(excluded.color, repo_labels.color)
+        ''').bind(repository, *[value for label in chunk for value in label]))
+    return statements
+
+
+def label_write_statements(env, repository, records):
+    """(statements upserting the repository and the labels issue records add or recolor, the labels they write)"""
+    entry = cached_labels(env, repository)
+    statements = [] if entry is not None else [repository_statement(env, repository)]
+
+    # The newest record's color wins
+    colors = {}
+    for record in sorted(records, key=lambda record: record['updated_at']):
+        for label in record['labels']:
+            colors[label['name']] = label['color']
+    known = entry.colors if entry is not None else {}
+    labels = sorted(
+        (name, color) for name, color in colors.items()
+        if name not in known or (color is not None and known[name] != color)
+    )
+    if not labels:
+        return statements, labels
+
+    statements.extend(label_upsert_statements(env, repository, labels))
+    statements.append(labels_version_statement(env, repository))
+    return statements, labels
+
+
+def commit_labels(env, repository, labels):
+    """Hold labels a batch has written in the cache; the version bump makes the next check reread them with their ids"""
+    if not labels:
+        return
+    entry = cached_labels(env, repository)
+    if entry is None:
+        entry = LABEL_CACHE[cache_key(env, repository)] = RepositoryLabels(None)
+    entry.colors.update(labels)
+    entry.version = None
+
+
+def issue_label_statements(env, repository, rows, current_only=False):
+    """Statements adding (issue id, label name) rows to issue_labels, resolving names to the repository's label ids"""
+    # With current_only, rows also carry the record's updated_at and are added
+    # only while the stored issue row has that updated_at
+    width = 3 if current_only else 2
+    guard = 'INNER JOIN issues i ON i.id = v.column1 AND i.updated_at = v.column3' if current_only else ''
+    per_statement = (D1_MAX_BOUND_PARAMETERS - 1) // width
+    row_placeholder = '(' + ', '.join(['?'] * width) + ')'
+    return [
+        env.DB.prepare('''
+            INSERT INTO issue_labels (issue_id, label_id)
+            SELECT v.column1, l.id
+            FROM (VALUES ''' + ', '.join([row_placeholder] * len(chunk)) + ''') v
+            INNER JOIN repo_labels l ON l.repository = ? AND l.name = v.column2
+            ''' + guard + '''
+        ''').bind(*[value for row in chunk for value in row], repository)
+        for chunk in (rows[start:start + per_statement] for start in range(0, len(rows), per_statement))
+    ]
+
+
+async def page_labels(env, issues):
+    """The labels a page of issues references, by repository and id"""
+    labels = {}
+    for repository in sorted({issue['repository'] for issue in issues if issue.get('labels')}):
+        ids = {label_id for issue in issues if issue['repository'] == repository for label_id in issue['labels']}
+        repository_labels = repository_env(env, repository)
+        entry = cached_labels(repository_labels, repository)
+        if entry is None or not ids.issubset(entry.by_id):
+            # Labels added after this isolate's last check
+            mark_stale(repository_labels, repository)
+            entry = await load_labels(repository_labels, repository)
+        by_id = entry.by_id if entry is not None else {}
+        labels[repository] = {str(label_id): by_id[label_id] for label_id in sorted(ids) if label_id in by_id}
+    return labels
+
+
+def label_event_statements(env, repository, action, label, old_name=None):
+    """Statements applying a `label` webhook: a label created, edited (renamed or recolored) or deleted"""
+    statements = [repository_statement(env, repository)]
+    name = label['name']
+
+    if action == 'deleted':
+        statements.extend([
+            env.DB.prepare('''
+                DELETE FROM issue_labels
+                WHERE label_id = (SELECT id FROM repo_labels WHERE repository = ? AND name = ?)
+                    AND issue_id IN (SELECT id FROM issues WHERE repository = ?)
+            ''').bind(repository, name, repository),
+            env.DB.prepare('DELETE FROM repo_labels WHERE repository = ? AND name = ?').bind(repository, name),
+            env.DB.prepare('''
+                DELETE FROM time_to_close_histogram
+                WHERE repository = ? AND dimension = 'label' AND dimension_value = ?
+            ''').bind(repository, name),
+        ])
+    else:
+        if old_name and old_name != name:
+            # Issues keep the label's id; its histogram cells follow the name
+            statements.extend([
+                env.DB.prepare(
+                    'UPDATE repo_labels SET name = ? WHERE repository = ? AND name = ?'
+                ).bind(name, repository, old_name),
+                env.DB.prepare('''
+                    UPDATE time_to_close_histogram SET dimension_value = ?
+                    WHERE repository = ? AND dimension = 'label' AND dimension_value = ?
+                ''').bind(name, repository, old_name),
+            ])
+        statements.extend(label_upsert_statements(env, repository, [(name, label.get('color'))]))
+
+    statements.append(labels_version_statement(env, repository))
+    return statements
+
+
+async def apply_label_event(env, repository, action, label, old_name=None):
+    """Apply a `label` webhook in one batch and reread the repository's labels in the same batch"""
+    statements = label_event_statements(env, repository, action, label, old_name)
+    results = await fetch_batch(env.DB, statements + [label_check_statement(env, [repository])])
+    refresh_labels(env, results[-1], [repository])
+    return {'repository': repository, 'action': action, 'label': label['name']}
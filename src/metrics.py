@@ -2,25 +2,26 @@
 Metrics and Analytics Handler
 """
 
-from js import Response, Headers, URL
-import json
+from js import URL
+from db import fetch_all, fetch_one
+from responses import json_response, error_response
+from percentiles import get_time_to_close_percentiles
+from shards import repository_env
 
 
-async def handle_get_metrics(request, env, session, cors_headers):
+async def handle_get_metrics(request, env, session):
     """Get metrics for repository"""
     url = URL.new(request.url)
     repository = url.searchParams.get('repository')
     
     if not repository:
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
-        return Response.new(json.dumps({'error': 'repository parameter required'}), status=400, headers=headers)
+        return error_response('repository parameter required', 400)
     
     try:
+        env = repository_env(env, repository)
+        
         # Current stats
-        current_stats = await env.DB.prepare('''
+        current_stats = await fetch_one(env.DB.prepare('''
             SELECT 
                 COUNT(*) as total_issues,
                 SUM(CASE WHEN state = 'open' THEN 1 ELSE 0 END) as open_issues,
@@ -29,21 +30,22 @@ async def handle_get_metrics(request, env, session, cors_headers):
                 MIN(created_at) as oldest_issue_date,
                 MAX(updated_at) as latest_update_date
             FROM issues WHERE repository = ?
-        ''').bind(repository).first()
+        ''').bind(repository))
         
         # Label distribution
-        label_stats = await env.DB.prepare('''
+        label_stats = await fetch_all(env.DB.prepare('''
             SELECT l.name, l.color, COUNT(*) as count
-            FROM labels l
-            INNER JOIN issues i ON l.issue_id = i.id
+            FROM issue_labels il
+            INNER JOIN issues i ON il.issue_id = i.id
+            INNER JOIN repo_labels l ON l.repository = i.repository AND l.id = il.label_id
             WHERE i.repository = ?
-            GROUP BY l.name, l.color
+            GROUP BY l.id
             ORDER BY count DESC
             LIMIT 10
-        ''').bind(repository).all()
+        ''').bind(repository))
         
         # Assignee stats
-        assignee_stats = await env.DB.prepare('''
+        assignee_stats = await fetch_all(env.DB.prepare('''
             SELECT a.username, COUNT(*) as assigned_issues,
                 SUM(CASE WHEN i.state = 'open' THEN 1 ELSE 0 END) as open_assigned,
                 SUM(CASE WHEN i.state = 'closed' THEN 1 ELSE 0 END) as closed_assigned
@@ -53,19 +55,19 @@ async def handle_get_metrics(request, env, session, cors_headers):
             GROUP BY a.username
             ORDER BY assigned_issues DESC
             LIMIT 10
-        ''').bind(repository).all()
+        ''').bind(repository))
         
         # Historical metrics (last 30 days)
-        historical_metrics = await env.DB.prepare('''
+        historical_metrics = await fetch_all(env.DB.prepare('''
             SELECT metric_date, total_issues, open_issues, closed_issues, avg_time_to_close
             FROM metrics
             WHERE repository = ?
             ORDER BY metric_date DESC
             LIMIT 30
-        ''').bind(repository).all()
+        ''').bind(repository))
         
         # Time to close distribution
-        time_to_close_distribution = await env.DB.prepare('''
+        time_to_close_distribution = await fetch_all(env.DB.prepare('''
             SELECT 
                 CASE 
                     WHEN time_to_close < 24 THEN '< 1 day'
@@ -77,10 +79,13 @@ async def handle_get_metrics(request, env, session, cors_headers):
             FROM issues
             WHERE repository = ? AND time_to_close IS NOT NULL
             GROUP BY bucket
-        ''').bind(repository).all()
+        ''').bind(repository))
+        
+        # Time to close percentiles (from the incrementally maintained histograms)
+        time_to_close_percentiles = await get_time_to_close_percentiles(repository, env)
         
         # Issue velocity (issues opened/closed per day, last 7 days)
-        velocity = await env.DB.prepare('''
+        velocity = await fetch_all(env.DB.prepare('''
             SELECT 
                 DATE(created_at) as date,
                 COUNT(*) as opened
@@ -88,9 +93,9 @@ async def handle_get_metrics(request, env, session, cors_headers):
             WHERE repository = ? AND created_at >= date('now', '-7 days')
             GROUP BY DATE(created_at)
             ORDER BY date DESC
-        ''').bind(repository).all()
+        ''').bind(repository))
         
-        closed_velocity = await env.DB.prepare('''
+        closed_velocity = await fetch_all(env.DB.prepare('''
             SELECT 
                 DATE(closed_at) as date,
                 COUNT(*) as closed
@@ -98,7 +103,7 @@ async def handle_get_metrics(request, env, session, cors_headers):
             WHERE repository = ? AND closed_at >= date('now', '-7 days') AND state = 'closed'
             GROUP BY DATE(closed_at)
             ORDER BY date DESC
-        ''').bind(repository).all()
+        ''').bind(repository))
         
         # Build response
         avg_time_hours = current_stats.get('avg_time_to_close_hours')
@@ -109,27 +114,19 @@ async def handle_get_metrics(request, env, session, cors_headers):
                 **current_stats,
                 'avg_time_to_close_days': str(avg_time_days) if avg_time_days else None
             },
-            'labels': label_stats['results'],
-            'assignees': assignee_stats['results'],
-            'historical': list(reversed(historical_metrics['results'])),
-            'time_to_close_distribution': time_to_close_distribution['results'],
+            'labels': label_stats,
+            'assignees': assignee_stats,
+            'historical': list(reversed(historical_metrics)),
+            'time_to_close_distribution': time_to_close_distribution,
+            'time_to_close_percentiles': time_to_close_percentiles,
             'velocity': {
-                'opened': velocity['results'],
-                'closed': closed_velocity['results']
+                'opened': velocity,
+                'closed': closed_velocity
             }
         }
         
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
-        
-        return Response.new(json.dumps(response_data), headers=headers)
+        return json_response(response_data)
     
     except Exception as error:
         print(f'Error fetching metrics: {error}')
-        headers = Headers.new()
-        for key, value in cors_headers.items():
-            headers.set(key, value)
-        headers.set('Content-Type', 'application/json')
-        return Response.new(json.dumps({'error': str(error)}), status=500, headers=headers)
+        return error_response(str(error), 500)
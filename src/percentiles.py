@@ -0,0 +1,158 @@
+"""
+Time-to-Close Percentile Sketches
+"""
+
+import math
+import json
+from collections import Counter
+from db import fetch_all
+
+
+# Every reported percentile is within this relative error of the exact value
+RELATIVE_ACCURACY = 0.02
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+PERCENTILES = (50, 90, 99)
+
+DIMENSION_ALL = 'all'
+DIMENSION_LABEL = 'label'
+DIMENSION_ASSIGNEE = 'assignee'
+
+
+def bucket_for(hours):
+    """Map a time to close (hours) to its histogram bucket"""
+    if hours <= 0:
+        return 0
+    return int(math.ceil(math.log(hours) / LOG_GAMMA)) + 1
+
+
+def bucket_value(bucket):
+    """Representative value of a bucket, within RELATIVE_ACCURACY of any member"""
+    if bucket <= 0:
+        return 0.0
+    return 2 * GAMMA ** (bucket - 1) / (GAMMA + 1)
+
+
+def quantile(counts, q):
+    """Estimate the q-quantile (0..1) from a {bucket: count} mapping"""
+    total = sum(counts.values())
+    if total <= 0:
+        return None
+
+    rank = int(q * (total - 1))
+    seen = 0
+    for bucket in sorted(counts):
+        seen += counts[bucket]
+        if seen > rank:
+            return bucket_value(bucket)
+    return bucket_value(max(counts))
+
+
+def summarize(counts):
+    """Count and p50/p90/p99 for a {bucket: count} mapping"""
+    summary = {'count': sum(counts.values())}
+    for p in PERCENTILES:
+        value = quantile(counts, p / 100)
+        summary[f'p{p}'] = round(value, 1) if value is not None else None
+    return summary
+
+
+def contributions(time_to_close, labels, assignees):
+    """Histogram cells a single issue counts towards"""
+    if time_to_close is None:
+        return Counter()
+
+    bucket = bucket_for(time_to_close)
+    cells = Counter({(DIMENSION_ALL, '', bucket): 1})
+    for name in set(labels):
+        cells[(DIMENSION_LABEL, name, bucket)] += 1
+    for username in set(assignees):
+        cells[(DIMENSION_ASSIGNEE, username, bucket)] += 1
+    return cells
+
+
+def histogram_delta_statements(repository, previous, current, env):
+    """Statements moving an issue's counts from its previous cells to its current ones"""
+    delta = Counter(current)
+    delta.subtract(previous)
+    changes = [(cell, count) for cell, count in delta.items() if count]
+    if not changes:
+        return []
+
+    statements = [
+        env.DB.prepare('''
+            INSERT INTO time_to_close_histogram (repository, dimension, dimension_value, bucket, count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(repository, dimension, dimension_value, bucket) DO UPDATE SET
+                count = count + excluded.count
+        ''').bind(repository, dimension, value, bucket, count)
+        for (dimension, value, bucket), count in changes
+    ]
+
+    if any(count < 0 for _, count in changes):
+        statements.append(env.DB.prepare(
+            'DELETE FROM time_to_close_histogram WHERE repository = ? AND count <= 0'
+        ).bind(repository))
+
+    return statements
+
+
+async def rebuild_time_to_close_histograms(repository, env):
+    """Recompute a repository's histograms from the issues table"""
+    rows = await fetch_all(env.DB.prepare('''
+        SELECT i.time_to_close,
+            (SELECT json_group_array(l.name) FROM issue_labels il
+                INNER JOIN repo_labels l ON l.repository = i.repository AND l.id = il.label_id
+                WHERE il.issue_id = i.id) as label_names,
+            (SELECT json_group_array(username) FROM assignees WHERE issue_id = i.id) as usernames
+        FROM issues i
+        WHERE i.repository = ? AND i.time_to_close IS NOT NULL
+    ''').bind(repository))
+
+    cells = Counter()
+    for row in rows:
+        cells.update(contributions(
+            row['time_to_close'],
+            json.loads(row['label_names'] or '[]'),
+            json.loads(row['usernames'] or '[]')
+        ))
+
+    statements = [
+        env.DB.prepare('DELETE FROM time_to_close_histogram WHERE repository = ?').bind(repository)
+    ]
+    statements.extend(
+        env.DB.prepare('''
+            INSERT INTO time_to_close_histogram (repository, dimension, dimension_value, bucket, count)
+            VALUES (?, ?, ?, ?, ?)
+        ''').bind(repository, dimension, value, bucket, count)
+        for (dimension, value, bucket), count in cells.items()
+    )
+    await env.DB.batch(statements)
+
+
+async def get_time_to_close_percentiles(repository, env):
+    """p50/p90/p99 time to close overall and per label/assignee"""
+    rows = await fetch_all(env.DB.prepare('''
+        SELECT dimension, dimension_value, bucket, count
+        FROM time_to_close_histogram
+        WHERE repository = ? AND count > 0
+    ''').bind(repository))
+
+    histograms = {}
+    for row in rows:
+        key = (row['dimension'], row['dimension_value'])
+        histograms.setdefault(key, {})[row['bucket']] = row['count']
+
+    percentiles = {
+        'overall': summarize(histograms.get((DIMENSION_ALL, ''), {})),
+        'labels': {},
+        'assignees': {}
+    }
+    for (dimension, value), counts in histograms.items():
+        if dimension == DIMENSION_LABEL:
+            percentiles['labels'][value] = summarize(counts)
+        elif dimension == DIMENSION_ASSIGNEE:
+            percentiles['assignees'][value] = summarize(counts)
+
+    return percentiles
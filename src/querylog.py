@@ -0,0 +1,202 @@
+"""
+Query Log
+"""
+
+from array import array
+import json
+import time
+from db import d1_binding, fetch_all
+from stats import REGISTRY, escape_label_value, format_value
+from tracing import fingerprint_sql, row_count
+
+
+MAX_FINGERPRINTS = 256
+OTHER = 'other'
+
+
+def slow_query_threshold(env):
+    """SLOW_QUERY_MS as a float, or None if query logging is off"""
+    value = getattr(env, 'SLOW_QUERY_MS', None)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def explain_enabled(env):
+    """True if slow statements should be logged with EXPLAIN QUERY PLAN"""
+    return str(getattr(env, 'EXPLAIN_SLOW_QUERIES', '') or '').lower() in ('1', 'true', 'on')
+
+
+def bindings_shape(values):
+    """Types of the bound values, runs collapsed: 'str, int x3, null'"""
+    shape = []
+    for value in values:
+        name = 'null' if value is None else type(value).__name__
+        if shape and shape[-1][0] == name:
+            shape[-1][1] += 1
+        else:
+            shape.append([name, 1])
+    return ', '.join(name if count == 1 else f'{name} x{count}' for name, count in shape)
+
+
+class QueryRegistry:
+    """Calls, total and max milliseconds per fingerprint, in MAX_FINGERPRINTS fixed slots"""
+
+    def __init__(self, capacity=MAX_FINGERPRINTS):
+        self.capacity = capacity
+        # The last slot collects fingerprints registered after the table filled up
+        self.slots = {OTHER: capacity}
+        self.data = array('d', bytes(8 * 3 * (capacity + 1)))
+        REGISTRY.append(self)
+
+    def register(self, fingerprint, normalized):
+        """Slot of a fingerprint; a new one is logged with its SQL"""
+        slot = self.slots.get(fingerprint)
+        if slot is None:
+            if len(self.slots) > self.capacity:
+                return self.capacity
+            slot = self.slots[fingerprint] = len(self.slots) - 1
+            print(json.dumps({'event': 'query_registered', 'fingerprint': fingerprint, 'sql': normalized}))
+        return slot
+
+    def record(self, slot, duration_ms):
+        base = slot * 3
+        self.data[base] += 1
+        self.data[base + 1] += duration_ms
+        if duration_ms > self.data[base + 2]:
+            self.data[base + 2] = duration_ms
+
+    def render(self):
+        """The registry as three Prometheus metrics labelled by fingerprint"""
+        metrics = (
+            ('worker_d1_query_calls_total', 'counter', 'D1 statement executions, by SQL fingerprint', 0),
+            ('worker_d1_query_duration_ms_total', 'counter', 'D1 statement time, by SQL fingerprint', 1),
+            ('worker_d1_query_duration_ms_max', 'gauge', 'Slowest D1 statement execution, by SQL fingerprint', 2),
+        )
+        lines = []
+        for name, kind, help_text, offset in metrics:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for fingerprint, slot in self.slots.items():
+                if self.data[slot * 3]:
+                    value = format_value(self.data[slot * 3 + offset])
+                    lines.append(f'{name}{{fingerprint="{escape_label_value(fingerprint)}"}} {value}')
+        return lines
+
+
+QUERIES = QueryRegistry()
+
+
+class QueryLog:
+    """Per-request recorder: registers statements and logs the slow ones"""
+
+    def __init__(self, database, threshold_ms, explain=False, route=None):
+        self.database = database
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.route = route
+
+    async def record(self, start, method, queries, values=(), rows=None):
+        duration_ms = (time.perf_counter() - start) * 1000
+        fingerprints = []
+        for query in queries:
+            fingerprint, normalized = fingerprint_sql(query)
+            # A batch's time is shared evenly among its statements
+            QUERIES.record(QUERIES.register(fingerprint, normalized), duration_ms / len(queries))
+            fingerprints.append(fingerprint)
+
+        if duration_ms < self.threshold_ms:
+            return
+        entry = {
+            'event': 'slow_query',
+            'route': self.route,
+            'method': method,
+            'fingerprint': fingerprints[0] if len(fingerprints) == 1 else fingerprints,
+            'sql': fingerprint_sql(queries[0])[1] if len(queries) == 1 else None,
+            'duration_ms': round(duration_ms, 2),
+            'threshold_ms': self.threshold_ms,
+            'bindings': bindings_shape(values),
+            'rows': rows
+        }
+        if self.explain and len(queries) == 1:
+            entry['plan'] = await self.query_plan(queries[0], values)
+        print(json.dumps(entry))
+
+    async def query_plan(self, query, values):
+        """EXPLAIN QUERY PLAN lines for a statement, or the error that prevented it"""
+        try:
+            statement = self.database.prepare('EXPLAIN QUERY PLAN ' + query)
+            rows = await fetch_all(statement.bind(*values) if values else statement)
+        except Exception as error:
+            return [f'unavailable: {error}']
+        return [row['detail'] for row in rows]
+
+
+class LoggedStatement:
+    """A D1 prepared statement whose executions are timed into the query log"""
+
+    def __init__(self, statement, query, log, values=()):
+        self.statement = statement
+        self.query = query
+        self.log = log
+        self.values = values
+
+    def bind(self, *values):
+        return LoggedStatement(self.statement.bind(*values), self.query, self.log, values)
+
+    async def _call(self, method, *args):
+        start = time.perf_counter()
+        result = await getattr(self.statement, method)(*args)
+        await self.log.record(start, method, [self.query], self.values, row_count(method, result))
+        return result
+
+    async def run(self):
+        return await self._call('run')
+
+    async def all(self):
+        return await self._call('all')
+
+    async def first(self, *args):
+        return await self._call('first', *args)
+
+    async def raw(self):
+        return await self._call('raw')
+
+
+class LoggedDatabase:
+    """A D1 binding that hands out LoggedStatements"""
+
+    def __init__(self, database, log):
+        self.database = database
+        self.log = log
+
+    def prepare(self, query):
+        return LoggedStatement(self.database.prepare(query), query, self.log)
+
+    async def batch(self, statements):
+        start = time.perf_counter()
+        result = await self.database.batch([statement.statement for statement in statements])
+        await self.log.record(start, 'batch', [statement.query for statement in statements])
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+
+class LoggedEnv:
+    """The worker env with DB replaced by its query-logged wrapper"""
+
+    def __init__(self, env, log):
+        self._env = env
+        self.DB = LoggedDatabase(env.DB, log)
+
+    def d1_binding(self, name):
+        """Another D1 binding (a shard), wrapped like DB"""
+        if name == 'DB':
+            return self.DB
+        return LoggedDatabase(d1_binding(self._env, name), self.DB.log)
+
+    def __getattr__(self, name):
+        return getattr(self._env, name)
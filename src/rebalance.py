@@ -0,0 +1,260 @@
+"""
+Shard Placement and Rebalancing
+"""
+
+from js import URL
+import json
+from api import hydrate_issue, ISSUE_RELATION_COLUMNS
+from db import fetch_all, fetch_one, multi_row_statements
+from github import load_sync_states, relations_hash, repository_metrics_statement, write_issue_records
+from metadata import labels_version_statement, repository_statement
+from percentiles import rebuild_time_to_close_histograms
+from responses import json_response, error_response
+from shards import ShardEnv, fan_out, shard_envs, shard_for, shard_names
+import writer
+
+
+# Issues read from the source and written to the target per D1 batch
+MOVE_BATCH_SIZE = 100
+
+REPO_LABEL_COLUMNS = ['repository', 'id', 'name', 'color']
+METRICS_COLUMNS = [
+    'repository', 'metric_date', 'total_issues', 'open_issues', 'closed_issues', 'avg_time_to_close',
+    'issues_opened_today', 'issues_closed_today'
+]
+SYNC_STATUS_COLUMNS = [
+    'repository', 'last_sync', 'status', 'error_message', 'cursor_updated_at',
+    'duration_ms', 'issues_per_second', 'written', 'skipped'
+]
+
+
+def is_d1_binding(env, name):
+    """True if env has a D1 binding (not a var or secret) called name"""
+    return callable(getattr(getattr(env, name, None), 'batch', None))
+
+
+def needs_copy(record, target_state):
+    """True if the target has no copy of an issue, or an older or different one"""
+    if target_state is None:
+        return True
+    updated_at, target_hash = target_state
+    if record['updated_at'] != updated_at:
+        return record['updated_at'] > updated_at
+    return relations_hash(record) != target_hash
+
+
+async def copy_labels(repository, source, target):
+    """Copy a repository's row and labels, keeping their ids where the target has them free"""
+    labels = await fetch_all(source.DB.prepare(
+        'SELECT ' + ', '.join(REPO_LABEL_COLUMNS) + ' FROM repo_labels WHERE repository = ?'
+    ).bind(repository))
+
+    statements = [repository_statement(target, repository)]
+    # A label the target numbered differently since an earlier copy keeps the target's id
+    statements.extend(multi_row_statements(
+        target,
+        'INSERT INTO repo_labels (' + ', '.join(REPO_LABEL_COLUMNS) + ')',
+        [[row[column] for column in REPO_LABEL_COLUMNS] for row in labels],
+        ' ON CONFLICT DO NOTHING'
+    ))
+    statements.append(labels_version_statement(target, repository))
+    await target.DB.batch(statements)
+
+
+async def copy_issues(repository, source, target):
+    """Copy a repository's issues from source to target in keyset batches; returns (copied, current)"""
+    target_states = await load_sync_states(repository, target)
+    copied = 0
+    current = 0
+    last_id = -1
+    while True:
+        rows = await fetch_all(source.DB.prepare(
+            'SELECT i.*,' + ISSUE_RELATION_COLUMNS + ' FROM issues i'
+            ' WHERE i.repository = ? AND i.id > ? ORDER BY i.id LIMIT ?'
+        ).bind(repository, last_id, MOVE_BATCH_SIZE))
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+
+        records = [hydrate_issue(row) for row in rows]
+        pending = [record for record in records if needs_copy(record, target_states.get(record['number']))]
+        current += len(records) - len(pending)
+        if pending:
+            await write_issue_records(pending, target)
+            copied += len(pending)
+
+        if len(rows) < MOVE_BATCH_SIZE:
+            break
+    return copied, current
+
+
+async def copy_repository_rows(repository, source, target):
+    """Copy metrics history, sync status and tracking the target does not have yet"""
+    metrics = await fetch_all(source.DB.prepare(
+        'SELECT ' + ', '.join(METRICS_COLUMNS) + ' FROM metrics WHERE repository = ?'
+    ).bind(repository))
+    sync_status = await fetch_one(source.DB.prepare(
+        'SELECT ' + ', '.join(SYNC_STATUS_COLUMNS) + ' FROM sync_status WHERE repository = ?'
+    ).bind(repository))
+    tracked = await fetch_one(source.DB.prepare(
+        'SELECT repository, added_at FROM tracked_repositories WHERE repository = ?'
+    ).bind(repository))
+
+    statements = multi_row_statements(
+        target,
+        'INSERT INTO metrics (' + ', '.join(METRICS_COLUMNS) + ')',
+        [[row[column] for column in METRICS_COLUMNS] for row in metrics],
+        ' ON CONFLICT(repository, metric_date) DO NOTHING'
+    )
+    if sync_status:
+        statements.append(target.DB.prepare(
+            'INSERT INTO sync_status (' + ', '.join(SYNC_STATUS_COLUMNS) + ') VALUES ('
+            + ', '.join(['?'] * len(SYNC_STATUS_COLUMNS)) + ') ON CONFLICT(repository) DO NOTHING'
+        ).bind(*[sync_status[column] for column in SYNC_STATUS_COLUMNS]))
+    if tracked:
+        statements.append(target.DB.prepare(
+            'INSERT INTO tracked_repositories (repository, added_at) VALUES (?, ?) ON CONFLICT DO NOTHING'
+        ).bind(tracked['repository'], tracked['added_at']))
+    # Today's rollup is recomputed from the issues now on the target
+    statements.append(repository_metrics_statement(repository, target))
+    await target.DB.batch(statements)
+
+
+async def issue_count(repository, shard_env):
+    row = await fetch_one(shard_env.DB.prepare(
+        'SELECT COUNT(*) as total FROM issues WHERE repository = ?'
+    ).bind(repository))
+    return row['total']
+
+
+async def delete_repository(repository, shard_env):
+    """Delete every row of a repository from one shard, in one batch"""
+    statements = [
+        shard_env.DB.prepare(
+            f'DELETE FROM {table} WHERE issue_id IN (SELECT id FROM issues WHERE repository = ?)'
+        ).bind(repository)
+        for table in ('issue_labels', 'assignees')
+    ]
+    statements.extend(
+        shard_env.DB.prepare(f'DELETE FROM {table} WHERE repository = ?').bind(repository)
+        for table in (
+            'issues', 'metrics', 'time_to_close_histogram', 'sync_status', 'tracked_repositories',
+            'repo_labels', 'repositories'
+        )
+    )
+    await shard_env.DB.batch(statements)
+
+
+async def move_repository(repository, source_shard, target_shard, env, delete_source=False):
+    """Copy a repository's rows from one shard to another, then optionally delete them from the source"""
+    source = ShardEnv(env, source_shard)
+    target = ShardEnv(env, target_shard)
+
+    await copy_labels(repository, source, target)
+    copied, current = await copy_issues(repository, source, target)
+    await copy_repository_rows(repository, source, target)
+    await rebuild_time_to_close_histograms(repository, target)
+
+    deleted = False
+    if delete_source:
+        source_count = await issue_count(repository, source)
+        target_count = await issue_count(repository, target)
+        if target_count < source_count:
+            raise ValueError(f'{target_shard} holds {target_count} of {source_count} issues; not deleting')
+        await delete_repository(repository, source)
+        deleted = True
+
+    result = {
+        'repository': repository,
+        'source': source_shard,
+        'target': target_shard,
+        'copied': copied,
+        'current': current,
+        'deleted_source': deleted,
+    }
+    print(json.dumps({'event': 'shard_move', **result}))
+    return result
+
+
+async def apply_move(env, operation):
+    """The `move` write operation: copy a repository between shards on its writer"""
+    return await move_repository(
+        operation['repository'], operation['source'], operation['target'], env, operation['delete_source']
+    )
+
+
+async def handle_get_placement(request, env):
+    """Issue counts per repository and shard, with where each repository is (or would be) routed"""
+    url = URL.new(request.url)
+    proposed = [name.strip() for name in (url.searchParams.get('shards') or '').split(',') if name.strip()]
+
+    try:
+        async def read(shard_env):
+            return await fetch_all(shard_env.DB.prepare(
+                'SELECT repository, COUNT(*) as issues FROM issues GROUP BY repository'
+            ))
+
+        repositories = []
+        for shard_env, rows in zip(shard_envs(env), await fan_out(env, read)):
+            for row in rows:
+                entry = {
+                    'repository': row['repository'],
+                    'shard': shard_env.shard,
+                    'issues': row['issues'],
+                    'routed_to': shard_for(env, row['repository']),
+                }
+                if proposed:
+                    entry['proposed'] = shard_for(env, row['repository'], proposed)
+                repositories.append(entry)
+        repositories.sort(key=lambda entry: (entry['repository'], entry['shard']))
+
+        return json_response({
+            'shards': shard_names(env),
+            'repositories': repositories,
+            'misplaced': [entry for entry in repositories if entry['shard'] != entry['routed_to']],
+            'moves': [entry for entry in repositories if proposed and entry['shard'] != entry['proposed']],
+        })
+
+    except Exception as error:
+        print(f'Error reading shard placement: {error}')
+        return error_response(str(error), 500)
+
+
+async def handle_move_repository(request, env):
+    """Copy a repository to another shard; with delete_source, also remove it from the source"""
+    try:
+        data = json.loads(await request.text())
+    except ValueError:
+        return error_response('body must be JSON', 400)
+
+    repository = data.get('repository')
+    target = data.get('target')
+    if not repository or not target:
+        return error_response('repository and target are required', 400)
+
+    source = data.get('source') or shard_for(env, repository)
+    delete_source = bool(data.get('delete_source'))
+    for name in (source, target):
+        if not is_d1_binding(env, name):
+            return error_response(f'{name} is not a D1 binding', 400)
+    if source == target:
+        return error_response(f'source and target are both {target}; pass the shard {repository} is moving from', 400)
+    if delete_source and shard_for(env, repository) != target:
+        return error_response(
+            f'{repository} is still routed to {shard_for(env, repository)}: '
+            f'pin it to {target} in D1_SHARD_MAP and deploy before deleting it from {source}', 409
+        )
+
+    try:
+        # Runs on the repository's writer, so no webhook or sync writes to either shard meanwhile
+        return json_response(await writer.submit(env, {
+            'kind': 'move',
+            'repository': repository,
+            'source': source,
+            'target': target,
+            'delete_source': delete_source,
+        }))
+
+    except Exception as error:
+        print(f'Error moving {repository} from {source} to {target}: {error}')
+        return error_response(str(error), 500)
@@ -0,0 +1,48 @@
+"""
+Response Builders
+"""
+
+from js import Response, Headers, Object, JSON
+from pyodide.ffi import JsProxy, to_js
+import json
+
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, PATCH, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+}
+
+_CORS_INIT = to_js(CORS_HEADERS, dict_converter=Object.fromEntries)
+_JSON_INIT = to_js({**CORS_HEADERS, 'Content-Type': 'application/json'}, dict_converter=Object.fromEntries)
+
+
+def build_headers(extra=None, json_body=False):
+    """Headers with CORS (and JSON content-type) preset, plus any extra headers"""
+    headers = Headers.new(_JSON_INIT if json_body else _CORS_INIT)
+    if extra:
+        for key, value in extra.items():
+            headers.set(key, value)
+    return headers
+
+
+def dump_json(data):
+    """Serialize once: JS values (e.g. D1 results never converted to Python) on the JS side, the rest compactly"""
+    if isinstance(data, JsProxy):
+        return JSON.stringify(data)
+    return json.dumps(data, separators=(',', ':'))
+
+
+def json_response(data, status=200, headers=None):
+    """JSON response with CORS headers"""
+    return Response.new(dump_json(data), status=status, headers=build_headers(headers, json_body=True))
+
+
+def error_response(message, status=500):
+    """JSON {'error': message} response with CORS headers"""
+    return json_response({'error': message}, status)
+
+
+def text_response(body, status=200, headers=None):
+    """Plain response with CORS headers"""
+    return Response.new(body, status=status, headers=build_headers(headers))
@@ -0,0 +1,123 @@
+"""
+Request Router
+"""
+
+import re
+
+
+PLACEHOLDER = re.compile(r'\{(\w+)(?::(\w+))?\}')
+
+PARAM_TYPES = {
+    'str': ('[^/]+', str),
+    'int': ('[0-9]+', int),
+}
+
+
+def compile_pattern(pattern):
+    """Regex and per-parameter converters for a route pattern"""
+    regex = ''
+    converters = {}
+    position = 0
+    for placeholder in PLACEHOLDER.finditer(pattern):
+        name, param_type = placeholder.group(1), placeholder.group(2) or 'str'
+        expression, converters[name] = PARAM_TYPES[param_type]
+        regex += re.escape(pattern[position:placeholder.start()]) + f'(?P<{name}>{expression})'
+        position = placeholder.end()
+    regex += re.escape(pattern[position:])
+    return re.compile(regex + '$'), converters
+
+
+class Budget:
+    """Most D1 round trips (statements run alone, or batches) and GitHub API calls one request may make"""
+
+    def __init__(self, d1=None, github=None):
+        self.d1 = d1
+        self.github = github
+
+    def overruns(self, d1_calls, github_calls):
+        """A description of each limit the counts exceed (None means unlimited)"""
+        overruns = []
+        if self.d1 is not None and d1_calls > self.d1:
+            overruns.append(f'{d1_calls} D1 calls (budget {self.d1})')
+        if self.github is not None and github_calls > self.github:
+            overruns.append(f'{github_calls} GitHub calls (budget {self.github})')
+        return overruns
+
+
+class Route:
+    """One method + pattern mapped to a handler, wrapped in its middleware, with an optional query budget"""
+
+    def __init__(self, method, pattern, handler, middleware=(), budget=None):
+        self.method = method
+        self.pattern = pattern
+        self.handler = handler
+        self.middleware = tuple(middleware)
+        self.budget = budget
+        self.regex, self.converters = compile_pattern(pattern)
+        self.is_static = not self.converters
+
+    async def __call__(self, request, env, context):
+        """Run the middleware chain outermost first, then the handler"""
+        async def call(index, env):
+            if index == len(self.middleware):
+                return await self.handler(request, env, context)
+
+            # call_next(env) lets a middleware hand a wrapped env further down
+            def call_next(next_env=None):
+                return call(index + 1, next_env or env)
+
+            return await self.middleware[index](request, env, context, call_next)
+
+        return await call(0, env)
+
+
+class Router:
+    """Resolves a method and path to a route and its parameters"""
+
+    def __init__(self, routes):
+        self.routes = list(routes)
+        # Exact paths resolve with one dict lookup; patterned ones are grouped
+        # by their first path segment so only a few regexes are ever tried
+        self.static = {}
+        self.dynamic = {}
+        wildcard = []
+        for route in self.routes:
+            if route.is_static:
+                self.static.setdefault(route.pattern, {})[route.method] = route
+                continue
+            segment = self._first_segment(route.pattern)
+            if PLACEHOLDER.search(segment):
+                wildcard.append(route)
+            else:
+                self.dynamic.setdefault(segment, []).append(route)
+
+        # Routes whose first segment is itself a parameter can match anything
+        self.dynamic = {segment: tuple(routes + wildcard) for segment, routes in self.dynamic.items()}
+        self.wildcard = tuple(wildcard)
+        self.static = {path: (by_method, tuple(by_method)) for path, by_method in self.static.items()}
+
+    @staticmethod
+    def _first_segment(path):
+        return path.split('/', 2)[1]
+
+    def match(self, method, path):
+        """(route, params, allowed_methods): route is None when nothing matches"""
+        static = self.static.get(path)
+        if static:
+            by_method, allowed = static
+            return by_method.get(method), {}, allowed
+
+        allowed = []
+        for route in self.dynamic.get(self._first_segment(path), self.wildcard):
+            found = route.regex.match(path)
+            if not found:
+                continue
+            if route.method != method:
+                allowed.append(route.method)
+                continue
+            params = found.groupdict()
+            for name, convert in route.converters.items():
+                if convert is not str:
+                    params[name] = convert(params[name])
+            return route, params, (route.method,)
+        return None, {}, allowed
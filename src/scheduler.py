@@ -0,0 +1,198 @@
+"""
+Scheduled Repository Sync
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+from db import fetch_all
+from github import github_request
+from writer import write_issues
+from shards import fan_out, shard_for
+import stats
+
+
+PAGE_SIZE = 100
+
+# Defaults for SYNC_TIME_BUDGET_SECONDS, SYNC_GITHUB_BUDGET and SYNC_CONCURRENCY
+DEFAULT_TIME_BUDGET_SECONDS = 20
+DEFAULT_GITHUB_BUDGET = 100
+DEFAULT_CONCURRENCY = 4
+
+# Repositories started per run, stalest first
+MAX_REPOSITORIES_PER_RUN = 25
+
+# A run stops early rather than spend the last of the token's rate limit
+RATE_LIMIT_RESERVE = 500
+
+
+def number_var(env, name, default):
+    """A numeric var, or default if it is unset or malformed"""
+    value = getattr(env, name, None)
+    if value in (None, ''):
+        return default
+    try:
+        return type(default)(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def rate_limit_low():
+    """True if the latest GitHub response left fewer than RATE_LIMIT_RESERVE calls before its reset"""
+    remaining = stats.GITHUB_RATE_LIMIT_REMAINING.current
+    reset = stats.GITHUB_RATE_LIMIT_RESET.current
+    return remaining is not None and remaining < RATE_LIMIT_RESERVE and (reset is None or reset > time.time())
+
+
+async def stalest_repositories(env, limit):
+    """(row, shard env) of tracked repositories with their cursors, never-synced first, then by oldest sync"""
+    async def read(shard_env):
+        rows = await fetch_all(shard_env.DB.prepare('''
+            SELECT t.repository, s.last_sync, s.cursor_updated_at
+            FROM tracked_repositories t
+            LEFT JOIN sync_status s ON s.repository = t.repository
+            ORDER BY s.last_sync IS NOT NULL, s.last_sync
+            LIMIT ?
+        ''').bind(limit))
+        # A repository part-way through a move between shards syncs where it is routed
+        return [(row, shard_env) for row in rows if shard_for(env, row['repository']) == shard_env.shard]
+
+    found = [pair for pairs in await fan_out(env, read) for pair in pairs]
+    found.sort(key=lambda pair: (pair[0]['last_sync'] is not None, pair[0]['last_sync'] or ''))
+    return found[:limit]
+
+
+class RepositorySync:
+    """Incremental sync of one repository, advanced a page at a time"""
+
+    def __init__(self, repository, cursor, access_token, env):
+        self.repository = repository
+        self.cursor = cursor
+        self.access_token = access_token
+        self.env = env
+        self.since = cursor
+        self.page = 1
+        self.pages = 0
+        self.written = 0
+        self.skipped = 0
+        self.complete = False
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.complete or self.error is not None
+
+    async def step(self):
+        """Fetch and write the next page of issues updated since the cursor"""
+        if self.started is None:
+            self.started = time.perf_counter()
+        try:
+            query = f'state=all&sort=updated&direction=asc&per_page={PAGE_SIZE}&page={self.page}'
+            if self.since:
+                query += '&since=' + quote(self.since)
+            data = await github_request(f'/repos/{self.repository}/issues?{query}', self.access_token)
+            self.pages += 1
+
+            issues = [item for item in data if 'pull_request' not in item]
+            if issues:
+                changed = await write_issues(self.env, self.repository, issues)
+                self.written += changed
+                self.skipped += len(issues) - changed
+
+            if data:
+                self.cursor = max(self.cursor or '', data[-1]['updated_at'])
+            self.page += 1
+            self.complete = len(data) < PAGE_SIZE
+        except Exception as error:
+            self.error = error
+        self.finished = time.perf_counter()
+
+    @property
+    def status(self):
+        return 'failed' if self.error else ('completed' if self.complete else 'partial')
+
+    def status_statement(self):
+        """Statement recording the outcome, cursor, duration and throughput in sync_status"""
+        duration = self.finished - self.started
+        issues = self.written + self.skipped
+        return self.env.DB.prepare('''
+            INSERT INTO sync_status (repository, last_sync, status, error_message, cursor_updated_at,
+                duration_ms, issues_per_second, written, skipped)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(repository) DO UPDATE SET
+                last_sync = excluded.last_sync,
+                status = excluded.status,
+                error_message = excluded.error_message,
+                cursor_updated_at = excluded.cursor_updated_at,
+                duration_ms = excluded.duration_ms,
+                issues_per_second = excluded.issues_per_second,
+                written = excluded.written,
+                skipped = excluded.skipped
+        ''').bind(
+            self.repository, datetime.utcnow().isoformat(), self.status,
+            str(self.error) if self.error else None, self.cursor,
+            round(duration * 1000), round(issues / duration, 1) if duration > 0 else None,
+            self.written, self.skipped
+        )
+
+    def report(self):
+        """Count the sync in /internal/stats and log it as one JSON line"""
+        stats.record_sync(self.written, self.started, succeeded=self.error is None, skipped=self.skipped)
+        print(json.dumps({
+            'event': 'scheduled_sync',
+            'repository': self.repository,
+            'status': self.status,
+            'pages': self.pages,
+            'written': self.written,
+            'skipped': self.skipped,
+            'duration_ms': round((self.finished - self.started) * 1000),
+            'error': str(self.error) if self.error else None,
+        }))
+
+
+async def run_scheduled_sync(env):
+    """Advance the stalest tracked repositories within this run's time and GitHub call budgets"""
+    access_token = getattr(env, 'GITHUB_SYNC_TOKEN', None)
+    if not access_token:
+        print('Error: scheduled sync skipped: GITHUB_SYNC_TOKEN is not set')
+        return []
+
+    deadline = time.perf_counter() + number_var(env, 'SYNC_TIME_BUDGET_SECONDS', DEFAULT_TIME_BUDGET_SECONDS)
+    calls_left = number_var(env, 'SYNC_GITHUB_BUDGET', DEFAULT_GITHUB_BUDGET)
+    semaphore = asyncio.Semaphore(max(1, number_var(env, 'SYNC_CONCURRENCY', DEFAULT_CONCURRENCY)))
+
+    found = await stalest_repositories(env, min(MAX_REPOSITORIES_PER_RUN, calls_left))
+    syncs = [
+        RepositorySync(row['repository'], row['cursor_updated_at'], access_token, shard_env)
+        for row, shard_env in found
+    ]
+
+    async def step(sync):
+        async with semaphore:
+            await sync.step()
+
+    # One page per unfinished repository per round, stalest first when the budget runs short
+    active = list(syncs)
+    while active and calls_left > 0 and time.perf_counter() < deadline and not rate_limit_low():
+        round_syncs = active[:calls_left]
+        await asyncio.gather(*(step(sync) for sync in round_syncs))
+        calls_left -= len(round_syncs)
+        active = [sync for sync in active if not sync.done]
+
+    # One status batch per shard
+    started = [sync for sync in syncs if sync.started is not None]
+    by_shard = {}
+    for sync in started:
+        by_shard.setdefault(sync.env.shard, []).append(sync)
+    await asyncio.gather(*(
+        shard_syncs[0].env.DB.batch([sync.status_statement() for sync in shard_syncs])
+        for shard_syncs in by_shard.values()
+    ))
+    for sync in started:
+        sync.report()
+    return started
@@ -0,0 +1,135 @@
+"""
+D1 Sharding
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+from db import d1_binding, to_python
+import stats
+
+
+# Points per shard on the hash ring; more points spread repositories more evenly
+RING_POINTS_PER_SHARD = 64
+
+# Parsed D1_SHARD_MAP values and built rings, per isolate
+_shard_maps = {}
+_rings = {}
+
+
+def hashed_shards(env):
+    """D1 binding names repositories are hashed across (D1_SHARDS), in order"""
+    value = getattr(env, 'D1_SHARDS', None) or 'DB'
+    return tuple(name.strip() for name in str(value).split(',') if name.strip()) or ('DB',)
+
+
+def shard_map(env):
+    """Repositories pinned to a binding by D1_SHARD_MAP (a JSON string or a TOML table var), lowercased"""
+    value = to_python(getattr(env, 'D1_SHARD_MAP', None))
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return {repository.lower(): shard for repository, shard in value.items()}
+
+    pinned = _shard_maps.get(value)
+    if pinned is None:
+        try:
+            pinned = {repository.lower(): shard for repository, shard in json.loads(value).items()}
+        except (ValueError, AttributeError) as error:
+            raise ValueError(f'D1_SHARD_MAP is not a JSON object: {error}')
+        _shard_maps[value] = pinned
+    return pinned
+
+
+def shard_names(env):
+    """Every binding holding repositories: D1_SHARDS, then any other binding D1_SHARD_MAP pins to"""
+    names = list(hashed_shards(env))
+    for shard in shard_map(env).values():
+        if shard not in names:
+            names.append(shard)
+    return names
+
+
+def _ring_point(key):
+    return int.from_bytes(hashlib.sha1(key.encode('utf-8')).digest()[:8], 'big')
+
+
+def hash_ring(shards):
+    """(sorted ring points, the shard owning each point) for a tuple of binding names"""
+    ring = _rings.get(shards)
+    if ring is None:
+        points = sorted(
+            (_ring_point(f'{shard}#{index}'), shard)
+            for shard in shards
+            for index in range(RING_POINTS_PER_SHARD)
+        )
+        ring = ([point for point, _ in points], [shard for _, shard in points])
+        _rings[shards] = ring
+    return ring
+
+
+def shard_for(env, repository, shards=None):
+    """The binding holding a repository: its D1_SHARD_MAP pin, else its place on the ring of shards"""
+    key = repository.lower()
+    pinned = shard_map(env).get(key)
+    if pinned:
+        return pinned
+
+    shards = tuple(shards) if shards else hashed_shards(env)
+    if len(shards) == 1:
+        return shards[0]
+    points, owners = hash_ring(shards)
+    return owners[bisect.bisect(points, _ring_point(key)) % len(points)]
+
+
+class ShardEnv:
+    """The worker env with DB pointed at one shard's D1 binding"""
+
+    def __init__(self, env, shard):
+        if isinstance(env, ShardEnv):
+            env = env._env
+        self._env = env
+        self.shard = shard
+        self.DB = d1_binding(env, shard)
+
+    def d1_binding(self, name):
+        return d1_binding(self._env, name)
+
+    def __getattr__(self, name):
+        return getattr(self._env, name)
+
+
+def repository_env(env, repository):
+    """The env to read and write one repository's rows through"""
+    shard = shard_for(env, repository)
+    if shard == 'DB' and not isinstance(env, ShardEnv):
+        return env
+    return ShardEnv(env, shard)
+
+
+def shard_envs(env):
+    """One ShardEnv per shard, in shard_names order"""
+    return [ShardEnv(env, shard) for shard in shard_names(env)]
+
+
+async def fan_out(env, read):
+    """Run read(shard_env) on every shard concurrently; results in shard_names order"""
+    envs = shard_envs(env)
+    counts = stats.current_counts.get()
+    if not counts:
+        return await asyncio.gather(*(read(shard_env) for shard_env in envs))
+
+    async def counted(shard_env, shard_counts):
+        # Each read runs in its own task, so this counts its shard's calls only
+        stats.current_shard_counts.set(shard_counts)
+        return await read(shard_env)
+
+    per_shard = [stats.RequestCounts() for _ in envs]
+    results = await asyncio.gather(*(counted(shard_env, shard_counts) for shard_env, shard_counts in zip(envs, per_shard)))
+
+    # The shards make their calls at the same time, so a request waits for
+    # the round trips of the shard that made the most, not all of them
+    calls = [shard_counts.d1_calls for shard_counts in per_shard]
+    counts.d1_calls -= sum(calls) - max(calls)
+    return results
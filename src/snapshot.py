@@ -0,0 +1,232 @@
+"""
+Snapshot Import Handler
+"""
+
+from js import URL
+import codecs
+import csv
+import json
+from datetime import datetime
+from db import fetch_batch, D1_MAX_BOUND_PARAMETERS
+from github import calculate_time_to_close, relations_hash, update_repository_metrics, write_issue_records
+from metadata import load_labels
+from percentiles import rebuild_time_to_close_histograms
+from responses import json_response, error_response
+from shards import repository_env
+import writer
+
+
+# Issues per import chunk: one write operation, and one D1 batch (one round
+# trip, one transaction) for the issues it writes
+IMPORT_BATCH_SIZE = 100
+
+
+def _optional(value):
+    """Empty CSV cells and missing keys both mean NULL"""
+    return value if value not in ('', None) else None
+
+
+def normalize_issue(row, repository, label_colors):
+    """Accept export rows (NDJSON or CSV) and raw GitHub issue payloads alike"""
+    labels = row.get('labels') or []
+    if isinstance(labels, str):
+        labels = [{'name': name} for name in labels.split(';') if name]
+    labels = [
+        {'name': label['name'], 'color': label.get('color') or label_colors.get(label['name'])}
+        for label in labels
+    ]
+
+    assignees = row.get('assignees') or []
+    if isinstance(assignees, str):
+        assignees = [username for username in assignees.split(';') if username]
+    assignees = [a['login'] if isinstance(a, dict) else a for a in assignees]
+
+    assignee = row.get('assignee')
+    if isinstance(assignee, dict):
+        assignee = assignee['login']
+    milestone = row.get('milestone')
+    if isinstance(milestone, dict):
+        milestone = milestone['title']
+
+    issue = {
+        'id': int(row['id']),
+        'number': int(row['number']),
+        'title': row['title'],
+        'body': row.get('body') or '',
+        'state': row['state'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+        'closed_at': _optional(row.get('closed_at')),
+        'html_url': row['html_url'],
+        'repository': repository,
+        'assignee': _optional(assignee),
+        'milestone': _optional(milestone),
+        'time_to_close': None,
+        'labels': labels,
+        'assignees': assignees,
+    }
+    if issue['state'] == 'closed' and issue['closed_at']:
+        issue['time_to_close'] = calculate_time_to_close(issue['created_at'], issue['closed_at'])
+    return issue
+
+
+async def read_lines(request):
+    """Yield the lines of a request body as its chunks arrive"""
+    if request.body is None:
+        return
+    reader = request.body.getReader()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffered = ''
+    while True:
+        chunk = await reader.read()
+        if chunk.done:
+            break
+        buffered += decoder.decode(chunk.value.to_bytes())
+        *lines, buffered = buffered.split('\n')
+        for line in lines:
+            yield line + '\n'
+    buffered += decoder.decode(b'', final=True)
+    if buffered:
+        yield buffered
+
+
+async def read_dump(request, export_format):
+    """Yield the raw rows of an NDJSON or CSV dump body, IMPORT_BATCH_SIZE at a time"""
+    rows = []
+    header = None
+    record = []
+    quotes = 0
+    async for line in read_lines(request):
+        if export_format == 'csv':
+            # A quoted field may span lines: a record ends where its quotes balance
+            record.append(line)
+            quotes += line.count('"')
+            if quotes % 2:
+                continue
+            values = next(csv.reader([''.join(record)]), [])
+            record = []
+            quotes = 0
+            if header is None:
+                header = values
+            elif values:
+                rows.append(dict(zip(header, values)))
+        elif line.strip():
+            rows.append(json.loads(line))
+
+        if len(rows) >= IMPORT_BATCH_SIZE:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+
+async def load_import_states(repository, numbers, env):
+    """(updated_at, relations_hash) of a repository's stored issues among numbers, read in one batch"""
+    per_statement = D1_MAX_BOUND_PARAMETERS - 1
+    results = await fetch_batch(env.DB, [
+        env.DB.prepare(
+            'SELECT number, updated_at, relations_hash FROM issues'
+            f' WHERE repository = ? AND number IN ({", ".join(["?"] * len(chunk))})'
+        ).bind(repository, *chunk)
+        for chunk in (numbers[start:start + per_statement] for start in range(0, len(numbers), per_statement))
+    ])
+    return {row['number']: (row['updated_at'], row['relations_hash']) for rows in results for row in rows}
+
+
+async def import_issues(repository, rows, env):
+    """Write one chunk of a dump, skipping issues whose stored row is as recent with the same labels and assignees"""
+    # CSV dumps name labels only; their colors come from the repository's stored labels
+    labels = await load_labels(env, repository)
+    label_colors = labels.colors if labels else {}
+
+    # An issue listed twice in a chunk is written once, as its last row
+    issues = {}
+    for row in rows:
+        issue = normalize_issue(row, repository, label_colors)
+        issues[issue['number']] = issue
+
+    stored = await load_import_states(repository, list(issues), env)
+    pending = [
+        issue for number, issue in issues.items()
+        if stored.get(number) != (issue['updated_at'], relations_hash(issue))
+    ]
+    if pending:
+        await write_issue_records(pending, env)
+
+    return {
+        'written': len(pending),
+        'skipped': len(issues) - len(pending),
+        'latest_update': max((issue['updated_at'] for issue in issues.values()), default=None),
+    }
+
+
+async def finish_import(repository, written, skipped, latest_update, env):
+    """Rebuild what an import's chunks changed and record it in the repository's sync status"""
+    # Rollups and planner statistics once for the whole import, not per chunk
+    if written:
+        await update_repository_metrics(repository, env)
+        await rebuild_time_to_close_histograms(repository, env)
+        await env.DB.prepare('PRAGMA optimize').run()
+
+    # The scheduled sync picks up from the dump's newest issue (an empty dump keeps the current cursor)
+    await env.DB.prepare('''
+        INSERT INTO sync_status (repository, last_sync, status, cursor_updated_at)
+        VALUES (?, ?, 'imported', ?)
+        ON CONFLICT(repository) DO UPDATE SET
+            last_sync = excluded.last_sync,
+            status = 'imported',
+            error_message = NULL,
+            cursor_updated_at = COALESCE(excluded.cursor_updated_at, sync_status.cursor_updated_at)
+    ''').bind(repository, datetime.utcnow().isoformat(), latest_update).run()
+
+    return {'success': True, 'count': written + skipped, 'written': written, 'skipped': skipped}
+
+
+async def apply_import(env, operation):
+    """The `import` write operation: write one chunk of a dump on the repository's writer"""
+    repository = operation['repository']
+    return await import_issues(repository, operation['rows'], repository_env(env, repository))
+
+
+async def apply_import_done(env, operation):
+    """The `import_done` write operation: finish an import whose chunks are all written"""
+    repository = operation['repository']
+    return await finish_import(
+        repository, operation['written'], operation['skipped'], operation['latest_update'],
+        repository_env(env, repository)
+    )
+
+
+async def handle_import(request, env, session):
+    """Seed or restore a repository from an NDJSON or CSV dump"""
+    url = URL.new(request.url)
+    repository = url.searchParams.get('repository')
+    export_format = url.searchParams.get('format') or 'ndjson'
+
+    if not repository or export_format not in ('ndjson', 'csv'):
+        return error_response('repository parameter required and format must be ndjson or csv', 400)
+
+    try:
+        # The body is parsed as it arrives, and each chunk is one operation on the
+        # repository's writer, serialized with its webhook and sync writes
+        written = skipped = 0
+        latest_update = None
+        async for rows in read_dump(request, export_format):
+            result = await writer.submit(env, {'kind': 'import', 'repository': repository, 'rows': rows})
+            written += result['written']
+            skipped += result['skipped']
+            if result['latest_update'] and (latest_update is None or result['latest_update'] > latest_update):
+                latest_update = result['latest_update']
+
+        result = await writer.submit(env, {
+            'kind': 'import_done',
+            'repository': repository,
+            'written': written,
+            'skipped': skipped,
+            'latest_update': latest_update,
+        })
+        return json_response(result)
+
+    except Exception as error:
+        print(f'Error importing snapshot: {error}')
+        return error_response(str(error), 500)
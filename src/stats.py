@@ -0,0 +1,337 @@
+"""
+Worker Stats
+"""
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from itertools import product
+import contextvars
+import hmac
+import time
+from db import d1_binding
+
+
+OTHER = 'other'
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+
+# Every declared metric, in exposition order
+REGISTRY = []
+
+ISOLATE_START = time.time()
+
+# D1 and GitHub counts of the request being handled
+current_counts = contextvars.ContextVar('current_counts', default=None)
+
+# D1 counts of one shard's read within a fan-out (set in that read's task)
+current_shard_counts = contextvars.ContextVar('current_shard_counts', default=None)
+
+
+def format_value(value):
+    """A sample value as Prometheus text: integral floats without the .0"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def escape_label_value(value):
+    """A label value with backslashes, quotes and newlines escaped"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=''):
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    """A named metric with a fixed set of label value slots"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=(), values=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        # Single-label values may be given bare; an unlabelled metric has one slot
+        keys = [value if isinstance(value, tuple) else (value,) for value in values] if self.labels else [()]
+        if self.labels:
+            keys.append((OTHER,) * len(self.labels))
+        self.keys = keys
+        self.slots = {key: index for index, key in enumerate(keys)}
+        REGISTRY.append(self)
+
+    def slot(self, key):
+        """Index of a label key (a tuple), falling back to the 'other' slot"""
+        return self.slots.get(key, len(self.keys) - 1)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    """Monotonic counts per label key"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=(), values=()):
+        super().__init__(name, help_text, labels, values)
+        self.counts = array('d', bytes(8 * len(self.keys)))
+
+    def inc(self, *key, amount=1):
+        self.counts[self.slot(key)] += amount
+
+    def value(self, *key):
+        return self.counts[self.slot(key)]
+
+    def render(self):
+        lines = self.header()
+        for index, key in enumerate(self.keys):
+            # Label sets never seen are left out rather than reported as 0
+            if self.counts[index] or not self.labels:
+                lines.append(f'{self.name}{_label_text(self.labels, key)} {format_value(self.counts[index])}')
+        return lines
+
+
+class Gauge(Metric):
+    """A single current value, set directly or read from a function at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, function=None):
+        super().__init__(name, help_text)
+        self.function = function
+        self.current = None
+
+    def set(self, value):
+        self.current = value
+
+    def render(self):
+        value = self.function() if self.function else self.current
+        if value is None:
+            return []
+        return self.header() + [f'{self.name} {format_value(float(value))}']
+
+
+class Histogram(Metric):
+    """Bucketed observations per label key: one bucket per bound plus +Inf, then sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, bounds, labels=(), values=()):
+        super().__init__(name, help_text, labels, values)
+        self.bounds = tuple(bounds)
+        self.width = len(self.bounds) + 3
+        self.data = array('d', bytes(8 * self.width * len(self.keys)))
+
+    def observe(self, value, *key):
+        base = self.slot(key) * self.width
+        self.data[base + bisect_left(self.bounds, value)] += 1
+        self.data[base + self.width - 2] += value
+        self.data[base + self.width - 1] += 1
+
+    def render(self):
+        lines = self.header()
+        edges = [format_value(float(bound)) for bound in self.bounds] + ['+Inf']
+        for index, key in enumerate(self.keys):
+            base = index * self.width
+            count = self.data[base + self.width - 1]
+            if not count and self.labels:
+                continue
+            cumulative = 0
+            for offset, edge in enumerate(edges):
+                cumulative += self.data[base + offset]
+                labels = _label_text(self.labels, key, f'le="{edge}"')
+                lines.append(f'{self.name}_bucket{labels} {format_value(cumulative)}')
+            labels = _label_text(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {format_value(self.data[base + self.width - 2])}')
+            lines.append(f'{self.name}_count{labels} {format_value(count)}')
+        return lines
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Metrics that do not depend on the route table
+
+ISOLATE_START_SECONDS = Gauge(
+    'worker_isolate_start_seconds', 'Unix time this isolate started', lambda: ISOLATE_START
+)
+ISOLATE_UPTIME_SECONDS = Gauge(
+    'worker_isolate_uptime_seconds', 'Seconds since this isolate started', lambda: time.time() - ISOLATE_START
+)
+
+GITHUB_CALLS = Counter(
+    'worker_github_calls_total', 'GitHub API responses, by status class', ('status',), STATUS_CLASSES
+)
+GITHUB_RATE_LIMIT_REMAINING = Gauge(
+    'worker_github_rate_limit_remaining', 'X-RateLimit-Remaining of the latest GitHub API response'
+)
+GITHUB_RATE_LIMIT_RESET = Gauge(
+    'worker_github_rate_limit_reset_seconds', 'X-RateLimit-Reset (Unix time) of the latest GitHub API response'
+)
+
+WEBHOOK_LAG_SECONDS = Histogram(
+    'worker_webhook_lag_seconds', 'Seconds between an issue\'s updated_at and receipt of its webhook',
+    (1, 5, 15, 60, 300, 900, 3600, 21600, 86400)
+)
+
+CACHE_NAMES = ('modules', 'assets', 'sql_fingerprints')
+CACHE_LOOKUPS = Counter(
+    'worker_cache_lookups_total', 'Lookups in in-isolate and conditional-request caches, by cache and result',
+    ('cache', 'result'), product(CACHE_NAMES, ('hit', 'miss'))
+)
+
+SYNC_RUNS = Counter(
+    'worker_sync_runs_total', 'Repository syncs, by result', ('result',), ('success', 'failure')
+)
+SYNC_ISSUES = Counter('worker_sync_issues_total', 'Issues written by repository syncs')
+SYNC_ISSUES_SKIPPED = Counter(
+    'worker_sync_issues_skipped_total', 'Issues left unwritten by repository syncs because nothing changed'
+)
+SYNC_DURATION_SECONDS = Histogram(
+    'worker_sync_duration_seconds', 'Wall time of successful repository syncs',
+    (1, 5, 15, 30, 60, 120, 300, 900)
+)
+SYNC_ISSUES_PER_SECOND = Gauge(
+    'worker_sync_issues_per_second', 'Throughput of the latest successful repository sync'
+)
+
+
+class RequestStats:
+    """Per-route request, latency and D1 statement metrics for a fixed route table"""
+
+    def __init__(self, route_names):
+        names = list(route_names) + ['unmatched']
+        self.requests = Counter(
+            'worker_requests_total', 'Requests handled, by route and status class',
+            ('route', 'status'), product(names, STATUS_CLASSES)
+        )
+        self.duration = Histogram(
+            'worker_request_duration_ms', 'Time spent handling a request, by route',
+            (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000), ('route',), names
+        )
+        self.d1_statements = Histogram(
+            'worker_d1_statements_per_request', 'D1 statements prepared while handling a request, by route',
+            (0, 1, 2, 3, 5, 10, 20, 50, 100), ('route',), names
+        )
+
+    def record(self, route_name, status, start, statements):
+        """Record one finished request; start is its perf_counter() at arrival"""
+        self.requests.inc(route_name, f'{status // 100}xx')
+        self.duration.observe((time.perf_counter() - start) * 1000, route_name)
+        self.d1_statements.observe(statements, route_name)
+
+
+class RequestCounts:
+    """D1 statements, D1 round trips and GitHub API calls made while handling one request"""
+
+    __slots__ = ('statements', 'd1_calls', 'github_calls')
+
+    def __init__(self):
+        self.statements = 0
+        self.d1_calls = 0
+        self.github_calls = 0
+
+
+class CountingDatabase:
+    """A D1 binding that counts the statements prepared through it and the round trips they take"""
+
+    def __init__(self, database, counts):
+        self.database = database
+        self.counts = counts
+
+    def prepare(self, query):
+        self.counts.statements += 1
+        self.counts.d1_calls += 1
+        shard_counts = current_shard_counts.get()
+        if shard_counts is not None:
+            shard_counts.d1_calls += 1
+        return self.database.prepare(query)
+
+    async def batch(self, statements):
+        # Its statements were each counted as a call when prepared; a batch is one
+        self.counts.d1_calls -= len(statements) - 1
+        shard_counts = current_shard_counts.get()
+        if shard_counts is not None:
+            shard_counts.d1_calls -= len(statements) - 1
+        return await self.database.batch(statements)
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+
+class CountingEnv:
+    """The worker env with DB replaced by a CountingDatabase"""
+
+    def __init__(self, env, counts):
+        self._env = env
+        self.DB = CountingDatabase(env.DB, counts)
+
+    def d1_binding(self, name):
+        """Another D1 binding (a shard), wrapped like DB"""
+        if name == 'DB':
+            return self.DB
+        return CountingDatabase(d1_binding(self._env, name), self.DB.counts)
+
+    def __getattr__(self, name):
+        return getattr(self._env, name)
+
+
+def record_cache(cache, hit):
+    CACHE_LOOKUPS.inc(cache, 'hit' if hit else 'miss')
+
+
+def record_github_response(response):
+    """Count a GitHub API response and keep its rate-limit headers"""
+    GITHUB_CALLS.inc(f'{response.status // 100}xx')
+    counts = current_counts.get()
+    if counts is not None:
+        counts.github_calls += 1
+    remaining = response.headers.get('X-RateLimit-Remaining')
+    if remaining is not None:
+        GITHUB_RATE_LIMIT_REMAINING.set(int(remaining))
+    reset = response.headers.get('X-RateLimit-Reset')
+    if reset is not None:
+        GITHUB_RATE_LIMIT_RESET.set(int(reset))
+
+
+def record_webhook_lag(updated_at):
+    """Observe how long after an issue's updated_at (ISO 8601) its webhook arrived"""
+    try:
+        updated = datetime.fromisoformat(updated_at.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return
+    if updated.tzinfo is None:
+        updated = updated.replace(tzinfo=timezone.utc)
+    WEBHOOK_LAG_SECONDS.observe(max(0.0, time.time() - updated.timestamp()))
+
+
+def record_sync(issue_count, start, succeeded, skipped=0):
+    """Record a repository sync that began at start (a perf_counter value)"""
+    if not succeeded:
+        SYNC_RUNS.inc('failure')
+        return
+    duration = time.perf_counter() - start
+    SYNC_RUNS.inc('success')
+    SYNC_ISSUES.inc(amount=issue_count)
+    SYNC_ISSUES_SKIPPED.inc(amount=skipped)
+    SYNC_DURATION_SECONDS.observe(duration)
+    if duration > 0:
+        SYNC_ISSUES_PER_SECOND.set((issue_count + skipped) / duration)
+
+
+def bearer_token_valid(request, env, secret_name):
+    """True if the request carries the named secret (STATS_TOKEN, ADMIN_TOKEN) as a bearer token"""
+    expected = getattr(env, secret_name, None)
+    header = request.headers.get('Authorization') or ''
+    if not expected or not header.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(header[7:].encode('utf-8'), str(expected).encode('utf-8'))
@@ -0,0 +1,142 @@
+"""
+Live Update Streams
+"""
+
+from js import Response, ReadableStream, TextEncoder, Object
+from pyodide.ffi import create_proxy, to_js
+import asyncio
+import itertools
+import json
+from github import ISSUE_COLUMNS, issue_record
+from responses import build_headers
+
+
+# Issue fields an `issues` event carries: those of the issue list, labels as {name, color}
+STREAM_FIELDS = [column for column in ISSUE_COLUMNS if column != 'body'] + ['labels', 'assignees']
+
+# Comment lines sent while a stream is idle, so proxies do not close it
+HEARTBEAT_SECONDS = 25
+
+# How long EventSource waits before reconnecting a dropped stream
+RETRY_MS = 3000
+
+
+def format_event(event, data):
+    """One server-sent event"""
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+class Channel:
+    """One repository's open event streams, on the queue that applies its writes"""
+
+    def __init__(self, repository):
+        self.repository = repository
+        # (stream controller, its callback proxies) by subscriber number
+        self.subscribers = {}
+        self.numbers = itertools.count()
+        self.encoder = TextEncoder.new()
+        self.heartbeat = None
+        self.events = 0
+
+    def open(self, complete):
+        """Response streaming this channel's events to a new subscriber"""
+        number = next(self.numbers)
+        ready = {'repository': self.repository, 'complete': complete}
+
+        def start(controller):
+            self.subscribers[number] = (controller, (start_proxy, cancel_proxy))
+            controller.enqueue(self.encoder.encode(f'retry: {RETRY_MS}\n' + format_event('ready', ready)))
+            if self.heartbeat is None:
+                self.heartbeat = asyncio.ensure_future(self.keep_alive())
+
+        def cancel(reason):
+            self.drop(number)
+
+        start_proxy = create_proxy(start)
+        cancel_proxy = create_proxy(cancel)
+        stream = ReadableStream.new(to_js({'start': start_proxy, 'cancel': cancel_proxy}, dict_converter=Object.fromEntries))
+        return Response.new(stream, headers=build_headers({
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-store',
+        }))
+
+    def drop(self, number):
+        """Forget a subscriber (its client cancelled, or its stream closed) and destroy its stream's proxies"""
+        subscriber = self.subscribers.pop(number, None)
+        if subscriber is not None:
+            for proxy in subscriber[1]:
+                proxy.destroy()
+
+    def send(self, chunk):
+        """Enqueue encoded bytes on every subscriber's stream, dropping streams that have closed"""
+        for number, (controller, _) in list(self.subscribers.items()):
+            try:
+                controller.enqueue(chunk)
+            except Exception:
+                self.drop(number)
+
+    def publish(self, event, data):
+        """Send an event to every subscriber"""
+        if not self.subscribers:
+            return
+        self.events += 1
+        self.send(self.encoder.encode(format_event(event, data)))
+
+    async def keep_alive(self):
+        """Send a comment line every HEARTBEAT_SECONDS while anyone is subscribed"""
+        try:
+            while self.subscribers:
+                await asyncio.sleep(HEARTBEAT_SECONDS)
+                self.send(self.encoder.encode(': keep-alive\n\n'))
+        finally:
+            self.heartbeat = None
+
+    def publish_writes(self, issues, stored, changed, metrics):
+        """Publish a flush's changes: issue deltas, then the metrics they moved"""
+        if not self.subscribers:
+            return
+        deltas = issue_deltas(issues, stored, changed, self.repository)
+        if deltas['created'] or deltas['updated']:
+            self.publish('issues', deltas)
+        if metrics is not None:
+            self.publish('metrics', {'repository': self.repository, **metrics_delta(metrics)})
+
+
+def issue_deltas(issues, stored, changed, repository):
+    """New issues in full, and only the changed fields (plus the number) of updated ones"""
+    deltas = {'repository': repository, 'created': [], 'updated': []}
+    for issue in issues:
+        if issue['number'] not in changed:
+            continue
+        record = issue_record(issue, repository)
+        previous = stored.get(issue['number'])
+        if previous is None:
+            deltas['created'].append({field: record[field] for field in STREAM_FIELDS})
+            continue
+
+        delta = {
+            column: record[column] for column in STREAM_FIELDS
+            if column not in ('labels', 'assignees') and record[column] != previous[column]
+        }
+        if sorted((label['name'], label['color']) for label in record['labels']) != sorted(
+                (label['name'], label['color']) for label in previous['labels']):
+            delta['labels'] = record['labels']
+        if sorted(record['assignees']) != sorted(previous['assignees']):
+            delta['assignees'] = record['assignees']
+        if delta:
+            deltas['updated'].append({'number': issue['number'], **delta})
+    return deltas
+
+
+def metrics_delta(row):
+    """A recomputed metrics row as the `current` fields GET /api/metrics returns"""
+    avg_time_hours = row['avg_time_to_close']
+    avg_time_days = round(avg_time_hours / 24, 1) if avg_time_hours else None
+    return {
+        'current': {
+            'total_issues': row['total_issues'],
+            'open_issues': row['open_issues'],
+            'closed_issues': row['closed_issues'],
+            'avg_time_to_close_days': str(avg_time_days) if avg_time_days else None,
+        }
+    }
@@ -0,0 +1,198 @@
+"""
+Request Tracing
+"""
+
+import contextvars
+import hashlib
+import json
+import re
+import time
+from db import d1_binding
+from stats import record_cache
+
+
+# The trace of the request being handled, if tracing is on
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+_WHITESPACE = re.compile(r'\s+')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+_VALUES_ROWS = re.compile(r'(\(\?\+?\))(?:\s*,\s*\(\?\+?\))+')
+
+# Fingerprints by query text; dynamic queries have a bounded number of shapes
+_fingerprint_cache = {}
+FINGERPRINT_CACHE_SIZE = 512
+
+
+def tracing_enabled(env):
+    """True if the TRACING variable is set to on/true/1"""
+    return str(getattr(env, 'TRACING', '') or '').lower() in ('1', 'true', 'on')
+
+
+def normalize_sql(query):
+    """Statement shape: whitespace, literals, IN (?, ...) lists and multi-row VALUES collapsed"""
+    text = _WHITESPACE.sub(' ', query).strip()
+    text = _LITERAL.sub('?', text)
+    text = _PLACEHOLDER_LIST.sub('?+', text)
+    return _VALUES_ROWS.sub(r'\1+', text)
+
+
+def fingerprint_sql(query):
+    """(fingerprint, normalized text) of a statement, stable across bindings and list lengths"""
+    cached = _fingerprint_cache.get(query)
+    record_cache('sql_fingerprints', cached is not None)
+    if cached is None:
+        normalized = normalize_sql(query)
+        cached = (hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:12], normalized)
+        if len(_fingerprint_cache) >= FINGERPRINT_CACHE_SIZE:
+            _fingerprint_cache.clear()
+        _fingerprint_cache[query] = cached
+    return cached
+
+
+def row_count(method, result):
+    """Rows returned (or, for run, changed) by a D1 call, counted without converting the result"""
+    if result is None:
+        return 0
+    if method == 'first':
+        return 1
+    if method == 'all':
+        results = result['results'] if isinstance(result, dict) else result.results
+        return len(results)
+    if method == 'run':
+        return result['meta']['changes'] if isinstance(result, dict) else result.meta.changes
+    return None
+
+
+class Trace:
+    """Spans recorded while handling one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def add(self, kind, start, **fields):
+        """Record a span that began at start (a perf_counter value) and ends now"""
+        now = time.perf_counter()
+        self.spans.append({
+            'type': kind,
+            'start_ms': round((start - self.start) * 1000, 2),
+            'duration_ms': round((now - start) * 1000, 2),
+            **fields
+        })
+
+    def totals(self):
+        """{kind: (count, total milliseconds)}"""
+        totals = {}
+        for span in self.spans:
+            count, duration = totals.get(span['type'], (0, 0.0))
+            totals[span['type']] = (count + 1, duration + span['duration_ms'])
+        return totals
+
+    def server_timing(self):
+        """Server-Timing value: app total plus one entry per span kind"""
+        entries = [f'app;dur={(time.perf_counter() - self.start) * 1000:.1f}']
+        for kind, (count, duration) in self.totals().items():
+            entries.append(f'{kind};dur={duration:.1f};desc="{count} call{"" if count == 1 else "s"}"')
+        return ', '.join(entries)
+
+    def log(self, **fields):
+        """Emit the trace as one structured log line"""
+        print(json.dumps({
+            'event': 'request',
+            **fields,
+            'duration_ms': round((time.perf_counter() - self.start) * 1000, 2),
+            'spans': self.spans
+        }))
+
+
+class TracedStatement:
+    """A D1 prepared statement whose run/all/first calls are recorded as spans"""
+
+    def __init__(self, statement, query, trace, bindings=0):
+        self.statement = statement
+        self.query = query
+        self.trace = trace
+        self.bindings = bindings
+
+    def bind(self, *values):
+        return TracedStatement(self.statement.bind(*values), self.query, self.trace, len(values))
+
+    async def _call(self, method, *args):
+        start = time.perf_counter()
+        fingerprint, _ = fingerprint_sql(self.query)
+        try:
+            result = await getattr(self.statement, method)(*args)
+        except Exception as error:
+            self.trace.add('d1', start, method=method, fingerprint=fingerprint, error=str(error))
+            raise
+        self.trace.add(
+            'd1', start, method=method, fingerprint=fingerprint,
+            rows=row_count(method, result), bindings=self.bindings
+        )
+        return result
+
+    async def run(self):
+        return await self._call('run')
+
+    async def all(self):
+        return await self._call('all')
+
+    async def first(self, *args):
+        return await self._call('first', *args)
+
+    async def raw(self):
+        return await self._call('raw')
+
+
+class TracedDatabase:
+    """A D1 binding that hands out TracedStatements"""
+
+    def __init__(self, database, trace):
+        self.database = database
+        self.trace = trace
+
+    def prepare(self, query):
+        return TracedStatement(self.database.prepare(query), query, self.trace)
+
+    async def batch(self, statements):
+        start = time.perf_counter()
+        fingerprints = sorted({fingerprint_sql(statement.query)[0] for statement in statements})
+        result = await self.database.batch([statement.statement for statement in statements])
+        self.trace.add('d1', start, method='batch', statements=len(statements), fingerprints=fingerprints)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+
+class TracedEnv:
+    """The worker env with DB replaced by its traced wrapper"""
+
+    def __init__(self, env, trace):
+        self._env = env
+        self.DB = TracedDatabase(env.DB, trace)
+
+    def d1_binding(self, name):
+        """Another D1 binding (a shard), wrapped like DB"""
+        if name == 'DB':
+            return self.DB
+        return TracedDatabase(d1_binding(self._env, name), self.DB.trace)
+
+    def __getattr__(self, name):
+        return getattr(self._env, name)
+
+
+def record_github_call(start, method, path, response):
+    """Record a GitHub API call (status and rate-limit headers) on the current trace"""
+    trace = current_trace.get()
+    if trace is None:
+        return
+    trace.add(
+        'github', start,
+        method=method,
+        path=path.split('?')[0],
+        status=response.status,
+        rate_limit_remaining=response.headers.get('X-RateLimit-Remaining'),
+        rate_limit_reset=response.headers.get('X-RateLimit-Reset')
+    )
@@ -2,9 +2,11 @@
 GitHub Webhook Handler
 """
 
-from js import Response, Headers, crypto
+from js import crypto
 import json
-from github import sync_issue, calculate_time_to_close, update_repository_metrics
+from responses import json_response, error_response, text_response
+from writer import write_issues, update_label
+from stats import record_webhook_lag
 
 
 async def verify_webhook_signature(request, env):
@@ -46,7 +48,7 @@ async def handle_webhook(request, env):
     # Verify signature
     is_valid = await verify_webhook_signature(request.clone(), env)
     if not is_valid:
-        return Response.new('Invalid signature', status=401)
+        return text_response('Invalid signature', 401)
     
     event = request.headers.get('X-GitHub-Event')
     payload = json.loads(await request.text())
@@ -54,22 +56,15 @@ async def handle_webhook(request, env):
     try:
         if event == 'issues':
             await handle_issue_event(payload, env)
+        elif event == 'label':
+            await handle_label_event(payload, env)
         elif event == 'ping':
-            headers = Headers.new()
-            headers.set('Content-Type', 'application/json')
-            body = json.dumps({'message': 'Webhook configured successfully'})
-            return Response.new(body, headers=headers)
+            return json_response({'message': 'Webhook configured successfully'})
         
-        headers = Headers.new()
-        headers.set('Content-Type', 'application/json')
-        body = json.dumps({'status': 'processed'})
-        return Response.new(body, headers=headers)
+        return json_response({'status': 'processed'})
     except Exception as error:
         print(f'Webhook processing error: {error}')
-        headers = Headers.new()
-        headers.set('Content-Type', 'application/json')
-        body = json.dumps({'error': str(error)})
-        return Response.new(body, status=500, headers=headers)
+        return error_response(str(error), 500)
 
 
 async def handle_issue_event(payload, env):
@@ -77,56 +72,24 @@ async def handle_issue_event(payload, env):
     issue = payload['issue']
     action = payload['action']
     repository = payload['repository']['full_name']
+    record_webhook_lag(issue.get('updated_at'))
     
     print(f'Processing issue event: {action} for {repository}#{issue["number"]}')
     
-    # Calculate time to close
-    time_to_close = None
-    if issue['state'] == 'closed' and issue.get('closed_at'):
-        time_to_close = calculate_time_to_close(issue['created_at'], issue['closed_at'])
-    
-    # Upsert issue
-    await env.DB.prepare('''
-        INSERT INTO issues (id, number, title, body, state, created_at, updated_at, closed_at, html_url, repository, assignee, milestone, time_to_close)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(repository, number) DO UPDATE SET
-            title = excluded.title,
-            body = excluded.body,
-            state = excluded.state,
-            updated_at = excluded.updated_at,
-            closed_at = excluded.closed_at,
-            assignee = excluded.assignee,
-            milestone = excluded.milestone,
-            time_to_close = excluded.time_to_close
-    ''').bind(
-        issue['id'],
-        issue['number'],
-        issue['title'],
-        issue.get('body', ''),
-        issue['state'],
-        issue['created_at'],
-        issue['updated_at'],
-        issue.get('closed_at'),
-        issue['html_url'],
-        repository,
-        issue['assignee']['login'] if issue.get('assignee') else None,
-        issue['milestone']['title'] if issue.get('milestone') else None,
-        time_to_close
-    ).run()
-    
-    # Update labels
-    await env.DB.prepare('DELETE FROM labels WHERE issue_id = ?').bind(issue['id']).run()
-    for label in issue.get('labels', []):
-        await env.DB.prepare(
-            'INSERT INTO labels (issue_id, name, color) VALUES (?, ?, ?)'
-        ).bind(issue['id'], label['name'], label['color']).run()
+    # Issue, labels, assignees, histogram cells and metrics in one D1 batch, in order
+    # with the repository's other writes (and coalesced with any queued behind them);
+    # the writer then publishes what changed to the repository's /api/stream subscribers
+    await write_issues(env, repository, [issue], update_metrics=True)
+
+
+async def handle_label_event(payload, env):
+    """Handle label events: a repository label created, renamed, recolored or deleted"""
+    action = payload['action']
+    label = payload['label']
+    repository = payload['repository']['full_name']
+    old_name = payload.get('changes', {}).get('name', {}).get('from')
     
-    # Update assignees
-    await env.DB.prepare('DELETE FROM assignees WHERE issue_id = ?').bind(issue['id']).run()
-    for assignee in issue.get('assignees', []):
-        await env.DB.prepare(
-            'INSERT INTO assignees (issue_id, username) VALUES (?, ?)'
-        ).bind(issue['id'], assignee['login']).run()
+    print(f'Processing label event: {action} for {repository} label {label["name"]}')
     
-    # Update metrics
-    await update_repository_metrics(repository, env)
+    if action in ('created', 'edited', 'deleted'):
+        await update_label(env, repository, action, label, old_name)
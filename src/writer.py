@@ -0,0 +1,206 @@
+"""
+Repository Write Serializer
+"""
+
+from js import Response
+import asyncio
+import importlib
+import json
+from github import load_stored_issues, apply_issue_changes, sync_repository
+from metadata import apply_label_event, mark_stale
+from responses import json_response, error_response
+from shards import repository_env
+from stream import Channel
+
+
+# Queues of the writes made in this isolate, when REPOSITORY_WRITER is not bound
+WRITE_QUEUES = {}
+
+# Operations that hold the queue for their whole run, by kind: the handler module and
+# function applying one (imported on first use, like main's handlers) and the result
+# key counting the issues it wrote, announced as a reload (None: an import's chunks
+# leave that to its closing import_done)
+EXCLUSIVE_OPERATIONS = {
+    'import': ('snapshot', 'apply_import', None),
+    'import_done': ('snapshot', 'apply_import_done', 'written'),
+    'move': ('rebalance', 'apply_move', 'copied'),
+}
+
+
+class WriteQueue:
+    """One repository's writes: coalesced issue flushes and exclusive sections, in arrival order"""
+
+    def __init__(self, repository):
+        self.repository = repository
+        # Held by each flush and by a sync's writes; asyncio.Lock wakes waiters in FIFO order
+        self.lock = asyncio.Lock()
+        self.pending = {}
+        self.waiters = []
+        self.update_metrics = False
+        self.flushes = 0
+        self.coalesced = 0
+        self.channel = Channel(repository)
+
+    async def write_issues(self, env, issues, update_metrics=True):
+        """Queue GitHub issue payloads and wait until they are written; returns how many of them changed"""
+        future = asyncio.get_running_loop().create_future()
+        for issue in issues:
+            queued = self.pending.get(issue['number'])
+            if queued is not None:
+                self.coalesced += 1
+            if queued is None or issue['updated_at'] >= queued['updated_at']:
+                self.pending[issue['number']] = issue
+        self.waiters.append((future, {issue['number'] for issue in issues}))
+        self.update_metrics = self.update_metrics or update_metrics
+
+        # Whoever holds the lock next writes everything queued by then, this write included
+        async with self.lock:
+            if not future.done():
+                await self.flush(env)
+        return future.result()
+
+    async def flush(self, env):
+        """Write every queued payload in one batch and resolve the writes waiting on them"""
+        issues = list(self.pending.values())
+        waiters = self.waiters
+        update_metrics = self.update_metrics
+        self.pending = {}
+        self.waiters = []
+        self.update_metrics = False
+        self.flushes += 1
+
+        try:
+            stored = await load_stored_issues(self.repository, [issue['number'] for issue in issues], env)
+            changed, metrics = await apply_issue_changes(issues, self.repository, env, stored, update_metrics)
+            changed = set(changed)
+        except Exception as error:
+            for future, _ in waiters:
+                future.set_exception(error)
+            return
+
+        self.channel.publish_writes(issues, stored, changed, metrics)
+
+        for future, numbers in waiters:
+            future.set_result(len(numbers & changed))
+
+
+def local_queue(repository):
+    """This isolate's queue for a repository"""
+    queue = WRITE_QUEUES.get(repository)
+    if queue is None:
+        queue = WRITE_QUEUES[repository] = WriteQueue(repository)
+    return queue
+
+
+async def run_operation(queue, env, operation):
+    """Apply one write operation through a repository's queue"""
+    repository = operation['repository']
+    env = repository_env(env, repository)
+    if operation['kind'] == 'issues':
+        changed = await queue.write_issues(env, operation['issues'], operation.get('update_metrics', True))
+        return {'changed': changed}
+    if operation['kind'] == 'sync':
+        owner, repo = repository.split('/')
+        result = await sync_repository(owner, repo, operation['access_token'], env, write_lock=queue.lock)
+        if result.get('written'):
+            queue.channel.publish('reload', {'repository': repository, 'written': result['written']})
+        return result
+    if operation['kind'] == 'label':
+        async with queue.lock:
+            result = await apply_label_event(
+                env, repository, operation['action'], operation['label'], operation.get('old_name')
+            )
+        queue.channel.publish('label', {**result, 'color': operation['label'].get('color'),
+                                        'old_name': operation.get('old_name')})
+        return result
+    if operation['kind'] in EXCLUSIVE_OPERATIONS:
+        module, function, written = EXCLUSIVE_OPERATIONS[operation['kind']]
+        apply = getattr(importlib.import_module(module), function)
+        async with queue.lock:
+            result = await apply(env, operation)
+        if written and result.get(written):
+            queue.channel.publish('reload', {'repository': repository, 'written': result[written]})
+        return result
+    raise ValueError(f'unknown write operation: {operation["kind"]}')
+
+
+async def submit(env, operation):
+    """Run a write operation on its repository's writer: the Durable Object if bound, else this isolate's queue"""
+    repository = operation['repository']
+    namespace = getattr(env, 'REPOSITORY_WRITER', None)
+    if namespace is None:
+        return await run_operation(local_queue(repository), env, operation)
+
+    stub = namespace.get(namespace.idFromName(repository.lower()))
+    response = await stub.fetch('https://repository-writer/', {
+        'method': 'POST',
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(operation),
+    })
+    data = json.loads(await response.text())
+    if not response.ok:
+        raise Exception(f'Repository writer error: {response.status} {data.get("error")}')
+    return data
+
+
+async def write_issues(env, repository, issues, update_metrics=True):
+    """Write GitHub issue payloads for one repository; returns how many changed"""
+    result = await submit(env, {
+        'kind': 'issues',
+        'repository': repository,
+        'issues': issues,
+        'update_metrics': update_metrics,
+    })
+    return result['changed']
+
+
+async def sync(env, owner, repo, access_token):
+    """Full sync of a repository, its writes serialized with the repository's other writes"""
+    return await submit(env, {'kind': 'sync', 'repository': f'{owner}/{repo}', 'access_token': access_token})
+
+
+async def subscribe(env, repository):
+    """Event stream of a repository's writes, from its writer: the Durable Object if bound, else this isolate's queue"""
+    namespace = getattr(env, 'REPOSITORY_WRITER', None)
+    if namespace is None:
+        return local_queue(repository).channel.open(complete=False)
+
+    stub = namespace.get(namespace.idFromName(repository.lower()))
+    response = await stub.fetch('https://repository-writer/', {
+        'method': 'POST',
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({'kind': 'subscribe', 'repository': repository}),
+    })
+    # The object's stream passes through; the copy's headers stay mutable for the middleware
+    return Response.new(response.body, status=response.status, headers=response.headers)
+
+
+async def update_label(env, repository, action, label, old_name=None):
+    """Apply a `label` webhook (created, edited or deleted), serialized with the repository's issue writes"""
+    result = await submit(env, {
+        'kind': 'label',
+        'repository': repository,
+        'action': action,
+        'label': {'name': label['name'], 'color': label.get('color')},
+        'old_name': old_name,
+    })
+    # The writer refreshed the labels cached where it runs; a Durable Object runs elsewhere
+    if getattr(env, 'REPOSITORY_WRITER', None) is not None:
+        mark_stale(repository_env(env, repository), repository)
+    return result
+
+
+async def handle_writer_request(durable_object, request):
+    """The REPOSITORY_WRITER Durable Object's fetch: run one operation on the object's queue, or open an event stream"""
+    try:
+        operation = json.loads(await request.text())
+        queue = getattr(durable_object, 'queue', None)
+        if queue is None:
+            queue = durable_object.queue = WriteQueue(operation['repository'])
+        if operation['kind'] == 'subscribe':
+            return queue.channel.open(complete=True)
+        return json_response(await run_operation(queue, durable_object.env, operation))
+
+    except Exception as error:
+        print(f'Error in repository writer: {error}')
+        return error_response(str(error), 500)
@@ -3,10 +3,49 @@ let currentOrder = 'desc';
 let currentPage = 1;
 let selectedIssues = new Set();
 
+// Rows have a fixed height so the visible window can be computed from scrollTop
+const ROW_HEIGHT = 44;
+const OVERSCAN_ROWS = 10;
+
+// Repositories up to this size are cached in full and sorted/filtered locally
+const STORE_MAX_ISSUES = 20000;
+
+// Everything the table shows, sorts or filters on; bodies are left out
+const STORE_FIELDS = 'id,number,title,state,created_at,updated_at,closed_at,html_url,repository,assignee,milestone,time_to_close,labels,assignees';
+
+// Client-side issue store: every issue of one repository, once fully loaded
+const issueStore = {
+  repository: null,
+  issues: new Map(),
+  complete: false,
+  unavailable: false,
+  loading: null,
+  abort: null
+};
+
+// Issues currently listed, in display order, and their rendered rows by number
+let visibleIssues = [];
+const renderedRows = new Map();
+
+// Cached GET responses are served immediately and revalidated once older than this
+const REQUEST_CACHE_TTL_MS = 30000;
+
+// Request cache by URL: last good JSON response plus the in-flight request, if any
+const requestCache = new Map();
+let lastIssuesUrl = null;
+
+// Issues of each /api/issues response with label ids replaced by the labels they name
+const resolvedPages = new WeakMap();
+
+// Live updates of the repository shown. A complete stream sees every write, so
+// cached responses for its repository are only refetched once an event marks them stale.
+const liveStream = { repository: null, source: null, complete: false, connected: false, opened: false };
+let syncingRepository = null;
+
 // Check authentication
 async function checkAuth() {
   try {
-    const response = await fetch('/api/issues?repository=test/test&per_page=1');
+    const response = await fetch('/api/session');
     if (response.status === 401) {
       document.getElementById('auth-section').style.display = 'block';
     } else {
@@ -17,6 +56,161 @@ async function checkAuth() {
   }
 }
 
+// Request cache
+// Concurrent calls for the same URL share one request. A cached response is
+// returned at once; if it is stale it is refetched in the background and
+// onRevalidate receives the fresh data.
+async function cachedFetchJson(url, onRevalidate = null) {
+  const entry = requestCache.get(url);
+
+  if (entry && entry.data !== undefined) {
+    const expired = Date.now() - entry.fetchedAt > REQUEST_CACHE_TTL_MS && !streamCovers(url);
+    if ((entry.stale || expired) && !entry.promise) {
+      const cachedData = entry.data;
+      revalidateRequest(url).then(data => {
+        if (onRevalidate && JSON.stringify(data) !== JSON.stringify(cachedData)) onRevalidate(data);
+      }).catch(() => {});
+    }
+    return entry.data;
+  }
+
+  return revalidateRequest(url);
+}
+
+function revalidateRequest(url) {
+  const entry = requestCache.get(url) || {};
+  if (entry.promise) return entry.promise;
+
+  entry.promise = fetch(url)
+    .then(async response => {
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.error);
+      entry.data = data;
+      entry.fetchedAt = Date.now();
+      entry.stale = false;
+      return data;
+    })
+    .finally(() => {
+      entry.promise = null;
+    });
+
+  requestCache.set(url, entry);
+  return entry.promise;
+}
+
+// Called after this client changes issue data (sync, bulk update)
+function invalidateRequests() {
+  requestCache.clear();
+}
+
+function requestRepository(url) {
+  return new URL(url, location.origin).searchParams.get('repository');
+}
+
+function streamCovers(url) {
+  return liveStream.complete && liveStream.connected && requestRepository(url) === liveStream.repository;
+}
+
+// Revalidate cached responses under a path for a repository the next time they are used
+function markRequestsStale(path, repository) {
+  for (const [url, entry] of requestCache) {
+    if (url.startsWith(path) && requestRepository(url) === repository) entry.stale = true;
+  }
+}
+
+// Live updates
+// One EventSource, for the repository being viewed. Deltas are applied to the
+// store and to the listed issues in place; cached pages are marked stale, since
+// a change can move an issue to another page.
+function openStream(repository) {
+  if (typeof EventSource === 'undefined' || liveStream.repository === repository) return;
+  if (liveStream.source) liveStream.source.close();
+
+  const source = new EventSource('/api/stream?repository=' + encodeURIComponent(repository));
+  Object.assign(liveStream, { repository, source, complete: false, connected: false, opened: false });
+
+  source.addEventListener('ready', event => {
+    // After a reconnect, events sent while disconnected were missed
+    if (liveStream.opened) reloadRepository(repository);
+    liveStream.complete = JSON.parse(event.data).complete;
+    liveStream.connected = true;
+    liveStream.opened = true;
+  });
+  source.addEventListener('error', () => {
+    liveStream.connected = false;
+  });
+  source.addEventListener('issues', event => applyIssueDeltas(JSON.parse(event.data)));
+  source.addEventListener('metrics', event => applyMetricsDelta(JSON.parse(event.data)));
+  source.addEventListener('label', event => applyLabelChange(JSON.parse(event.data)));
+  source.addEventListener('reload', event => {
+    const data = JSON.parse(event.data);
+    if (syncingRepository !== data.repository) reloadRepository(data.repository);
+  });
+}
+
+function isShown(repository) {
+  return document.getElementById('repository').value === repository;
+}
+
+// Apply a change to every held copy of the repository's issues and re-render what is listed
+function updateIssues(repository, update) {
+  if (issueStore.repository === repository) {
+    for (const [number, issue] of issueStore.issues) {
+      const updated = update(issue);
+      if (updated !== issue) issueStore.issues.set(number, updated);
+    }
+  }
+  if (!isShown(repository)) return;
+
+  if (isStoreComplete(repository)) {
+    refreshIssues(queryStore(getFilters()));
+    displayPagination(null);
+  } else {
+    refreshIssues(visibleIssues.map(update));
+  }
+}
+
+function applyIssueDeltas(data) {
+  markRequestsStale('/api/issues?', data.repository);
+  const updates = new Map(data.updated.map(delta => [delta.number, delta]));
+
+  // New issues join the store; a paged list picks them up when the page is fetched again
+  if (isStoreComplete(data.repository)) {
+    for (const issue of data.created) issueStore.issues.set(issue.number, issue);
+  }
+  updateIssues(data.repository, issue => updates.has(issue.number) ? { ...issue, ...updates.get(issue.number) } : issue);
+}
+
+function applyMetricsDelta(data) {
+  const url = '/api/metrics?repository=' + encodeURIComponent(data.repository);
+  const entry = requestCache.get(url);
+  // The counts are current; the rest of the response is refetched when next shown
+  if (entry && entry.data !== undefined) {
+    entry.data = { ...entry.data, current: { ...entry.data.current, ...data.current } };
+    entry.stale = true;
+  }
+  if (isShown(data.repository)) displayMetrics(entry && entry.data !== undefined ? entry.data : data);
+}
+
+function applyLabelChange(data) {
+  markRequestsStale('/api/', data.repository);
+  const name = data.old_name || data.label;
+  updateIssues(data.repository, issue => {
+    if (!issue.labels.some(label => label.name === name)) return issue;
+    const labels = data.action === 'deleted'
+      ? issue.labels.filter(label => label.name !== name)
+      : issue.labels.map(label => label.name === name ? { name: data.label, color: data.color || label.color } : label);
+    return { ...issue, labels };
+  });
+}
+
+// Too much changed to apply piecemeal (a sync, or events missed while reconnecting)
+function reloadRepository(repository) {
+  markRequestsStale('/api/', repository);
+  if (issueStore.repository === repository) resetStore();
+  if (isShown(repository)) loadIssues(currentPage);
+}
+
 // Load issues
 async function loadIssues(page = 1) {
   const repository = document.getElementById('repository').value;
@@ -25,36 +219,55 @@ async function loadIssues(page = 1) {
     return;
   }
 
-  const state = document.getElementById('state').value;
-  const label = document.getElementById('label').value;
-  const assignee = document.getElementById('assignee').value;
+  const filters = getFilters();
+  hideError();
+  openStream(repository);
+
+  // A complete store answers every filter and sort without the server
+  if (isStoreComplete(repository)) {
+    displayIssues(queryStore(filters));
+    displayPagination(null);
+    loadMetrics(repository);
+    currentPage = 1;
+    return;
+  }
 
   showLoading(true);
-  hideError();
 
   try {
     const params = new URLSearchParams({
       repository,
-      state,
+      state: filters.state,
       sort: currentSort,
       order: currentOrder,
       page,
       per_page: 50
     });
 
-    if (label) params.append('label', label);
-    if (assignee) params.append('assignee', assignee);
-
-    const response = await fetch('/api/issues?' + params.toString());
-    const data = await response.json();
+    if (filters.label) params.append('label', filters.label);
+    if (filters.assignee) params.append('assignee', filters.assignee);
 
-    if (!response.ok) throw new Error(data.error);
+    const url = '/api/issues?' + params.toString();
+    const data = await cachedFetchJson(url, fresh => {
+      if (lastIssuesUrl === url && !isStoreComplete(repository)) {
+        displayIssues(pageIssues(fresh));
+        displayPagination(fresh.pagination);
+      }
+    });
+    lastIssuesUrl = url;
 
-    displayIssues(data.issues);
+    displayIssues(pageIssues(data));
     displayPagination(data.pagination);
     loadMetrics(repository);
     currentPage = page;
 
+    fillStore(repository).then(() => {
+      if (isStoreComplete(repository) && document.getElementById('repository').value === repository) {
+        displayIssues(queryStore(getFilters()));
+        displayPagination(null);
+      }
+    });
+
   } catch (error) {
     showError(error.message);
   } finally {
@@ -62,10 +275,146 @@ async function loadIssues(page = 1) {
   }
 }
 
+// Issue lists reference labels by id; each page carries the labels it uses, by repository
+function pageIssues(data) {
+  let issues = resolvedPages.get(data);
+  if (!issues) {
+    issues = data.issues.map(issue => {
+      const labels = data.labels[issue.repository] || {};
+      return { ...issue, labels: issue.labels.map(id => labels[id]).filter(Boolean) };
+    });
+    resolvedPages.set(data, issues);
+  }
+  return issues;
+}
+
+function getFilters() {
+  return {
+    state: document.getElementById('state').value,
+    label: document.getElementById('label').value,
+    assignee: document.getElementById('assignee').value
+  };
+}
+
+// Issue store
+function isStoreComplete(repository) {
+  return issueStore.repository === repository && issueStore.complete;
+}
+
+function resetStore(repository = null) {
+  if (issueStore.abort) issueStore.abort.abort();
+  issueStore.repository = repository;
+  issueStore.issues = new Map();
+  issueStore.complete = false;
+  issueStore.unavailable = false;
+  issueStore.loading = null;
+  issueStore.abort = null;
+}
+
+// Stream every issue of the repository from the export endpoint into the store
+function fillStore(repository) {
+  if (issueStore.repository === repository && (issueStore.complete || issueStore.unavailable || issueStore.loading)) {
+    return issueStore.loading || Promise.resolve();
+  }
+
+  resetStore(repository);
+  const controller = new AbortController();
+  issueStore.abort = controller;
+
+  issueStore.loading = (async () => {
+    const response = await fetch('/api/export?format=ndjson&fields=' + STORE_FIELDS + '&repository=' + encodeURIComponent(repository), {
+      signal: controller.signal
+    });
+    if (!response.ok) {
+      issueStore.unavailable = true;
+      return;
+    }
+
+    const issues = new Map();
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split('\n');
+      buffered = lines.pop();
+      for (const line of lines) {
+        if (!line) continue;
+        const issue = JSON.parse(line);
+        issues.set(issue.number, issue);
+      }
+
+      // Too large to hold client-side; keep using server-side paging
+      if (issues.size > STORE_MAX_ISSUES) {
+        issueStore.unavailable = true;
+        controller.abort();
+        return;
+      }
+    }
+
+    if (issueStore.abort === controller) {
+      issueStore.issues = issues;
+      issueStore.complete = true;
+    }
+  })().catch(() => {}).finally(() => {
+    if (issueStore.abort === controller) {
+      issueStore.loading = null;
+      issueStore.abort = null;
+    }
+  });
+
+  return issueStore.loading;
+}
+
+// Filter and sort the cached issues the same way GET /api/issues does
+function queryStore({ state, label, assignee }) {
+  const issues = [];
+  for (const issue of issueStore.issues.values()) {
+    if (state !== 'all' && issue.state !== state) continue;
+    if (label && !issue.labels.some(l => l.name === label)) continue;
+    if (assignee === 'none' && issue.assignee !== null) continue;
+    if (assignee && assignee !== 'none' && !issue.assignees.includes(assignee)) continue;
+    issues.push(issue);
+  }
+  return sortIssues(issues);
+}
+
+// SQLite ordering: NULLs sort first ascending and last descending
+function compareValues(a, b) {
+  if (a === b) return 0;
+  if (a === null || a === undefined) return -1;
+  if (b === null || b === undefined) return 1;
+  return a < b ? -1 : 1;
+}
+
+// Ties break on the issue id in the sort direction, as the server's ORDER BY does
+function sortIssues(issues) {
+  const direction = currentOrder === 'asc' ? 1 : -1;
+  return issues.sort((a, b) => direction * (compareValues(a[currentSort], b[currentSort]) || a.id - b.id));
+}
+
+// Re-render changed issues in the list, keeping the scroll position
+function refreshIssues(issues) {
+  if (!document.getElementById('issues-spacer-top') || issues.length === 0) {
+    displayIssues(issues);
+    return;
+  }
+  visibleIssues = issues;
+  renderVisibleRows();
+}
+
 // Display issues
 function displayIssues(issues) {
   const tbody = document.getElementById('issues-body');
+  const viewport = document.getElementById('issues-viewport');
+  visibleIssues = issues;
+  renderedRows.clear();
   tbody.innerHTML = '';
+  viewport.scrollTop = 0;
 
   if (issues.length === 0) {
     tbody.innerHTML = '<tr><td colspan="8" style="text-align: center; padding: 40px; color: #8b949e;">No issues found</td></tr>';
@@ -73,72 +422,139 @@ function displayIssues(issues) {
     return;
   }
 
-  issues.forEach(issue => {
-    const row = document.createElement('tr');
-    
-    const labels = issue.labels.map(l => 
-      `<span class="label" style="background-color: #${l.color}; color: ${getContrastColor(l.color)}">${l.name}</span>`
-    ).join('');
-
-    const assignees = issue.assignees.map(a => 
-      `<span class="assignee">@${a}</span>`
-    ).join('');
-
-    const createdDate = new Date(issue.created_at).toLocaleDateString();
-    const timeToClose = issue.time_to_close 
-      ? formatTimeToClose(issue.time_to_close)
-      : '-';
-
-    row.innerHTML = `
-      <td><input type="checkbox" class="checkbox issue-checkbox" data-number="${issue.number}" onchange="updateSelection()" /></td>
-      <td><a href="${issue.html_url}" target="_blank" class="issue-number">#${issue.number}</a></td>
-      <td><span class="issue-title">${escapeHtml(issue.title)}</span></td>
-      <td><span class="state-badge state-${issue.state}">${issue.state}</span></td>
-      <td>${labels}</td>
-      <td>${assignees}</td>
-      <td class="time-value">${createdDate}</td>
-      <td class="time-value">${timeToClose}</td>
-    `;
-
-    tbody.appendChild(row);
-  });
-
+  tbody.appendChild(createSpacerRow('issues-spacer-top'));
+  tbody.appendChild(createSpacerRow('issues-spacer-bottom'));
   document.getElementById('issues-table').style.display = 'table';
+  renderVisibleRows();
+}
+
+function createSpacerRow(id) {
+  const row = document.createElement('tr');
+  row.id = id;
+  row.className = 'issues-spacer';
+  row.innerHTML = '<td colspan="8"></td>';
+  return row;
+}
+
+// Render only the rows inside the scroll window, reusing rows by issue number
+function renderVisibleRows() {
+  const topSpacer = document.getElementById('issues-spacer-top');
+  const bottomSpacer = document.getElementById('issues-spacer-bottom');
+  if (!topSpacer) return;
+
+  const viewport = document.getElementById('issues-viewport');
+  const first = Math.max(0, Math.floor(viewport.scrollTop / ROW_HEIGHT) - OVERSCAN_ROWS);
+  const last = Math.min(
+    visibleIssues.length,
+    Math.ceil((viewport.scrollTop + viewport.clientHeight) / ROW_HEIGHT) + OVERSCAN_ROWS
+  );
+
+  topSpacer.style.height = `${first * ROW_HEIGHT}px`;
+  bottomSpacer.style.height = `${(visibleIssues.length - last) * ROW_HEIGHT}px`;
+
+  const tbody = topSpacer.parentNode;
+  const wanted = new Set();
+  let cursor = topSpacer.nextSibling;
+
+  for (let i = first; i < last; i++) {
+    const issue = visibleIssues[i];
+    wanted.add(issue.number);
+    const row = getIssueRow(issue);
+    if (row === cursor) {
+      cursor = cursor.nextSibling;
+    } else {
+      tbody.insertBefore(row, cursor);
+    }
+  }
+
+  for (const [number, entry] of renderedRows) {
+    if (!wanted.has(number)) {
+      entry.row.remove();
+      renderedRows.delete(number);
+    }
+  }
+}
+
+function getIssueRow(issue) {
+  const entry = renderedRows.get(issue.number);
+  if (entry && entry.issue === issue) {
+    entry.row.querySelector('.issue-checkbox').checked = selectedIssues.has(issue.number);
+    return entry.row;
+  }
+
+  const row = createIssueRow(issue);
+  if (entry) entry.row.remove();
+  renderedRows.set(issue.number, { issue, row });
+  return row;
+}
+
+function createIssueRow(issue) {
+  const row = document.createElement('tr');
+  row.className = 'issue-row';
+
+  const labels = issue.labels.map(l =>
+    `<span class="label" style="background-color: #${l.color}; color: ${getContrastColor(l.color)}">${l.name}</span>`
+  ).join('');
+
+  const assignees = issue.assignees.map(a =>
+    `<span class="assignee">@${a}</span>`
+  ).join('');
+
+  const createdDate = new Date(issue.created_at).toLocaleDateString();
+  const timeToClose = issue.time_to_close
+    ? formatTimeToClose(issue.time_to_close)
+    : '-';
+  const checked = selectedIssues.has(issue.number) ? 'checked' : '';
+
+  row.innerHTML = `
+    <td><input type="checkbox" class="checkbox issue-checkbox" data-number="${issue.number}" onchange="toggleIssue(this)" ${checked} /></td>
+    <td><a href="${issue.html_url}" target="_blank" class="issue-number">#${issue.number}</a></td>
+    <td><span class="issue-title">${escapeHtml(issue.title)}</span></td>
+    <td><span class="state-badge state-${issue.state}">${issue.state}</span></td>
+    <td>${labels}</td>
+    <td>${assignees}</td>
+    <td class="time-value">${createdDate}</td>
+    <td class="time-value">${timeToClose}</td>
+  `;
+
+  return row;
 }
 
 // Load metrics
 async function loadMetrics(repository) {
   try {
-    const response = await fetch('/api/metrics?repository=' + encodeURIComponent(repository));
-    const data = await response.json();
-
-    if (!response.ok) return;
-
-    const metricsHtml = `
-      <div class="metric-card">
-        <h3>Total Issues</h3>
-        <div class="value">${data.current.total_issues || 0}</div>
-      </div>
-      <div class="metric-card">
-        <h3>Open Issues</h3>
-        <div class="value">${data.current.open_issues || 0}</div>
-      </div>
-      <div class="metric-card">
-        <h3>Closed Issues</h3>
-        <div class="value">${data.current.closed_issues || 0}</div>
-      </div>
-      <div class="metric-card">
-        <h3>Avg Time to Close</h3>
-        <div class="value">${data.current.avg_time_to_close_days || 0} days</div>
-      </div>
-    `;
-
-    document.getElementById('metrics').innerHTML = metricsHtml;
+    const data = await cachedFetchJson('/api/metrics?repository=' + encodeURIComponent(repository), fresh => {
+      if (document.getElementById('repository').value === repository) displayMetrics(fresh);
+    });
+    displayMetrics(data);
   } catch (error) {
     console.error('Error loading metrics:', error);
   }
 }
 
+function displayMetrics(data) {
+  const metricsHtml = `
+    <div class="metric-card">
+      <h3>Total Issues</h3>
+      <div class="value">${data.current.total_issues || 0}</div>
+    </div>
+    <div class="metric-card">
+      <h3>Open Issues</h3>
+      <div class="value">${data.current.open_issues || 0}</div>
+    </div>
+    <div class="metric-card">
+      <h3>Closed Issues</h3>
+      <div class="value">${data.current.closed_issues || 0}</div>
+    </div>
+    <div class="metric-card">
+      <h3>Avg Time to Close</h3>
+      <div class="value">${data.current.avg_time_to_close_days || 0} days</div>
+    </div>
+  `;
+
+  document.getElementById('metrics').innerHTML = metricsHtml;
+}
+
 // Sort by column
 function sortBy(field) {
   if (currentSort === field) {
@@ -149,6 +565,12 @@ function sortBy(field) {
   }
   
   updateSortIndicators();
+
+  const repository = document.getElementById('repository').value;
+  if (isStoreComplete(repository)) {
+    displayIssues(sortIssues(visibleIssues.slice()));
+    return;
+  }
   loadIssues(currentPage);
 }
 
@@ -168,6 +590,12 @@ function displayPagination(pagination) {
   const div = document.getElementById('pagination');
   let html = '';
 
+  // Everything is loaded and scrolls in one list
+  if (!pagination) {
+    div.innerHTML = `<span style="padding: 0 16px; color: #8b949e;">${visibleIssues.length} issues</span>`;
+    return;
+  }
+
   if (pagination.page > 1) {
     html += `<button class="btn btn-secondary btn-small" onclick="loadIssues(${pagination.page - 1})">Previous</button>`;
   }
@@ -184,17 +612,25 @@ function displayPagination(pagination) {
 // Selection management
 function toggleSelectAll() {
   const selectAll = document.getElementById('select-all');
-  const checkboxes = document.querySelectorAll('.issue-checkbox');
-  checkboxes.forEach(cb => cb.checked = selectAll.checked);
+  selectedIssues.clear();
+  if (selectAll.checked) {
+    visibleIssues.forEach(issue => selectedIssues.add(issue.number));
+  }
+  document.querySelectorAll('.issue-checkbox').forEach(cb => cb.checked = selectAll.checked);
   updateSelection();
 }
 
-function updateSelection() {
-  selectedIssues.clear();
-  document.querySelectorAll('.issue-checkbox:checked').forEach(cb => {
-    selectedIssues.add(parseInt(cb.dataset.number));
-  });
+function toggleIssue(checkbox) {
+  const number = parseInt(checkbox.dataset.number);
+  if (checkbox.checked) {
+    selectedIssues.add(number);
+  } else {
+    selectedIssues.delete(number);
+  }
+  updateSelection();
+}
 
+function updateSelection() {
   const bulkActions = document.getElementById('bulk-actions');
   const selectedCount = document.getElementById('selected-count');
   
@@ -242,6 +678,8 @@ async function bulkUpdate(updates) {
     if (!response.ok) throw new Error(data.error);
 
     clearSelection();
+    resetStore();
+    invalidateRequests();
     loadIssues(currentPage);
   } catch (error) {
     showError(error.message);
@@ -259,6 +697,7 @@ async function syncRepository() {
   }
 
   showLoading(true);
+  syncingRepository = repository;
   try {
     const response = await fetch('/api/sync', {
       method: 'POST',
@@ -269,11 +708,14 @@ async function syncRepository() {
     const data = await response.json();
     if (!response.ok) throw new Error(data.error);
 
-    alert(`Synced ${data.count} issues from ${repository}`);
+    alert(`Synced ${data.count} issues from ${repository} (${data.written} changed)`);
+    resetStore();
+    invalidateRequests();
     loadIssues(currentPage);
   } catch (error) {
     showError(error.message);
   } finally {
+    syncingRepository = null;
     showLoading(false);
   }
 }